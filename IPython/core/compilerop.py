@@ -35,7 +35,11 @@
 import hashlib
 import linecache
 import operator
-import time
+import re
+import types
+from collections import OrderedDict
+
+from IPython.utils.py3compat import PY3
 
 #-----------------------------------------------------------------------------
 # Constants
@@ -62,10 +66,209 @@ def code_name(code, number=0):
     # even with truncated hashes, and the full one makes tracebacks too long
     return '<ipython-input-{0}-{1}>'.format(number, hash_digest[:12])
 
+_code_name_re = re.compile(r'<ipython-input-(\d+)-[0-9a-f]{12}>$')
+
+def code_number(name):
+    """Return the number included in a name made by :func:`code_name`, or
+    None if it is not such a name.
+    """
+    m = _code_name_re.match(name)
+    if m is not None:
+        return int(m.group(1))
+
 #-----------------------------------------------------------------------------
 # Classes and functions
 #-----------------------------------------------------------------------------
 
+class SourceCache(OrderedDict):
+    """The linecache entries of the compiled cells, least recently used first.
+
+    When their total size goes over `max_bytes`, the oldest entries are
+    removed from the cache, and from ``linecache.cache``.  They may be found
+    again later by the `fetchers`: functions taking the name of a cell and
+    returning its source, or None.
+
+    The entries have no modification time, so ``linecache.checkcache`` leaves
+    them alone.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        super(SourceCache, self).__init__()
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.fetchers = []
+
+    def __setitem__(self, name, entry):
+        if name in self:
+            del self[name]
+        super(SourceCache, self).__setitem__(name, entry)
+        self.nbytes += entry[0]
+        self.evict()
+
+    def __delitem__(self, name):
+        self.nbytes -= self[name][0]
+        super(SourceCache, self).__delitem__(name)
+
+    def add(self, name, code):
+        """Store the source of a cell, and make linecache use it."""
+        entry = (len(code), None,
+                 [line+'\n' for line in code.splitlines()], name)
+        self[name] = entry
+        linecache.cache[name] = entry
+        return entry
+
+    def evict(self):
+        """Remove the oldest entries until the size limit is met.
+
+        The latest entry is always kept.
+        """
+        while self.nbytes > self.max_bytes and len(self) > 1:
+            name = next(iter(self))
+            entry = self[name]
+            del self[name]
+            if linecache.cache.get(name) is entry:
+                del linecache.cache[name]
+
+    def fetch(self, name):
+        """Put back the entry of a cell in linecache, finding its source with
+        the fetchers if it was evicted.  Returns whether it was found.
+        """
+        entry = self.get(name)
+        if entry is None:
+            for fetcher in self.fetchers:
+                code = fetcher(name)
+                if code is not None:
+                    entry = self.add(name, code)
+                    break
+            else:
+                return False
+        else:
+            # Most recently used
+            self[name] = entry
+        linecache.cache[name] = entry
+        return True
+
+    def restore(self):
+        """Put back all the entries in linecache, if they were cleared.
+
+        Checking the most recent one is enough, so this takes constant time
+        when nothing was cleared.
+        """
+        if not self:
+            return
+        name = next(reversed(self))
+        if name not in linecache.cache:
+            linecache.cache.update(self)
+
+
+class CodeCache(OrderedDict):
+    """The work done on the cells before running them, least recently used
+    first, so that running the same cell again can skip it.
+
+    At most `size` entries are kept; a size of 0 disables the cache.
+    """
+
+    def __init__(self, size=0):
+        super(CodeCache, self).__init__()
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key):
+        """Return the entry for key, or None, and count the hit or miss."""
+        entry = self.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            # Most recently used
+            del self[key]
+            super(CodeCache, self).__setitem__(key, entry)
+        return entry
+
+    def __setitem__(self, key, entry):
+        if key in self:
+            del self[key]
+        super(CodeCache, self).__setitem__(key, entry)
+        self.evict()
+
+    def evict(self):
+        """Remove the oldest entries until there are no more than `size`."""
+        while len(self) > max(self.size, 0):
+            del self[next(iter(self))]
+
+
+# The arguments of types.CodeType before Python 3.8, which has code.replace
+_CODE_ARGS = ['co_argcount', 'co_nlocals', 'co_stacksize', 'co_flags',
+              'co_code', 'co_consts', 'co_names', 'co_varnames',
+              'co_filename', 'co_name', 'co_firstlineno', 'co_lnotab',
+              'co_freevars', 'co_cellvars']
+if PY3:
+    _CODE_ARGS.insert(1, 'co_kwonlyargcount')
+
+
+def _replace_code(code, **changes):
+    """Copy a code object with some attributes changed, like code.replace."""
+    if hasattr(code, 'replace'):
+        return code.replace(**changes)
+    args = [changes.get(name, getattr(code, name)) for name in _CODE_ARGS]
+    return types.CodeType(*args)
+
+
+def relabel_code(code, filename):
+    """Return a copy of a code object, and of the code objects nested in it,
+    with their filename changed.
+
+    Returns None when code objects can't be copied on this Python
+    implementation.
+    """
+    if code.co_filename == filename:
+        return code
+    consts = []
+    for c in code.co_consts:
+        if isinstance(c, types.CodeType):
+            c = relabel_code(c, filename)
+            if c is None:
+                return None
+        consts.append(c)
+    try:
+        return _replace_code(code, co_filename=filename,
+                             co_consts=tuple(consts))
+    except (TypeError, AttributeError):
+        return None
+
+
+class ReplayCompiler(object):
+    """Wrap a compiler to reuse the code objects it compiled for a previous
+    run of the same cell.
+
+    The n-th call returns the n-th code object of `codes`, relabeled with the
+    new filename, and compiles it first if it is missing.  As the wrapped
+    compiler would, the future flags of the reused code are added to its
+    own.
+    """
+
+    def __init__(self, compiler, codes):
+        self.compiler = compiler
+        self.codes = codes
+        self.calls = 0
+
+    def __call__(self, source, filename, symbol):
+        n = self.calls
+        self.calls += 1
+        if n < len(self.codes):
+            code = relabel_code(self.codes[n], filename)
+            if code is not None:
+                self.compiler.flags |= code.co_flags & PyCF_MASK
+                return code
+        code = self.compiler(source, filename, symbol)
+        if n < len(self.codes):
+            self.codes[n] = code
+        else:
+            self.codes.append(code)
+        return code
+
+
 class CachingCompiler(codeop.Compile):
     """A compiler that caches code compiled from interactive statements.
     """
@@ -83,14 +286,28 @@ def __init__(self):
         # separate caches (one in each CachingCompiler instance), any call made
         # by Python itself to linecache.checkcache() would obliterate the
         # cached data from the other IPython instances.
-        if not hasattr(linecache, '_ipython_cache'):
-            linecache._ipython_cache = {}
+        if not isinstance(getattr(linecache, '_ipython_cache', None),
+                          SourceCache):
+            cache = SourceCache()
+            for name, (size, mtime, lines, fullname) in \
+                    getattr(linecache, '_ipython_cache', {}).items():
+                cache.add(name, ''.join(lines))
+            linecache._ipython_cache = cache
         if not hasattr(linecache, '_checkcache_ori'):
             linecache._checkcache_ori = linecache.checkcache
+        if not hasattr(linecache, '_getlines_ori'):
+            linecache._getlines_ori = linecache.getlines
         # Now, we must monkeypatch the linecache directly so that parts of the
         # stdlib that call it outside our control go through our codepath
         # (otherwise we'd lose our tracebacks).
         linecache.checkcache = check_linecache_ipython
+        linecache.getlines = getlines_ipython
+
+    @property
+    def source_cache(self):
+        """The :class:`SourceCache` of the compiled cells, shared by all
+        instances."""
+        return linecache._ipython_cache
         
     def ast_parse(self, source, filename='<unknown>', symbol='exec'):
         """Parse code to an AST with the current compiler flags active.
@@ -128,10 +345,7 @@ def cache(self, code, number=0):
         argument to compilation, so that tracebacks are correctly hooked up.
         """
         name = code_name(code, number)
-        entry = (len(code), time.time(),
-                 [line+'\n' for line in code.splitlines()], name)
-        linecache.cache[name] = entry
-        linecache._ipython_cache[name] = entry
+        linecache._ipython_cache.add(name, code)
         return name
 
 def check_linecache_ipython(*args):
@@ -139,6 +353,13 @@ def check_linecache_ipython(*args):
     """
     # First call the orignal checkcache as intended
     linecache._checkcache_ori(*args)
-    # Then, update back the cache with our data, so that tracebacks related
-    # to our compiled codes can be produced.
-    linecache.cache.update(linecache._ipython_cache)
+    # Our entries are left alone by checkcache, but the whole cache may have
+    # been cleared.
+    linecache._ipython_cache.restore()
+
+def getlines_ipython(filename, module_globals=None):
+    """Call linecache.getlines(), finding the source of evicted cells.
+    """
+    if filename not in linecache.cache and code_number(filename) is not None:
+        linecache._ipython_cache.fetch(filename)
+    return linecache._getlines_ori(filename, module_globals)
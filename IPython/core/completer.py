@@ -61,9 +61,12 @@
 import os
 import re
 import sys
+import time
 import unicodedata
 import string
 
+from collections import OrderedDict
+
 from traitlets.config.configurable import Configurable 
 from IPython.core.error import TryNext
 from IPython.core.inputsplitter import ESC_MAGIC
@@ -71,10 +74,11 @@
 from IPython.utils import generics
 from IPython.utils import io
 from IPython.utils.decorators import undoc
+from IPython.utils.dircache import DirectoryCache
 from IPython.utils.dir2 import dir2
 from IPython.utils.process import arg_split
 from IPython.utils.py3compat import builtin_mod, string_types, PY3
-from traitlets import CBool, Enum
+from traitlets import CBool, Enum, Float, Integer
 
 #-----------------------------------------------------------------------------
 # Globals
@@ -214,6 +218,10 @@ class Bunch(object): pass
 DELIMS = ' \t\n`!@#$^&*()=+[{]}\\|;:\'",<>?'
 GREEDY_DELIMS = ' =\r\n'
 
+# Text which can be appended to a completed name without changing the kind of
+# completion (see IPCompleter.completion_cache_size)
+_identifier_re = re.compile(r'\w*$', re.UNICODE)
+
 
 class CompletionSplitter(object):
     """An object to split an input line in a manner similar to readline.
@@ -469,6 +477,11 @@ def match_dict_keys(keys, prefix, delims):
     return quote, token_start, matched
 
 
+def _matcher_name(matcher):
+    """Name under which a matcher's timings are recorded"""
+    return getattr(matcher, '__name__', repr(matcher))
+
+
 def _safe_isinstance(obj, module, class_name):
     """Checks if obj is an instance of module.class_name if loaded
     """
@@ -547,6 +560,20 @@ def _greedy_changed(self, name, old, new):
 
         if self.readline:
             self.readline.set_completer_delims(self.splitter.delims)
+
+    def _use_dir_cache_changed(self, name, old, new):
+        """switch filename completion between the filesystem and the cache"""
+        if new:
+            if getattr(self, 'dir_cache', None) is None:
+                self.dir_cache = DirectoryCache()
+            self.glob = self.dir_cache.glob
+            self.isdir = self.dir_cache.isdir
+        else:
+            if getattr(self, 'dir_cache', None) is not None:
+                # Stop its refresh thread, but keep it for reuse
+                self.dir_cache.close()
+            self.glob = glob.glob
+            self.isdir = os.path.isdir
     
     merge_completions = CBool(True, config=True,
         help="""Whether to merge completion results into a single list
@@ -577,6 +604,56 @@ def _greedy_changed(self, name, old, new):
         When False [default]: the __all__ attribute is ignored 
         """
     )
+    completion_cache_size = Integer(0, config=True,
+        help="""Number of recent completions to keep for reuse.
+
+        When the text being completed extends the text of a recent completion
+        by some identifier characters (e.g. ``df.colu`` after ``df.col``), the
+        earlier matches are narrowed down instead of running all the matchers
+        again. The cache is cleared whenever a cell is executed; changes made
+        to the namespace by other means, e.g. from another thread, are not
+        seen until then.
+
+        0 [default] disables the cache.
+        """
+    )
+    use_dir_cache = CBool(False, config=True,
+        help="""Cache directory listings for filename completion.
+
+        Completing filenames normally lists the directory, and checks which
+        entries are directories, on every keypress, which can be slow on
+        network filesystems or for large directories. When True, the listings
+        of recently used directories are kept and only listed again when their
+        modification time changes; a background thread checks them every few
+        seconds.
+        """
+    )
+    index_root_modules_on_startup = CBool(False, config=True,
+        help="""Update the index of the modules on sys.path at startup.
+
+        The index is used to complete imports. When True, the entries of
+        sys.path which changed since they were last indexed are scanned in a
+        background thread, so that the first import completion doesn't wait
+        for the scan. By default they are scanned by that first completion.
+        """
+    )
+    completion_time_budget = Float(0, config=True,
+        help="""Time budget for a completion, in seconds.
+
+        Once it is spent, the remaining custom completers and matchers are
+        skipped, so one slow matcher can't make every completion lag.
+        0 [default] means no limit.
+        """
+    )
+    matcher_time_limit = Float(0, config=True,
+        help="""Time limit for each matcher, in seconds.
+
+        Matchers which can stop early, like the completion of dictionary keys,
+        return the matches found so far when they reach it. Others can't be
+        interrupted, but are counted as overruns in matcher_stats.
+        0 [default] means no limit.
+        """
+    )
 
     def __init__(self, shell=None, namespace=None, global_namespace=None,
                  use_readline=True, config=None, **kwargs):
@@ -622,8 +699,9 @@ def __init__(self, shell=None, namespace=None, global_namespace=None,
         self.shell = shell
         # Regexp to split filenames with spaces in them
         self.space_name_re = re.compile(r'([^\\] )')
-        # Hold a local ref. to glob.glob for speed
-        self.glob = glob.glob
+        # Hold a local ref. to glob.glob and os.path.isdir for speed, or to
+        # their cached versions
+        self._use_dir_cache_changed('use_dir_cache', None, self.use_dir_cache)
 
         # Determine if we are running on 'dumb' terminals, like (X)Emacs
         # buffers, to avoid completion problems.
@@ -650,6 +728,23 @@ def __init__(self, shell=None, namespace=None, global_namespace=None,
                          self.dict_key_matches,
                          ]
 
+        # Recent completions, see completion_cache_size
+        self._completion_cache = OrderedDict()
+        self._completion_cache_state = None
+
+        # Timings of each matcher and custom completer, by name: number of
+        # calls, total and max time, and how often it overran its time limit,
+        # returned partial results or was skipped.
+        self.matcher_stats = {}
+        # End of the time budget of the current completion, and of the time
+        # limit of the running matcher
+        self._budget_end = None
+        self._deadline = None
+        # Whether matchers were skipped or cut short in this completion, and
+        # whether the running matcher was
+        self._incomplete = False
+        self._cut_short = False
+
     def all_completions(self, text):
         """
         Wrapper around the complete method for the benefit of emacs
@@ -744,7 +839,7 @@ def file_matches(self, text):
         #io.rprint('mm', matches)  # dbg
 
         # Mark directories in input list by appending '/' to their names.
-        matches = [x+'/' if os.path.isdir(x) else x for x in matches]
+        matches = [x+'/' if self.isdir(x) else x for x in matches]
         return matches
 
     def magic_matches(self, text):
@@ -974,6 +1069,7 @@ def get_keys(obj):
         keys = get_keys(obj)
         if not keys:
             return keys
+        keys = self._until_deadline(keys)
         closing_quote, token_offset, matches = match_dict_keys(keys, prefix, self.splitter.delims)
         if not matches:
             return matches
@@ -1063,6 +1159,54 @@ def latex_matches(self, text):
                 return s, matches
         return u'', []
 
+    def _run_matcher(self, name, matcher, arg):
+        """Call matcher(arg) within the time limits, recording its timings.
+
+        Returns None, without calling it, if the completion's time budget is
+        already spent.
+        """
+        stats = self.matcher_stats.get(name)
+        if stats is None:
+            stats = self.matcher_stats[name] = dict(calls=0, time=0., max=0.,
+                                        overruns=0, partial=0, skipped=0)
+        start = time.time()
+        if self._budget_end is not None and start >= self._budget_end:
+            stats['skipped'] += 1
+            self._incomplete = True
+            return None
+        deadlines = [self._budget_end]
+        if self.matcher_time_limit:
+            deadlines.append(start + self.matcher_time_limit)
+        deadlines = [d for d in deadlines if d is not None]
+        self._deadline = min(deadlines) if deadlines else None
+        self._cut_short = False
+        try:
+            return matcher(arg)
+        finally:
+            end = time.time()
+            elapsed = end - start
+            stats['calls'] += 1
+            stats['time'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+            if self._cut_short:
+                stats['partial'] += 1
+                self._incomplete = True
+            elif self._deadline is not None and end > self._deadline:
+                stats['overruns'] += 1
+            self._deadline = None
+
+    def _until_deadline(self, items, check_every=1000):
+        """Iterate over items until the running matcher's deadline."""
+        if self._deadline is None:
+            for item in items:
+                yield item
+            return
+        for i, item in enumerate(items):
+            if i % check_every == 0 and time.time() > self._deadline:
+                self._cut_short = True
+                return
+            yield item
+
     def dispatch_custom_completer(self, text):
         #io.rprint("Custom! '%s' %s" % (text, self.custom_completers)) # dbg
         line = self.line_buffer
@@ -1092,7 +1236,7 @@ def dispatch_custom_completer(self, text):
                  self.custom_completers.flat_matches(self.text_until_cursor)):
             #print "try",c # dbg
             try:
-                res = c(event)
+                res = self._run_matcher(_matcher_name(c), c, event)
                 if res:
                     # first, try case sensitive match
                     withcase = [r for r in res if r.startswith(text)]
@@ -1106,6 +1250,48 @@ def dispatch_custom_completer(self, text):
 
         return None
 
+    def _cache_state(self):
+        """What the cached completions depend on, besides the line itself."""
+        return (getattr(self.shell, 'execution_count', None), self.greedy,
+                self.omit__names, self.limit_to__all__, tuple(self.matchers))
+
+    def _cached_matches(self, text, cursor_pos):
+        """Get the matches for text by narrowing down a recent completion.
+
+        This is possible when the line up to the cursor extends the line of
+        a recent completion with identifier characters only, the completed
+        text being extended in the same way. Returns None if there is no such
+        completion.
+        """
+        state = self._cache_state()
+        if state != self._completion_cache_state:
+            self._completion_cache.clear()
+            self._completion_cache_state = state
+            return None
+        suffix = self.line_buffer[cursor_pos:]
+        for key in reversed(self._completion_cache):
+            before, after = key
+            if after != suffix or not self.text_until_cursor.startswith(before):
+                continue
+            old_text, matches = self._completion_cache[key]
+            extra = self.text_until_cursor[len(before):]
+            if text == old_text + extra and _identifier_re.match(extra):
+                return [m for m in matches if m.startswith(text)]
+        return None
+
+    def _cache_matches(self, text, cursor_pos, matches):
+        """Remember matches for later narrowing by _cached_matches."""
+        # After a dot, python_matches may omit private names that would match
+        # a longer text; other matches which don't start with the text (e.g.
+        # with ~ expanded) can't be narrowed down by prefix.
+        if text.endswith('.') or not all(m.startswith(text) for m in matches):
+            return
+        key = (self.text_until_cursor, self.line_buffer[cursor_pos:])
+        self._completion_cache.pop(key, None)
+        self._completion_cache[key] = (text, tuple(matches))
+        while len(self._completion_cache) > self.completion_cache_size:
+            self._completion_cache.popitem(last=False)
+
     def complete(self, text=None, line_buffer=None, cursor_pos=None):
         """Find completions for the given text and line context.
 
@@ -1170,10 +1356,22 @@ def complete(self, text=None, line_buffer=None, cursor_pos=None):
 
         # Start with a clean slate of completions
         self.matches[:] = []
+        self._incomplete = False
+        if self.completion_time_budget:
+            self._budget_end = time.time() + self.completion_time_budget
+        else:
+            self._budget_end = None
         custom_res = self.dispatch_custom_completer(text)
+        cached = None
+        use_cache = self.completion_cache_size > 0 and self.merge_completions
+        if custom_res is None and use_cache:
+            cached = self._cached_matches(text, cursor_pos)
         if custom_res is not None:
             # did custom completers produce something?
             self.matches = custom_res
+        elif cached is not None:
+            # narrowed down from a recent completion, already sorted
+            self.matches = cached
         else:
             # Extend the list of completions with the results of each
             # matcher, so we return results to the user from all
@@ -1182,14 +1380,16 @@ def complete(self, text=None, line_buffer=None, cursor_pos=None):
                 self.matches = []
                 for matcher in self.matchers:
                     try:
-                        self.matches.extend(matcher(text))
+                        self.matches.extend(self._run_matcher(
+                            _matcher_name(matcher), matcher, text) or [])
                     except:
                         # Show the ugly traceback if the matcher causes an
                         # exception, but do NOT crash the kernel!
                         sys.excepthook(*sys.exc_info())
             else:
                 for matcher in self.matchers:
-                    self.matches = matcher(text)
+                    self.matches = self._run_matcher(_matcher_name(matcher),
+                                                     matcher, text) or []
                     if self.matches:
                         break
         # FIXME: we should extend our api to return a dict with completions for
@@ -1199,6 +1399,8 @@ def complete(self, text=None, line_buffer=None, cursor_pos=None):
 
         # use penalize_magics_key to put magics after variables with same name
         self.matches = sorted(set(self.matches), key=penalize_magics_key)
+        if custom_res is None and use_cache and not self._incomplete:
+            self._cache_matches(text, cursor_pos, self.matches)
 
         #io.rprint('COMP TEXT, MATCHES: %r, %r' % (text, self.matches)) # dbg
         return text, self.matches
@@ -22,6 +22,7 @@
 import os
 import re
 import sys
+import threading
 
 try:
     # Python >= 3.3
@@ -32,7 +33,8 @@
     _suffixes = [ s[0] for s in get_suffixes() ]
 
 # Third-party imports
-from time import time
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
 from zipimport import zipimporter
 
 # Our own imports
@@ -48,11 +50,7 @@
 # Globals and constants
 #-----------------------------------------------------------------------------
 
-# Time in seconds after which the rootmodules will be stored permanently in the
-# ipython ip.db database (kept in the user's .ipython dir).
-TIMEOUT_STORAGE = 2
-
-# Time in seconds after which we give up
+# Time in seconds after which we give up scanning sys.path
 TIMEOUT_GIVEUP = 20
 
 # Regular expression for the python import statement
@@ -108,43 +106,175 @@ def module_list(path):
     return list(set(modules))
 
 
+class RootModuleIndex(object):
+    """Index of the top-level modules importable from each sys.path entry.
+
+    The index is kept in ``db[key]``, with the modification time of each
+    entry when it was scanned, so that only the entries which changed since
+    (e.g. after a ``pip install``) are scanned again. Scans of several
+    entries run in a thread pool, without holding the lock of the index, so
+    that it can be read while they run.
+    """
+    # Bump this when the stored format changes, to discard old indexes
+    version = 2
+    key = 'rootmodules_cache'
+    max_threads = 8
+
+    def __init__(self, db=None):
+        self.db = db
+        self._lock = threading.Lock()
+        self.entries = {}
+        # Bumped by reset(), so that the scans started before are discarded
+        self.generation = 0
+        # Number of updates running
+        self.scanning = 0
+        stored = db.get(self.key) if db is not None else None
+        if isinstance(stored, dict) and stored.get('version') == self.version:
+            self.entries = stored['entries']
+
+    @staticmethod
+    def stamp(path):
+        """Modification time of a sys.path entry, or None if it is missing."""
+        try:
+            return os.stat(path or '.').st_mtime
+        except OSError:
+            return None
+
+    @staticmethod
+    def scan(path):
+        """Return (stamp, modules) for a sys.path entry."""
+        stamp = RootModuleIndex.stamp(path)
+        modules = module_list(path) if stamp is not None else []
+        try:
+            modules.remove('__init__')
+        except ValueError:
+            pass
+        return stamp, sorted(modules)
+
+    def stale(self, paths):
+        """The entries of paths which are new or changed since they were last
+        scanned. The current directory is never up to date."""
+        with self._lock:
+            entries = dict(self.entries)
+        return [p for p in set(paths) if p in ('', '.') or
+                p not in entries or entries[p][0] != self.stamp(p)]
+
+    def update(self, paths, timeout=None):
+        """Scan the entries of paths which are new or changed since they were
+        last scanned, and store the index.
+
+        Returns False if the scans didn't finish within timeout seconds.
+        """
+        with self._lock:
+            generation = self.generation
+        stale = self.stale(paths)
+        if not stale:
+            return True
+        with self._lock:
+            self.scanning += 1
+        pool = ThreadPool(min(len(stale), self.max_threads))
+        try:
+            results = pool.map_async(self.scan, stale).get(timeout)
+        except TimeoutError:
+            return False
+        finally:
+            # Don't wait for scans which timed out
+            pool.close()
+            with self._lock:
+                self.scanning -= 1
+        with self._lock:
+            if self.generation != generation:
+                # Reset while scanning: the results may be stale
+                return True
+            changed = False
+            for path, result in zip(stale, results):
+                if path in ('', '.'):
+                    # cwd modules should not be stored; scan it every time
+                    self.entries[path] = (None, result[1])
+                elif self.entries.get(path) != result:
+                    self.entries[path] = result
+                    changed = True
+            if changed and self.db is not None:
+                self.db[self.key] = {'version': self.version,
+                                     'entries': dict((p, e) for p, e in
+                                         self.entries.items()
+                                         if p not in ('', '.'))}
+        return True
+
+    def reset(self):
+        """Discard the index, and the results of the scans running."""
+        with self._lock:
+            self.generation += 1
+            self.entries = {}
+            if self.db is not None:
+                self.db.pop(self.key, None)
+
+    def modules(self, paths):
+        """The names of the modules importable from paths, from the index."""
+        modules = set()
+        with self._lock:
+            for path in paths:
+                if path in self.entries:
+                    modules.update(self.entries[path][1])
+        return modules
+
+
+_root_module_index = None
+
+def _module_index(shell=None):
+    global _root_module_index
+    if _root_module_index is None:
+        shell = shell or get_ipython()
+        _root_module_index = RootModuleIndex(getattr(shell, 'db', None))
+    return _root_module_index
+
+
 def get_root_modules():
     """
     Returns a list containing the names of all the modules available in the
     folders of the pythonpath.
 
-    ip.db['rootmodules_cache'] maps sys.path entries to list of modules.
+    The modules of each sys.path entry are kept in a :class:`RootModuleIndex`
+    stored in ip.db['rootmodules_cache'], and entries are only scanned again
+    when they change. While the index is being updated in the background, it
+    is used as it is, if it isn't empty.
     """
-    ip = get_ipython()
-    rootmodules_cache = ip.db.get('rootmodules_cache', {})
-    rootmodules = list(sys.builtin_module_names)
-    start_time = time()
-    store = False
-    for path in sys.path:
-        try:
-            modules = rootmodules_cache[path]
-        except KeyError:
-            modules = module_list(path)
-            try:
-                modules.remove('__init__')
-            except ValueError:
-                pass
-            if path not in ('', '.'): # cwd modules should not be cached
-                rootmodules_cache[path] = modules
-            if time() - start_time > TIMEOUT_STORAGE and not store:
-                store = True
-                print("\nCaching the list of root modules, please wait!")
-                print("(This will only be done once - type '%rehashx' to "
-                      "reset cache!)\n")
-                sys.stdout.flush()
-            if time() - start_time > TIMEOUT_GIVEUP:
-                print("This is taking too long, we give up.\n")
-                return []
-        rootmodules.extend(modules)
-    if store:
-        ip.db['rootmodules_cache'] = rootmodules_cache
-    rootmodules = list(set(rootmodules))
-    return rootmodules
+    index = _module_index()
+    if not (index.scanning and index.entries) and \
+            not index.update(sys.path, timeout=TIMEOUT_GIVEUP):
+        print("\nThis is taking too long, we give up.\n")
+        return []
+    rootmodules = index.modules(sys.path)
+    rootmodules.update(sys.builtin_module_names)
+    return list(rootmodules)
+
+
+def update_root_modules_async(shell=None):
+    """Bring the root module index up to date in a background thread, so that
+    the first import completion doesn't have to scan sys.path.
+
+    Returns the thread, or None if the stored index is up to date. The
+    current directory is left to the completion, which scans it every time.
+    """
+    index = _module_index(shell)
+    stale = [p for p in index.stale(sys.path) if p not in ('', '.')]
+    if not stale:
+        return None
+    t = threading.Thread(target=index.update, args=(stale,),
+                         name='IPythonRootModules')
+    t.daemon = True
+    t.start()
+    return t
+
+
+def reset_root_modules(shell=None):
+    """Discard the root module index, so that sys.path is scanned again."""
+    global _root_module_index
+    if _root_module_index is not None:
+        _root_module_index.reset()
+    shell = shell or get_ipython()
+    if shell is not None:
+        shell.db.pop(RootModuleIndex.key, None)
 
 
 def is_importable(module, attr, only_modules):
@@ -257,6 +387,17 @@ def module_completer(self,event):
 # FIXME: there's a lot of logic common to the run, cd and builtin file
 # completers, that is currently reimplemented in each.
 
+def _file_functions():
+    """Return the glob and isdir functions used by the main completer.
+
+    These use cached directory listings if ``IPCompleter.use_dir_cache`` is
+    set, and are the ones from the standard library otherwise.
+    """
+    completer = getattr(get_ipython(), 'Completer', None)
+    if completer is None:
+        return glob.glob, os.path.isdir
+    return completer.glob, completer.isdir
+
 def magic_run_completer(self, event):
     """Complete files that end in .py or .ipy or .ipynb for the %run command.
     """
@@ -271,8 +412,7 @@ def magic_run_completer(self, event):
     #print("rp=", relpath)  # dbg
     #print('comps=', comps)  # dbg
 
-    lglob = glob.glob
-    isdir = os.path.isdir
+    lglob, isdir = _file_functions()
     relpath, tilde_expand, tilde_val = expand_user(relpath)
 
     # Find if the user has already typed the first filename, after which we
@@ -324,9 +464,10 @@ def cd_completer(self, event):
     relpath, tilde_expand, tilde_val = expand_user(relpath)
     relpath = relpath.replace('\\','/')
 
+    lglob, isdir = _file_functions()
     found = []
-    for d in [f.replace('\\','/') + '/' for f in glob.glob(relpath+'*')
-              if os.path.isdir(f)]:
+    for d in [f.replace('\\','/') + '/' for f in lglob(relpath+'*')
+              if isdir(f)]:
         if ' ' in d:
             # we don't want to deal with any of that, complex code
             # for this is elsewhere
@@ -335,7 +476,7 @@ def cd_completer(self, event):
         found.append(d)
 
     if not found:
-        if os.path.isdir(relpath):
+        if isdir(relpath):
             return [compress_user(relpath, tilde_expand, tilde_val)]
 
         # if no completions so far, try bookmarks
@@ -9,21 +9,95 @@
 
 from __future__ import print_function
 
+import numbers
 import sys
 import io as _io
 import tokenize
+import weakref
+
+from collections import OrderedDict
 
 from IPython.core.formatters import _safe_get_formatter_method
 from traitlets.config.configurable import Configurable
 from IPython.utils import io
-from IPython.utils.py3compat import builtin_mod, cast_unicode_py2
-from traitlets import Instance, Float
+from IPython.utils.py3compat import builtin_mod, cast_unicode_py2, unicode_type
+from IPython.utils.timing import default_timer
+from traitlets import Dict, Instance, Integer, Float
 from IPython.utils.warn import warn
 
 # TODO: Move the various attributes (cache_size, [others now moved]). Some
 # of these are also attributes of InteractiveShell. They should be on ONE object
 # only and the other objects should ask that one object for their values.
 
+def estimate_size(obj):
+    """Estimate the memory used by an object, in bytes.
+
+    This is the size reported by :func:`sys.getsizeof`, or the size of the
+    data of arrays and other objects supporting the buffer protocol, when
+    that is larger. The objects it refers to are not counted.
+    """
+    try:
+        size = sys.getsizeof(obj)
+    except Exception:
+        size = 0
+    nbytes = getattr(obj, 'nbytes', None)
+    if nbytes is None and not isinstance(obj, (bytes, unicode_type)):
+        try:
+            nbytes = memoryview(obj).nbytes
+        except Exception:
+            pass
+    if isinstance(nbytes, numbers.Integral) and nbytes > size:
+        size = nbytes
+    return size
+
+
+class OutputCache(dict):
+    """The output cache of the shell (``Out`` and ``_oh``).
+
+    A dict of the results by prompt number, some of which can be held by weak
+    reference (see :attr:`DisplayHook.weak_cache_min_bytes`): ``Out[n]``,
+    ``n in Out`` and ``Out.get(n)`` find these as long as they are alive.
+    """
+    def __init__(self, *args, **kwargs):
+        super(OutputCache, self).__init__(*args, **kwargs)
+        self.weak = {}
+
+    def add_weak(self, key, result):
+        """Cache result by weak reference, until it dies.
+
+        Raises TypeError if it doesn't support weak references.
+        """
+        weak = self.weak
+        def remove(ref):
+            if weak.get(key) is ref:
+                del weak[key]
+        weak[key] = weakref.ref(result, remove)
+
+    def _get_weak(self, key):
+        ref = self.weak.get(key)
+        return ref() if ref is not None else None
+
+    def __missing__(self, key):
+        result = self._get_weak(key)
+        if result is None:
+            raise KeyError(key)
+        return result
+
+    def __contains__(self, key):
+        return super(OutputCache, self).__contains__(key) or \
+            self._get_weak(key) is not None
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def clear(self):
+        super(OutputCache, self).clear()
+        self.weak.clear()
+
+
 class DisplayHook(Configurable):
     """The custom IPython displayhook to replace sys.displayhook.
 
@@ -37,6 +111,31 @@ class DisplayHook(Configurable):
                            allow_none=True)
     cull_fraction = Float(0.2)
 
+    cache_max_bytes = Integer(0, config=True,
+        help="""Maximum estimated size of the output cache, in bytes.
+
+        Beyond it, the oldest results are evicted from Out, _oh and _N, and a
+        result bigger than this on its own is not cached (it is still
+        available as _). Sizes are estimated by sys.getsizeof, or by the size
+        of the data of arrays and other buffers.
+        0 [default] means no limit.
+        """)
+    weak_cache_min_bytes = Integer(0, config=True,
+        help="""Cache results of at least this estimated size by weak reference.
+
+        Out[N] then returns such a result only as long as it is referenced
+        elsewhere, e.g. by a variable, and _N is not set. This only applies to
+        objects supporting weak references, like arrays (but not lists or
+        dicts); others are cached as usual.
+        0 [default] means all results are cached normally.
+        """)
+    cache_stats = Dict(help="""Estimated size in bytes of the results in the
+        output cache, and counts of results evicted, not cached because too
+        big, and cached by weak reference.""")
+    def _cache_stats_default(self):
+        return {'bytes': 0, 'evictions': 0, 'evicted_bytes': 0,
+                'uncached': 0, 'weak': 0}
+
     def __init__(self, shell=None, cache_size=1000, **kwargs):
         super(DisplayHook, self).__init__(shell=shell, **kwargs)
         cache_size_min = 3
@@ -52,6 +151,9 @@ def __init__(self, shell=None, cache_size=1000, **kwargs):
             self.do_full_cache = 1
 
         self.cache_size = cache_size
+        # Estimated sizes of the results in the cache, oldest first
+        self._result_sizes = OrderedDict()
+        self._evict_warned = False
 
         # we need a reference to the user-level namespace
         self.shell = shell
@@ -208,12 +310,69 @@ def update_user_ns(self, result):
 
             # hackish access to top-level  namespace to create _1,_2... dynamically
             to_main = {}
-            if self.do_full_cache:
+            if self.do_full_cache and self._make_room(result):
                 new_result = '_'+repr(self.prompt_count)
                 to_main[new_result] = result
                 self.shell.push(to_main, interactive=False)
                 self.shell.user_ns['_oh'][self.prompt_count] = result
 
+    def _make_room(self, result):
+        """Check the size of a new result against the cache limits.
+
+        Evicts old results if needed, and returns whether the result should
+        be cached normally.
+        """
+        size = estimate_size(result)
+        stats = self.cache_stats
+        # A cell can display several results under the same prompt number;
+        # each one replaces the last in the cache.
+        stats['bytes'] -= self._result_sizes.pop(self.prompt_count, 0)
+        if self.weak_cache_min_bytes and size >= self.weak_cache_min_bytes:
+            oh = self.shell.user_ns.get('_oh')
+            try:
+                if isinstance(oh, OutputCache):
+                    oh.add_weak(self.prompt_count, result)
+                    oh.pop(self.prompt_count, None)
+                    self.shell.user_ns.pop('_%i' % self.prompt_count, None)
+                    stats['weak'] += 1
+                    return False
+            except TypeError:
+                # Not weakly referenceable
+                pass
+        if self.cache_max_bytes:
+            if size > self.cache_max_bytes:
+                stats['uncached'] += 1
+                return False
+            if stats['bytes'] + size > self.cache_max_bytes:
+                # Like cull_cache, make room for a few more results, so that
+                # the oldest aren't evicted one at a time for each new one
+                target = (1 - self.cull_fraction) * self.cache_max_bytes
+                self._evict(stats['bytes'] + size - target)
+        self._result_sizes[self.prompt_count] = size
+        stats['bytes'] += size
+        return True
+
+    def _evict(self, nbytes):
+        """Evict the oldest results from the cache, to free nbytes."""
+        oh = self.shell.user_ns.get('_oh', {})
+        stats = self.cache_stats
+        count = freed = 0
+        while self._result_sizes and freed < nbytes:
+            n, size = self._result_sizes.popitem(last=False)
+            self.shell.user_ns.pop('_%i' % n, None)
+            oh.pop(n, None)
+            count += 1
+            freed += size
+        stats['bytes'] -= freed
+        stats['evictions'] += count
+        stats['evicted_bytes'] += freed
+        if not self._evict_warned:
+            self._evict_warned = True
+            warn('Output cache size limit ({limit} bytes) hit.\n'
+                 'Flushing oldest {count} entries ({freed} bytes); older '
+                 'results will be flushed without warning.'.format(
+                    limit=self.cache_max_bytes, count=count, freed=freed))
+
     def fill_exec_result(self, result):
         if self.exec_result is not None:
             self.exec_result.result = result
@@ -241,6 +400,9 @@ def __call__(self, result=None):
         """
         self.check_for_underscore()
         if result is not None and not self.quiet():
+            start = default_timer()
+            # Send the display outputs held back first, to keep them in order
+            self.shell.display_pub.flush()
             self.start_displayhook()
             self.write_output_prompt()
             format_dict, md_dict = self.compute_format_data(result)
@@ -250,6 +412,9 @@ def __call__(self, result=None):
                 self.write_format_data(format_dict, md_dict)
                 self.log_output(format_dict)
             self.finish_displayhook()
+            if self.exec_result is not None and \
+                    self.exec_result.timings is not None:
+                self.exec_result.timings['display'] += default_timer() - start
 
     def cull_cache(self):
         """Output cache is full, cull the oldest entries"""
@@ -264,6 +429,7 @@ def cull_cache(self):
                 break
             self.shell.user_ns.pop('_%i' % n, None)
             oh.pop(n, None)
+            self.cache_stats['bytes'] -= self._result_sizes.pop(n, 0)
         
 
     def flush(self):
@@ -282,6 +448,8 @@ def flush(self):
         oh = self.shell.user_ns.get('_oh', None)
         if oh is not None:
             oh.clear()
+        self._result_sizes.clear()
+        self.cache_stats['bytes'] = 0
 
         # Release our own references to objects:
         self._, self.__, self.___ = '', '', ''
@@ -17,9 +17,12 @@
 
 from __future__ import print_function
 
+import threading
+import time
+
 from traitlets.config.configurable import Configurable
 from IPython.utils import io
-from traitlets import List
+from traitlets import List, Float
 
 # This used to be defined here - it is imported for backwards compatibility
 from .display import publish_display_data
@@ -101,16 +104,121 @@ def clear_output(self, wait=False):
         print('\033[2K\r', file=io.stderr, end='')
         io.stderr.flush()
 
+    def flush(self):
+        """Send any display data held back by the publisher.
+
+        Display data is published immediately by default, so this does
+        nothing.  It is called when a cell has finished running.
+        """
+        pass
+
 
 class CapturingDisplayPublisher(DisplayPublisher):
     """A DisplayPublisher that stores"""
     outputs = List()
 
     def publish(self, data, metadata=None, source=None):
-        self.outputs.append((data, metadata))
+        # Store a plain dict, not a MimeBundle holding on to the object
+        self.outputs.append((dict(data), metadata))
     
     def clear_output(self, wait=False):
         super(CapturingDisplayPublisher, self).clear_output(wait)
         
         # empty the list, *do not* reassign a new list
         del self.outputs[:]
+
+
+class CoalescingDisplayPublisher(DisplayPublisher):
+    """A DisplayPublisher that limits the rate of display updates.
+
+    Outputs are sent at most ``update_rate`` times per second; outputs
+    arriving in between are batched.  When an output is cleared before it has
+    been sent (the ``clear_output(wait=True)`` + ``display()`` pattern of
+    progress bars), it is dropped, so only the latest state of the display is
+    sent for each frame.  Outputs still held back are sent by the next output
+    after the end of the frame, or by :meth:`flush`, which is called when a
+    cell finishes.
+
+    Outputs can be published from any thread, but they are only sent from the
+    thread which created the publisher, since the publishers of kernels can't
+    send from other threads.  Nothing sends them on a timer: outputs published
+    from other threads while that thread is idle, e.g. by a progress bar
+    running in the background between cells, are held until it publishes an
+    output or a cell finishes.
+
+    This class sends outputs like :class:`DisplayPublisher`; to limit the rate
+    of another publisher class, use :func:`coalescing_publisher_class`.
+    """
+
+    update_rate = Float(30., config=True,
+        help="""Maximum number of display updates sent per second.
+
+        Set to 0 to send every update immediately.
+        """
+    )
+
+    def __init__(self, **kwargs):
+        super(CoalescingDisplayPublisher, self).__init__(**kwargs)
+        self._lock = threading.RLock()
+        self._thread = threading.current_thread()
+        # Pending clear_output (its `wait` argument, or None) and the
+        # publish arguments queued after it
+        self._clear = None
+        self._pending = []
+        self._last_flush = 0.
+        #: The number of outputs dropped because they were cleared unsent
+        self.coalesced = 0
+
+    def publish(self, data, metadata=None, source=None):
+        with self._lock:
+            self._pending.append((data, metadata, source))
+            self._flush_if_due()
+
+    def clear_output(self, wait=False):
+        with self._lock:
+            self.coalesced += len(self._pending)
+            self._pending = []
+            if self._clear is None:
+                self._clear = wait
+            else:
+                self._clear = self._clear and wait
+            if not wait:
+                self._flush_if_due()
+
+    def flush(self):
+        """Send the outputs held back, if called from the thread which
+        created the publisher."""
+        if threading.current_thread() is not self._thread:
+            return
+        with self._lock:
+            clear, pending = self._clear, self._pending
+            self._clear, self._pending = None, []
+            self._last_flush = time.time()
+            # Send while holding the lock, to keep the order of the outputs
+            # published from several threads.
+            if clear is not None:
+                super(CoalescingDisplayPublisher, self).clear_output(clear)
+            for args in pending:
+                super(CoalescingDisplayPublisher, self).publish(*args)
+        super(CoalescingDisplayPublisher, self).flush()
+
+    def _flush_if_due(self):
+        interval = 1. / self.update_rate if self.update_rate > 0 else 0.
+        if time.time() - self._last_flush >= interval:
+            self.flush()
+
+
+_coalescing_classes = {}
+
+def coalescing_publisher_class(cls):
+    """Return a subclass of the DisplayPublisher class cls, which limits the
+    rate of display updates like :class:`CoalescingDisplayPublisher`.
+    """
+    if issubclass(cls, CoalescingDisplayPublisher):
+        return cls
+    if cls is DisplayPublisher:
+        return CoalescingDisplayPublisher
+    if cls not in _coalescing_classes:
+        _coalescing_classes[cls] = type('Coalescing' + cls.__name__,
+                                        (CoalescingDisplayPublisher, cls), {})
+    return _coalescing_classes[cls]
@@ -116,6 +116,18 @@ def post_run_cell():
     """Fires after user-entered code runs."""
     pass
 
+@_define_event
+def post_run_cell_result(result):
+    """Fires after user-entered code runs, just after ``post_run_cell``.
+
+    Parameters
+    ----------
+    result : :class:`~IPython.core.interactiveshell.ExecutionResult`
+      The result of the cell, with the time spent on each phase of running it
+      in its ``timings``, and its ``gc_time`` and ``peak_rss_delta``.
+    """
+    pass
+
 @_define_event
 def shell_initialized(ip):
     """Fires after initialisation of :class:`~IPython.core.interactiveshell.InteractiveShell`.
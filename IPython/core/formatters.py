@@ -24,7 +24,7 @@
 from IPython.utils.sentinel import Sentinel
 from IPython.lib import pretty
 from traitlets import (
-    Bool, Dict, Integer, Unicode, CUnicode, ObjectName, List,
+    Bool, Dict, Instance, Integer, Unicode, CUnicode, ObjectName, List,
     ForwardDeclaredInstance,
 )
 from IPython.utils.py3compat import (
@@ -55,6 +55,54 @@ def _safe_get_formatter_method(obj, name):
         return method
 
 
+class MimeBundle(dict):
+    """Format data computed on demand, as returned by
+    :meth:`DisplayFormatter.format` when :attr:`DisplayFormatter.mime_priority`
+    is set.
+
+    It is a dict of the representations computed so far, keyed by format
+    type. The other accepted format types are listed in :attr:`pending`, and
+    :meth:`fill` computes them when they are requested. Once none are
+    pending, the bundle lets go of the object and the formatter, so that it
+    doesn't keep them alive.
+    """
+    def __init__(self, obj, display_formatter, pending=(), metadata=None):
+        super(MimeBundle, self).__init__()
+        self.obj = obj
+        self.display_formatter = display_formatter
+        self.pending = list(pending)
+        if metadata is None:
+            metadata = {}
+        self.metadata = metadata
+
+    def fill(self, include=None):
+        """Compute pending representations.
+
+        Parameters
+        ----------
+        include : list or tuple, optional
+            The format types to compute, which need not be pending. By default
+            all the pending ones are computed.
+
+        Returns the bundle itself, with :attr:`metadata` also updated. Once no
+        format types are pending, nothing more can be computed.
+        """
+        if self.display_formatter is None:
+            return self
+        if include is None:
+            include = self.pending
+        formatters = self.display_formatter.formatters
+        todo = [t for t in include if t not in self and t in formatters]
+        if todo:
+            data, md = self.display_formatter._compute(self.obj, todo)
+            self.update(data)
+            self.metadata.update(md)
+        self.pending = [t for t in self.pending if t not in include]
+        if not self.pending:
+            self.obj = self.display_formatter = None
+        return self
+
+
 class DisplayFormatter(Configurable):
 
     # When set to true only the default plain text formatter will be used.
@@ -85,6 +133,17 @@ def _active_types_changed(self, name, old, new):
                 formatter.enabled = True
             else:
                 formatter.enabled = False
+
+    mime_priority = List(Unicode(), config=True,
+        help="""The format types (MIME types) the frontend accepts, best first.
+
+        When set, :meth:`format` only computes text/plain and the first of
+        these types the object has a representation for, instead of every
+        format type. It then returns a :class:`MimeBundle`, whose other
+        representations can be computed on request.
+
+        By default (empty) all the format types are computed.
+        """)
     
     ipython_display_formatter = ForwardDeclaredInstance('FormatterABC')
     def _ipython_display_formatter_default(self):
@@ -116,7 +175,10 @@ def _formatters_default(self):
     def format(self, obj, include=None, exclude=None):
         """Return a format data dict for an object.
 
-        By default all format types will be computed.
+        By default all format types will be computed. If
+        :attr:`mime_priority` is set, only text/plain and the best available
+        of the accepted types are, and the format dict is a
+        :class:`MimeBundle` that can compute the others on request.
 
         The following MIME types are currently implemented:
 
@@ -157,19 +219,37 @@ def format(self, obj, include=None, exclude=None):
             metadata_dict is a dictionary of metadata about each mime-type output.
             Its keys will be a strict subset of the keys in format_dict.
         """
-        format_dict = {}
-        md_dict = {}
-        
         if self.ipython_display_formatter(obj):
             # object handled itself, don't proceed
             return {}, {}
-        
-        for format_type, formatter in self.formatters.items():
-            if include and format_type not in include:
-                continue
-            if exclude and format_type in exclude:
-                continue
-            
+
+        format_types = [t for t in self.formatters
+                        if not (include and t not in include)
+                        and not (exclude and t in exclude)]
+        if not self.mime_priority:
+            return self._compute(obj, format_types)
+
+        # Negotiated mode: text/plain, and the best accepted representation
+        accepted = [t for t in self.mime_priority
+                    if t in format_types and t != 'text/plain']
+        bundle = MimeBundle(obj, self, pending=accepted)
+        bundle.fill(['text/plain'] if 'text/plain' in format_types else [])
+        for format_type in accepted:
+            bundle.fill([format_type])
+            if format_type in bundle:
+                break
+        return bundle, bundle.metadata
+
+    def _compute(self, obj, format_types):
+        """Compute the given format types for an object.
+
+        Returns (format_dict, metadata_dict), as :meth:`format`.
+        """
+        format_dict = {}
+        md_dict = {}
+
+        for format_type in format_types:
+            formatter = self.formatters[format_type]
             md = None
             try:
                 data = formatter(obj)
@@ -323,6 +403,9 @@ class BaseFormatter(Configurable):
     # The deferred-import type-specific printers.
     # Map (modulename, classname) pairs to the format functions.
     deferred_printers = Dict(config=True)
+
+    # The printers found for each type, shared with the pretty printer.
+    _dispatch_cache = Instance(pretty._DispatchCache, ())
     
     @catch_format_error
     def __call__(self, obj):
@@ -417,9 +500,11 @@ def lookup_by_type(self, typ):
             else:
                 return self.deferred_printers[typ_key]
         else:
-            for cls in pretty._get_mro(typ):
-                if cls in self.type_printers or self._in_deferred_types(cls):
-                    return self.type_printers[cls]
+            cls = self._dispatch_cache.get('lookup', typ,
+                        self.type_printers, self.deferred_printers,
+                        self._find_printer_class)
+            if cls is not None:
+                return self.type_printers[cls]
         
         # If we have reached here, the lookup failed.
         raise KeyError("No registered printer for {0!r}".format(typ))
@@ -460,6 +545,7 @@ def for_type(self, typ, func=None):
         
         if func is not None:
             self.type_printers[typ] = func
+            self._dispatch_cache.clear()
         
         return oldfunc
 
@@ -500,6 +586,7 @@ def for_type_by_name(self, type_module, type_name, func=None):
         
         if func is not None:
             self.deferred_printers[key] = func
+            self._dispatch_cache.clear()
         return oldfunc
     
     def pop(self, typ, default=_raise_key_error):
@@ -541,8 +628,19 @@ def pop(self, typ, default=_raise_key_error):
                 old = self.deferred_printers.pop(_mod_name_key(typ), default)
         if old is _raise_key_error:
             raise KeyError("No registered value for {0!r}".format(typ))
+        self._dispatch_cache.clear()
         return old
 
+    def _find_printer_class(self, typ):
+        """Find the class in the mro of typ with a registered printer.
+
+        Returns None if there is none.
+        """
+        for cls in pretty._get_mro(typ):
+            if cls in self.type_printers or self._in_deferred_types(cls):
+                return cls
+        return None
+
     def _in_deferred_types(self, cls):
         """
         Check if the given class is specified in the deferred type registry.
@@ -597,6 +695,26 @@ def dtype_pprinter(obj, p, cycle):
         Set to 0 to disable truncation.
         """
     )
+    max_chars = Integer(0, config=True,
+        help="""Stop pretty-printing after this many characters.
+
+        The output is then cut there and ends with '...'. This bounds the
+        time and memory used to display very large objects.
+        Set to 0 [default] to disable truncation.
+        """
+    )
+    max_lines = Integer(0, config=True,
+        help="""Stop pretty-printing after this many lines.
+
+        Set to 0 [default] to disable truncation.
+        """
+    )
+    max_depth = Integer(0, config=True,
+        help="""Show containers nested deeper than this as [...], {...} etc.
+
+        Set to 0 [default] to disable truncation.
+        """
+    )
     
     # Look for a _repr_pretty_ methods to use for pretty printing.
     print_method = ObjectName('_repr_pretty_')
@@ -691,9 +809,13 @@ def __call__(self, obj):
             printer = pretty.RepresentationPrinter(stream, self.verbose,
                 self.max_width, self.newline,
                 max_seq_length=self.max_seq_length,
+                max_chars=self.max_chars,
+                max_lines=self.max_lines,
+                max_depth=self.max_depth,
                 singleton_pprinters=self.singleton_printers,
                 type_pprinters=self.type_printers,
-                deferred_pprinters=self.deferred_printers)
+                deferred_pprinters=self.deferred_printers,
+                dispatch_cache=self._dispatch_cache)
             printer.pretty(obj)
             printer.flush()
             return stream.getvalue()
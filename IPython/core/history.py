@@ -15,6 +15,7 @@
 # Stdlib imports
 import atexit
 import datetime
+import hashlib
 import os
 import re
 try:
@@ -25,15 +26,23 @@
     except ImportError:
         sqlite3 = None
 import threading
+import time
+import zlib
+try:
+    import lzma
+except ImportError:
+    lzma = None
 
 # Our own packages
 from traitlets.config.configurable import Configurable
 from decorator import decorator
+from IPython.core.displayhook import OutputCache
 from IPython.utils.decorators import undoc
 from IPython.utils.path import locate_profile
 from IPython.utils import py3compat
 from traitlets import (
-    Any, Bool, Dict, Instance, Integer, List, Unicode, TraitError,
+    Any, Bool, CaselessStrEnum, Dict, Enum, Float, Instance, Integer, List,
+    Unicode, TraitError,
 )
 from IPython.utils.warn import warn
 
@@ -88,7 +97,11 @@ def catch_corrupt_db(f, self, *a, **kw):
     """
     try:
         return f(self, *a, **kw)
-    except (DatabaseError, OperationalError):
+    except (DatabaseError, OperationalError) as e:
+        if _is_locked_error(e):
+            # Another connection is busy with the database, that doesn't
+            # mean it is corrupt.
+            raise
         if os.path.isfile(self.hist_file):
             # Try to move the file out of the way
             base,ext = os.path.splitext(self.hist_file)
@@ -102,6 +115,112 @@ def catch_corrupt_db(f, self, *a, **kw):
         else:
             # The hist_file is probably :memory: or something else.
             raise
+
+
+def _is_locked_error(e):
+    """Whether a SQLite error means the database is locked by another
+    connection, rather than corrupt."""
+    msg = str(e)
+    return 'locked' in msg or 'busy' in msg
+
+
+def _key_condition(op, key, columns=('session', 'line')):
+    """SQL comparing the (session, line) key of rows with key.
+
+    Row values, as in ``(session, line) < (?, ?)``, need SQLite 3.15, so the
+    comparison is spelled out.
+
+    Parameters
+    ----------
+    op : str
+      One of '<', '<=', '>' and '>='.
+    key : tuple
+      (session, line) to compare with.
+    columns : tuple
+      Names of the session and line columns.
+
+    Returns
+    -------
+    The SQL expression, and its parameters.
+    """
+    session, line = columns
+    sql = "(%s %s ? OR (%s = ? AND %s %s ?))" % (session, op[0], session,
+                                                 line, op)
+    return sql, (key[0], key[0], key[1])
+
+
+_fts_supported = None
+
+def fts_supported():
+    """Return True if the SQLite library has FTS5 with the trigram tokenizer.
+
+    The check is done once, against a throwaway in-memory database.
+    """
+    global _fts_supported
+    if _fts_supported is None:
+        _fts_supported = False
+        if sqlite3 is not None:
+            conn = sqlite3.connect(':memory:')
+            try:
+                conn.execute("CREATE VIRTUAL TABLE t USING "
+                             "fts5(x, tokenize='trigram case_sensitive 1')")
+                _fts_supported = True
+            except sqlite3.Error:
+                pass
+            finally:
+                conn.close()
+    return _fts_supported
+
+
+# Bracket expressions and wildcards of a GLOB pattern. The trigram index can
+# only be used if at least 3 literal characters remain between them.
+_glob_special_re = re.compile(r"\[[^\]]*\]|[*?]")
+
+def _glob_uses_index(pattern):
+    """Would the trigram index speed up a GLOB search for this pattern?"""
+    return any(len(lit) >= 3 for lit in _glob_special_re.split(pattern))
+
+
+# Compressed sources and outputs are stored as blobs, starting with a byte
+# identifying the compression method. Plain text is stored as text.
+_compressors = {'zlib': (b'Z', zlib.compress, zlib.decompress)}
+if lzma is not None:
+    _compressors['lzma'] = (b'X', lzma.compress, lzma.decompress)
+_decompressors = dict((tag, decomp) for tag, _, decomp in _compressors.values())
+
+# The compression methods available for history entries
+compression_methods = sorted(_compressors)
+
+def compress_text(text, method='zlib'):
+    """Compress a string for storage in the history database.
+
+    Returns a :func:`sqlite3.Binary` blob, which :func:`decompress_text`
+    turns back into the original string.
+    """
+    tag, compress, _ = _compressors[method]
+    return sqlite3.Binary(tag + compress(text.encode('utf-8')))
+
+def decompress_text(value):
+    """Get the text back from a value stored in the history database.
+
+    Values which are not compressed blobs, i.e. strings or None, are
+    returned unchanged.
+    """
+    if value is None or isinstance(value, py3compat.string_types):
+        return value
+    data = py3compat.buffer_to_bytes(value)
+    try:
+        decompress = _decompressors[data[:1]]
+    except KeyError:
+        raise ValueError("Unknown compression for history entry: %r" % data[:1])
+    return decompress(data[1:]).decode('utf-8')
+
+
+def source_hash(source, source_raw):
+    """Hash identifying an input in the deduplicated history layout."""
+    text = source_raw + u'\0' + source
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
         
 class HistoryAccessorBase(Configurable):
     """An abstract class for History Accessors """
@@ -160,6 +279,83 @@ class HistoryAccessor(HistoryAccessorBase):
         """
     )
 
+    fts_index = Bool(False, config=True,
+        help="""Maintain a full-text (FTS5 trigram) index of the input history.
+
+        When enabled, substring searches (e.g. ``%history -g``) use the index
+        rather than scanning every row of the history table. The index is
+        built the first time it is enabled on an existing database, which can
+        take a while for a large history. If the SQLite library lacks FTS5
+        support, searching falls back to a plain scan.
+        """
+    )
+
+    journal_mode = CaselessStrEnum(
+        ['DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'], None,
+        allow_none=True, config=True,
+        help="""SQLite journal mode for the history database.
+
+        WAL (write-ahead logging) lets the history saving thread write while
+        other connections, e.g. other kernels sharing the same profile, read
+        the database. WAL needs shared memory, so it does not work on network
+        filesystems. By default (None) the journal mode of the database is
+        left alone, so that opening it never fights over the mode with other
+        processes using the same file.
+        """
+    )
+
+    synchronous = CaselessStrEnum(['OFF', 'NORMAL', 'FULL', 'EXTRA'], None,
+        allow_none=True, config=True,
+        help="""SQLite synchronous level for the history database.
+
+        NORMAL syncs to disk less often than SQLite's default of FULL. With
+        the WAL journal it cannot corrupt the database, but the last
+        transactions may be lost on power failure, so it is a good match for
+        journal_mode = 'WAL'. By default (None) SQLite's own level is used.
+        """
+    )
+
+    page_size = Integer(1000, config=True,
+        help="""Number of rows fetched per query when streaming history.
+
+        Long results, such as ``%history -g`` over the whole database, are
+        read one page at a time, so that only one page is held in memory and
+        no read transaction is kept open while the rows are consumed.
+        """
+    )
+
+    compress_threshold = Integer(0, config=True,
+        help="""Compress inputs and outputs longer than this many characters.
+
+        Large pasted cells and, with ``HistoryManager.db_log_output``, big
+        output reprs can make the history database grow quickly. Entries
+        above this size are stored compressed, and decompressed transparently
+        when read. 0 (the default) disables compression. Existing entries can
+        be rewritten with ``ipython history compact``.
+        """
+    )
+
+    compression = Enum(compression_methods, 'zlib', config=True,
+        help="Compression method for entries above compress_threshold."
+    )
+
+    dedup_sources = Bool(False, config=True,
+        help="""Store each distinct input only once in the history database.
+
+        Repeated commands are common in history. With this option, the text
+        of inputs lives in a ``sources`` table keyed by a hash of its content,
+        and history lines only refer to it. Unique searches (``%history -g
+        -u``) then just read the distinct sources. An existing database is
+        converted the first time it is opened with this option; it keeps the
+        deduplicated layout from then on.
+        """
+    )
+
+    # Whether the full-text index is present and kept in sync
+    _fts_active = Bool(False)
+    # Whether the database uses the deduplicated layout (see dedup_sources)
+    _dedup = Bool(False)
+
     # The SQLite database
     db = Any()
     def _db_changed(self, name, old, new):
@@ -227,19 +423,159 @@ def init_db(self):
         kwargs = dict(detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
         kwargs.update(self.connection_options)
         self.db = sqlite3.connect(self.hist_file, **kwargs)
+        self._configure_connection(self.db)
         self.db.execute("""CREATE TABLE IF NOT EXISTS sessions (session integer
                         primary key autoincrement, start timestamp,
                         end timestamp, num_cmds integer, remark text)""")
+        if self.dedup_sources:
+            self._init_dedup()
         self.db.execute("""CREATE TABLE IF NOT EXISTS history
                 (session integer, line integer, source text, source_raw text,
                 PRIMARY KEY (session, line))""")
+        self._dedup = self.db.execute("""SELECT count(*) FROM sqlite_master
+                        WHERE type='view' AND name='history'""").fetchone()[0] > 0
         # Output history is optional, but ensure the table's there so it can be
         # enabled later.
         self.db.execute("""CREATE TABLE IF NOT EXISTS output_history
                         (session integer, line integer, output text,
                         PRIMARY KEY (session, line))""")
+        self._fts_active = self.fts_index and self._init_fts()
         self.db.commit()
 
+    def _configure_connection(self, conn):
+        """Apply the configured journal mode and synchronous level to a
+        connection, and register the function to search compressed entries."""
+        if self.journal_mode:
+            try:
+                conn.execute("PRAGMA journal_mode=%s" % self.journal_mode)
+            except OperationalError as e:
+                # Changing the journal mode needs the database to ourselves,
+                # which it isn't while another connection is writing.
+                if not _is_locked_error(e):
+                    raise
+                warn("Could not set the history journal mode to %s: %s"
+                     % (self.journal_mode, e))
+        if self.synchronous:
+            conn.execute("PRAGMA synchronous=%s" % self.synchronous)
+        conn.create_function('history_text', 1, decompress_text)
+
+    def _compress(self, text):
+        """Compress text for storage if it is above compress_threshold."""
+        if self.compress_threshold and text is not None and \
+                len(text) > self.compress_threshold:
+            return compress_text(text, self.compression)
+        return text
+
+    def _init_dedup(self):
+        """Set up the deduplicated layout, converting the database if needed.
+
+        Distinct inputs are stored in the ``sources`` table, along with the
+        (session, line) where they were last entered. The ``history_lines``
+        table maps each (session, line) to a source, and ``history`` becomes
+        a view joining the two, so that queries on it keep working.
+        """
+        self.db.execute("""CREATE TABLE IF NOT EXISTS sources
+                (source_id integer primary key, hash text unique, source text,
+                source_raw text, last_session integer, last_line integer)""")
+        self.db.execute("""CREATE INDEX IF NOT EXISTS sources_last
+                ON sources(last_session, last_line)""")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS history_lines
+                (session integer, line integer, source_id integer,
+                PRIMARY KEY (session, line))""")
+        is_table = self.db.execute("""SELECT count(*) FROM sqlite_master
+                        WHERE type='table' AND name='history'""").fetchone()[0]
+        if is_table:
+            # The full-text index refers to the old table, it is rebuilt on
+            # the sources table by _init_fts.
+            self.db.execute("DROP TABLE IF EXISTS history_fts")
+            last = 0
+            while True:
+                rows = self.db.execute("""SELECT rowid, session, line, source,
+                        source_raw FROM history WHERE rowid > ? ORDER BY rowid
+                        LIMIT ?""", (last, self.page_size)).fetchall()
+                if not rows:
+                    break
+                self._insert_sources(self.db,
+                    [(ses, lin, source_hash(decompress_text(src),
+                                            decompress_text(raw)), src, raw)
+                     for _, ses, lin, src, raw in rows])
+                last = rows[-1][0]
+            self.db.execute("DROP TABLE history")
+        self.db.execute("""CREATE VIEW IF NOT EXISTS history AS
+                SELECT session, line, source, source_raw, source_id
+                FROM history_lines JOIN sources USING (source_id)""")
+
+    def _insert_sources(self, conn, rows):
+        """Insert lines in the deduplicated layout.
+
+        rows are tuples of (session, line, hash, source, source_raw), with
+        source and source_raw as they should be stored.
+        """
+        conn.executemany("""INSERT OR IGNORE INTO sources
+                (hash, source, source_raw) VALUES (?, ?, ?)""",
+                [(h, src, raw) for _, _, h, src, raw in rows])
+        older = _key_condition('<', (None, None),
+                               ('last_session', 'last_line'))[0]
+        conn.executemany("""UPDATE sources SET last_session = ?, last_line = ?
+                WHERE hash = ? AND (last_session IS NULL OR %s)""" % older,
+                [(ses, lin, h, ses, ses, lin) for ses, lin, h, _, _ in rows])
+        conn.executemany("""INSERT INTO history_lines
+                SELECT ?, ?, source_id FROM sources WHERE hash = ?""",
+                [(ses, lin, h) for ses, lin, h, _, _ in rows])
+
+    def _init_fts(self):
+        """Create the full-text index of the history table, if possible.
+
+        The index is an external content FTS5 table, kept in sync with the
+        history table (or the sources table, in the deduplicated layout) by
+        triggers. Returns True if the index can be used.
+        """
+        triggers = ('history_fts_insert', 'history_fts_delete',
+                    'history_fts_update')
+        if not fts_supported():
+            # Triggers left by an FTS-capable SQLite would make every write
+            # to the history table fail here, so get rid of them. The index
+            # is rebuilt next time the database is opened with FTS support.
+            for trigger in triggers:
+                self.db.execute("DROP TRIGGER IF EXISTS %s" % trigger)
+            return False
+
+        in_sync = self.db.execute("""SELECT count(*) FROM sqlite_master WHERE
+                        type='trigger' AND name LIKE 'history_fts_%'"""
+                        ).fetchone()[0] == len(triggers)
+        if self._dedup:
+            table, key_columns = 'sources', 'last_session, last_line'
+        else:
+            table, key_columns = 'history', 'session, line'
+        self.db.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS history_fts
+                USING fts5(source, source_raw, content='{0}',
+                tokenize='trigram case_sensitive 1')""".format(table))
+        self.db.execute("""CREATE TRIGGER IF NOT EXISTS history_fts_insert
+                AFTER INSERT ON {0} BEGIN
+                INSERT INTO history_fts(rowid, source, source_raw)
+                VALUES (new.rowid, new.source, new.source_raw); END
+                """.format(table))
+        self.db.execute("""CREATE TRIGGER IF NOT EXISTS history_fts_delete
+                AFTER DELETE ON {0} BEGIN
+                INSERT INTO history_fts(history_fts, rowid, source, source_raw)
+                VALUES ('delete', old.rowid, old.source, old.source_raw); END
+                """.format(table))
+        self.db.execute("""CREATE TRIGGER IF NOT EXISTS history_fts_update
+                AFTER UPDATE OF source, source_raw ON {0} BEGIN
+                INSERT INTO history_fts(history_fts, rowid, source, source_raw)
+                VALUES ('delete', old.rowid, old.source, old.source_raw);
+                INSERT INTO history_fts(rowid, source, source_raw)
+                VALUES (new.rowid, new.source, new.source_raw); END
+                """.format(table))
+        # Compressed entries are searched outside the index (see search)
+        for column in ('source', 'source_raw'):
+            self.db.execute("""CREATE INDEX IF NOT EXISTS {0}_{1}_blobs
+                    ON {0}({2}) WHERE typeof({1}) = 'blob'""".format(
+                        table, column, key_columns))
+        if not in_sync:
+            self.db.execute("INSERT INTO history_fts(history_fts) VALUES('rebuild')")
+        return True
+
     def writeout_cache(self):
         """Overridden by HistoryManager to dump the cache before certain
         database lookups."""
@@ -271,9 +607,98 @@ def _run_sql(self, sql, params, raw=True, output=False):
             toget = "history.%s, output_history.output" % toget
         cur = self.db.execute("SELECT session, line, %s FROM %s " %\
                                 (toget, sqlfrom) + sql, params)
-        if output:    # Regroup into 3-tuples, and parse JSON
-            return ((ses, lin, (inp, out)) for ses, lin, inp, out in cur)
-        return cur
+        if output:    # Regroup into 3-tuples, and decompress
+            return ((ses, lin, (decompress_text(inp), decompress_text(out)))
+                    for ses, lin, inp, out in cur)
+        return ((ses, lin, decompress_text(inp)) for ses, lin, inp in cur)
+
+    def _run_sql_paged(self, where, params, raw=True, output=False,
+                       start=None, stop=None, page_size=None):
+        """Run a query like :meth:`_run_sql`, fetching the results in pages.
+
+        Each page is a separate query, resuming after the (session, line) key
+        of the last row of the previous page.
+
+        Parameters
+        ----------
+        where : str
+          Filtering expression to go after WHERE, or an empty string.
+        params : tuple
+          Parameters for the filtering expression.
+        raw, output : bool
+          See :meth:`get_range`
+        start, stop : tuple, optional
+          (session, line) keys bounding the results. ``start`` is included,
+          ``stop`` is not.
+        page_size : int, optional
+          Number of rows per query. Defaults to :attr:`page_size`.
+
+        Returns
+        -------
+        An iterator over tuples as :meth:`get_range`, in (session, line) order.
+        """
+        page_size = page_size or self.page_size
+        clauses = ["(%s)" % where] if where else []
+        if stop is not None:
+            clause, stop_params = _key_condition('<', stop)
+            clauses.append(clause)
+            params = params + stop_params
+        key, op = start, ">="
+        while True:
+            sql = clauses[:]
+            key_params = ()
+            if key is not None:
+                clause, key_params = _key_condition(op, key)
+                sql.append(clause)
+            sql = "WHERE " + " AND ".join(sql) if sql else ""
+            page = list(self._run_sql(sql + " ORDER BY session, line LIMIT ?",
+                                      params + key_params + (page_size,),
+                                      raw=raw, output=output))
+            for row in page:
+                yield row
+            if len(page) < page_size:
+                return
+            key, op = page[-1][:2], ">"
+
+    def _nth_last_key(self, n, where="", params=()):
+        """Get the (session, line) key of the n-th last row matching where,
+        or None if there are fewer rows."""
+        sql = "SELECT session, line FROM history "
+        if where:
+            sql += "WHERE %s " % where
+        sql += "ORDER BY session DESC, line DESC LIMIT 1 OFFSET ?"
+        return self.db.execute(sql, params + (n - 1,)).fetchone()
+
+    @catch_corrupt_db
+    def get_page(self, after=None, page_size=None, raw=True, output=False):
+        """Get one page of lines from the history database.
+
+        Lines are ordered by session and line number. To walk through the
+        whole database, pass the (session, line) of the last line of each
+        page as ``after`` to get the next one, until an empty page comes back.
+
+        Parameters
+        ----------
+        after : tuple, optional
+          (session, line) key after which the page starts. By default, start
+          from the beginning of the database.
+        page_size : int, optional
+          Number of lines to get. Defaults to :attr:`page_size`.
+        raw, output : bool
+          See :meth:`get_range`
+
+        Returns
+        -------
+        A list of tuples as :meth:`get_range`
+        """
+        self.writeout_cache()
+        page_size = page_size or self.page_size
+        sql, params = "", ()
+        if after is not None:
+            sql, params = _key_condition('>', after)
+            sql = "WHERE %s " % sql
+        return list(self._run_sql(sql + "ORDER BY session, line LIMIT ?",
+                                  params + (page_size,), raw=raw, output=output))
 
     @needs_sqlite
     @catch_corrupt_db
@@ -324,22 +749,25 @@ def get_tail(self, n=10, raw=True, output=False, include_latest=False):
         raw, output : bool
           See :meth:`get_range`
         include_latest : bool
-          If False (default), n+1 lines are fetched, and the latest one
-          is discarded. This is intended to be used where the function
-          is called by a user command, which it should not return.
+          If False (default), the latest line is left out, and the n lines
+          before it are returned. This is intended to be used where the
+          function is called by a user command, which it should not return.
 
         Returns
         -------
-        Tuples as :meth:`get_range`
+        Tuples as :meth:`get_range`, read from the database one page at
+        a time.
         """
         self.writeout_cache()
+        stop = None
         if not include_latest:
             n += 1
-        cur = self._run_sql("ORDER BY session DESC, line DESC LIMIT ?",
-                                (n,), raw=raw, output=output)
-        if not include_latest:
-            return reversed(list(cur)[1:])
-        return reversed(list(cur))
+            stop = self._nth_last_key(1)
+        if n <= 0 or (stop is not None and n == 1):
+            return iter([])
+        start = self._nth_last_key(n)
+        return self._run_sql_paged("", (), raw=raw, output=output,
+                                   start=start, stop=stop)
 
     @catch_corrupt_db
     def search(self, pattern="*", raw=True, search_raw=True,
@@ -347,6 +775,9 @@ def search(self, pattern="*", raw=True, search_raw=True,
         """Search the database using unix glob-style matching (wildcards
         * and ?).
 
+        If :attr:`fts_index` is enabled, patterns containing at least three
+        consecutive literal characters are looked up in the full-text index.
+
         Parameters
         ----------
         pattern : str
@@ -365,23 +796,72 @@ def search(self, pattern="*", raw=True, search_raw=True,
         -------
         Tuples as :meth:`get_range`
         """
-        tosearch = "source_raw" if search_raw else "source"
-        if output:
-            tosearch = "history." + tosearch
+        column = "source_raw" if search_raw else "source"
         self.writeout_cache()
-        sqlform = "WHERE %s GLOB ?" % tosearch
-        params = (pattern,)
-        if unique:
-            sqlform += ' GROUP BY {0}'.format(tosearch)
+        # In the deduplicated layout, unique searches only look at sources
+        table = "sources" if unique and self._dedup else "history"
+        tosearch = "%s.%s" % (table, column)
+        if self._fts_active and _glob_uses_index(pattern):
+            # Compressed entries are not in the index, look them up separately
+            key, source_table = "rowid", "history"
+            if self._dedup:
+                key, source_table = "source_id", "sources"
+            where = ("{0}.{1} IN (SELECT rowid FROM history_fts WHERE {3} "
+                     "GLOB ?) OR {0}.{1} IN (SELECT {1} FROM {2} WHERE "
+                     "typeof({3}) = 'blob' AND history_text({3}) GLOB ?)"
+                     ).format(table, key, source_table, column)
+            params = (pattern, pattern)
+        else:
+            where = ("CASE WHEN typeof({0}) = 'blob' THEN history_text({0}) "
+                     "ELSE {0} END GLOB ?").format(tosearch)
+            params = (pattern,)
+        if not unique:
+            start = None
+            if n is not None:
+                if n <= 0:
+                    return iter([])
+                start = self._nth_last_key(n, where, params)
+            return self._run_sql_paged(where, params, raw=raw, output=output,
+                                       start=start)
+        if self._dedup:
+            return self._search_sources(where, params, raw=raw,
+                                        output=output, n=n)
+        sqlform = "WHERE %s GROUP BY %s" % (where, tosearch)
         if n is not None:
             sqlform += " ORDER BY session DESC, line DESC LIMIT ?"
             params += (n,)
-        elif unique:
+        else:
             sqlform += " ORDER BY session, line"
         cur = self._run_sql(sqlform, params, raw=raw, output=output)
         if n is not None:
             return reversed(list(cur))
         return cur
+
+    def _search_sources(self, where, params, raw=True, output=False, n=None):
+        """Unique search in the deduplicated layout.
+
+        Each matching source is reported at the (session, line) where it was
+        last entered. Parameters are as for :meth:`search`, with ``where``
+        the filtering expression on the sources table.
+        """
+        toget = 'source_raw' if raw else 'source'
+        sqlfrom = "sources"
+        if output:
+            sqlfrom = ("sources LEFT JOIN output_history ON "
+                       "session = last_session AND line = last_line")
+            toget += ", output"
+        sql = "SELECT last_session, last_line, %s FROM %s WHERE %s" % (
+                    toget, sqlfrom, where)
+        if n is not None:
+            sql += " ORDER BY last_session DESC, last_line DESC LIMIT ?"
+            rows = reversed(self.db.execute(sql, params + (n,)).fetchall())
+        else:
+            rows = self.db.execute(sql + " ORDER BY last_session, last_line",
+                                   params)
+        if output:
+            return ((ses, lin, (decompress_text(inp), decompress_text(out)))
+                    for ses, lin, inp, out in rows)
+        return ((ses, lin, decompress_text(inp)) for ses, lin, inp in rows)
     
     @catch_corrupt_db
     def get_range(self, session, start=1, stop=None, raw=True,output=False):
@@ -465,6 +945,8 @@ def _dir_hist_default(self):
     # A dict of output history, keyed with ints from the shell's
     # execution count.
     output_hist = Dict()
+    def _output_hist_default(self):
+        return OutputCache()
     # The text/plain repr of outputs.
     output_hist_reprs = Dict()
 
@@ -478,9 +960,27 @@ def _dir_hist_default(self):
         help="Write to database every x commands (higher values save disk access & power).\n"
         "Values of 1 or less effectively disable caching."
     )
+    db_cache_max_age = Float(0, config=True,
+        help="When caching, write to database at most this many seconds after\n"
+        "a command is cached, even if fewer than db_cache_size commands are\n"
+        "waiting. 0 (the default) means no time limit."
+    )
+    db_cache_max_bytes = Integer(0, config=True,
+        help="When caching, write to database as soon as the cached input and\n"
+        "output text exceeds this many bytes. 0 (the default) means no limit."
+    )
     # The input and output caches
     db_input_cache = List()
     db_output_cache = List()
+    # Size of the text in the caches, and when the oldest entry was added
+    _db_cache_bytes = Integer(0)
+    _db_cache_since = Float(None, allow_none=True)
+
+    # Counters for the writes to the database: the number of flushes of the
+    # caches, the rows written and the total time spent writing, in seconds.
+    writeout_stats = Dict()
+    def _writeout_stats_default(self):
+        return {'flushes': 0, 'rows': 0, 'time': 0.}
     
     # History saving in separate thread
     save_thread = Instance('IPython.core.history.HistorySavingThread',
@@ -687,9 +1187,7 @@ def store_inputs(self, line_num, source, source_raw=None):
 
         with self.db_input_cache_lock:
             self.db_input_cache.append((line_num, source, source_raw))
-            # Trigger to flush cache and write to DB.
-            if len(self.db_input_cache) >= self.db_cache_size:
-                self.save_flag.set()
+            self._cache_added(len(source) + len(source_raw))
 
         # update the auto _i variables
         self._iii = self._ii
@@ -723,52 +1221,118 @@ def store_output(self, line_num):
 
         with self.db_output_cache_lock:
             self.db_output_cache.append((line_num, output))
-        if self.db_cache_size <= 1:
+            self._cache_added(len(output))
+
+    def _cache_added(self, nbytes):
+        """Account for a new entry in the write caches.
+
+        This wakes the saving thread if the caches are due to be written, or
+        if a db_cache_max_age timer must be started for the first entry.
+        """
+        start_timer = False
+        if self._db_cache_since is None:
+            self._db_cache_since = time.time()
+            start_timer = self.db_cache_max_age > 0
+        self._db_cache_bytes += nbytes
+        if start_timer or self._writeout_due():
             self.save_flag.set()
 
+    def _writeout_due(self):
+        """Whether the cached history should be written to the database now.
+
+        That is when db_cache_size inputs, or db_cache_max_bytes of text, are
+        waiting, or when the oldest entry is older than db_cache_max_age.
+        """
+        if self._db_cache_since is None:
+            return False
+        if self.db_cache_size <= 1 or \
+                len(self.db_input_cache) >= self.db_cache_size:
+            return True
+        if self.db_cache_max_bytes and \
+                self._db_cache_bytes >= self.db_cache_max_bytes:
+            return True
+        return self._writeout_wait_time() == 0
+
+    def _writeout_wait_time(self):
+        """Seconds until the cached history reaches db_cache_max_age, or None
+        if there is no time limit (or nothing cached)."""
+        since = self._db_cache_since
+        if since is None or not self.db_cache_max_age:
+            return None
+        return max(0., since + self.db_cache_max_age - time.time())
+
     def _writeout_input_cache(self, conn):
-        with conn:
-            for line in self.db_input_cache:
-                conn.execute("INSERT INTO history VALUES (?, ?, ?, ?)",
-                                (self.session_number,)+line)
+        if self._dedup:
+            self._insert_sources(conn,
+                [(self.session_number, line_num, source_hash(source, source_raw),
+                  self._compress(source), self._compress(source_raw))
+                 for line_num, source, source_raw in self.db_input_cache])
+            return
+        conn.executemany("INSERT INTO history VALUES (?, ?, ?, ?)",
+                    [(self.session_number, line_num, self._compress(source),
+                      self._compress(source_raw))
+                     for line_num, source, source_raw in self.db_input_cache])
 
     def _writeout_output_cache(self, conn):
-        with conn:
-            for line in self.db_output_cache:
-                conn.execute("INSERT INTO output_history VALUES (?, ?, ?)",
-                                (self.session_number,)+line)
+        conn.executemany("INSERT INTO output_history VALUES (?, ?, ?)",
+                    [(self.session_number, line_num, self._compress(output))
+                     for line_num, output in self.db_output_cache])
 
     @needs_sqlite
     def writeout_cache(self, conn=None):
-        """Write any entries in the cache to the database."""
+        """Write any entries in the cache to the database.
+
+        Inputs and outputs are normally written in a single transaction."""
         if conn is None:
             conn = self.db
 
-        with self.db_input_cache_lock:
+        with self.db_input_cache_lock, self.db_output_cache_lock:
+            if not (self.db_input_cache or self.db_output_cache):
+                return
+            t0 = time.time()
             try:
-                self._writeout_input_cache(conn)
-            except sqlite3.IntegrityError:
-                self.new_session(conn)
-                print("ERROR! Session/line number was not unique in",
-                      "database. History logging moved to new session",
-                                                self.session_number)
                 try:
-                    # Try writing to the new session. If this fails, don't
-                    # recurse
-                    self._writeout_input_cache(conn)
+                    with conn:
+                        self._writeout_input_cache(conn)
+                        self._writeout_output_cache(conn)
                 except sqlite3.IntegrityError:
-                    pass
+                    # The transaction was rolled back, so nothing was written.
+                    self._writeout_cache_separately(conn)
             finally:
+                stats = self.writeout_stats
+                stats['flushes'] += 1
+                stats['rows'] += len(self.db_input_cache) + len(self.db_output_cache)
+                stats['time'] += time.time() - t0
                 self.db_input_cache = []
+                self.db_output_cache = []
+                self._db_cache_bytes = 0
+                self._db_cache_since = None
 
-        with self.db_output_cache_lock:
+    def _writeout_cache_separately(self, conn):
+        """Write the input and output caches in separate transactions, after
+        a clash in the session/line numbers."""
+        try:
+            with conn:
+                self._writeout_input_cache(conn)
+        except sqlite3.IntegrityError:
+            self.new_session(conn)
+            print("ERROR! Session/line number was not unique in",
+                  "database. History logging moved to new session",
+                                            self.session_number)
             try:
-                self._writeout_output_cache(conn)
+                # Try writing to the new session. If this fails, don't
+                # recurse
+                with conn:
+                    self._writeout_input_cache(conn)
             except sqlite3.IntegrityError:
-                print("!! Session/line number for output was not unique",
-                      "in database. Output will not be stored.")
-            finally:
-                self.db_output_cache = []
+                pass
+
+        try:
+            with conn:
+                self._writeout_output_cache(conn)
+        except sqlite3.IntegrityError:
+            print("!! Session/line number for output was not unique",
+                  "in database. Output will not be stored.")
 
 
 class HistorySavingThread(threading.Thread):
@@ -776,8 +1340,11 @@ class HistorySavingThread(threading.Thread):
     the UI isn't held up while that happens.
 
     It waits for the HistoryManager's save_flag to be set, then writes out
-    the history cache. The main thread is responsible for setting the flag when
-    the cache size reaches a defined threshold."""
+    the history cache if it is due (see :attr:`HistoryManager.db_cache_size`,
+    :attr:`~HistoryManager.db_cache_max_bytes` and
+    :attr:`~HistoryManager.db_cache_max_age`). The main thread is responsible
+    for setting the flag when the cache reaches a size threshold; the age
+    limit is enforced by waiting on the flag with a timeout."""
     daemon = True
     stop_now = False
     enabled = True
@@ -794,13 +1361,16 @@ def run(self):
             self.db = sqlite3.connect(self.history_manager.hist_file,
                             **self.history_manager.connection_options
             )
+            self.history_manager._configure_connection(self.db)
             while True:
-                self.history_manager.save_flag.wait()
+                self.history_manager.save_flag.wait(
+                    self.history_manager._writeout_wait_time())
                 if self.stop_now:
                     self.db.close()
                     return
                 self.history_manager.save_flag.clear()
-                self.history_manager.writeout_cache(self.db)
+                if self.history_manager._writeout_due():
+                    self.history_manager.writeout_cache(self.db)
         except Exception as e:
             print(("The history saving thread hit an unexpected error (%s)."
                    "History will not be written to the database.") % repr(e))
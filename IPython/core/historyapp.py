@@ -11,8 +11,12 @@
 
 from traitlets.config.application import Application
 from IPython.core.application import BaseIPythonApplication
-from traitlets import Bool, Int, Dict
+from traitlets import Bool, Int, Dict, Enum
+from IPython.core.history import (
+    compress_text, compression_methods, decompress_text,
+)
 from IPython.utils.io import ask_yes_no
+from IPython.utils.py3compat import buffer_to_bytes
 
 trim_hist_help = """Trim the IPython history database to the last 1000 entries.
 
@@ -30,6 +34,14 @@
 This is an handy alias to `ipython history trim --keep=0`
 """
 
+compact_hist_help = """Compress large entries in the IPython history database.
+
+Inputs and outputs longer than `--threshold=` characters (default: 1024) are
+rewritten in compressed form, shorter ones are stored uncompressed, then the
+database file is vacuumed to reclaim the space. Compressed entries are read
+transparently by IPython. Use `--threshold=0` to decompress all entries.
+"""
+
 
 class HistoryTrim(BaseIPythonApplication):
     description = trim_hist_help
@@ -138,6 +150,73 @@ def start(self):
                 default="no", interrupt="no"):
             HistoryTrim.start(self)
 
+class HistoryCompact(BaseIPythonApplication):
+    description = compact_hist_help
+
+    threshold = Int(1024, config=True,
+        help="Compress entries longer than this many characters (0: none).")
+
+    method = Enum(compression_methods, 'zlib', config=True,
+        help="Compression method to use.")
+
+    aliases = Dict(dict(
+        threshold = 'HistoryCompact.threshold',
+        method = 'HistoryCompact.method',
+    ))
+
+    def _recode(self, value):
+        """Compress or decompress a stored value according to the threshold.
+
+        The value itself is returned if it is already stored as it should be.
+        """
+        text = decompress_text(value)
+        if self.threshold and text is not None and len(text) > self.threshold:
+            new = compress_text(text, self.method)
+            if text is not value and \
+                    buffer_to_bytes(new) == buffer_to_bytes(value):
+                return value
+            return new
+        return text
+
+    def _compact_table(self, con, table, columns, pagesize=1000):
+        """Rewrite the given columns of a table, one page of rows at a time."""
+        select = 'SELECT rowid, %s FROM %s WHERE rowid > ? ORDER BY rowid LIMIT ?' % (
+                        ', '.join(columns), table)
+        update = 'UPDATE %s SET %s WHERE rowid = ?' % (
+                        table, ', '.join('%s = ?' % c for c in columns))
+        last = 0
+        while True:
+            rows = list(con.execute(select, (last, pagesize)))
+            if not rows:
+                return
+            updates = []
+            for row in rows:
+                new = [self._recode(v) for v in row[1:]]
+                if any(n is not old for n, old in zip(new, row[1:])):
+                    updates.append(tuple(new) + (row[0],))
+            with con:
+                con.executemany(update, updates)
+            last = rows[-1][0]
+
+    def start(self):
+        profile_dir = self.profile_dir.location
+        hist_file = os.path.join(profile_dir, 'history.sqlite')
+        before = os.path.getsize(hist_file)
+        con = sqlite3.connect(hist_file)
+
+        # In the deduplicated layout, history is a view on the sources table
+        dedup = con.execute("SELECT count(*) FROM sqlite_master WHERE "
+                            "type='view' AND name='history'").fetchone()[0]
+        self._compact_table(con, 'sources' if dedup else 'history',
+                            ('source', 'source_raw'))
+        self._compact_table(con, 'output_history', ('output',))
+        print("Vacuuming the history database...")
+        con.execute('VACUUM')
+        con.close()
+        after = os.path.getsize(hist_file)
+        print("History database compacted from %d to %d bytes." % (before, after))
+
+
 class HistoryApp(Application):
     name = u'ipython-history'
     description = "Manage the IPython history database."
@@ -145,6 +224,7 @@ class HistoryApp(Application):
     subcommands = Dict(dict(
         trim = (HistoryTrim, HistoryTrim.description.splitlines()[0]),
         clear = (HistoryClear, HistoryClear.description.splitlines()[0]),
+        compact = (HistoryCompact, HistoryCompact.description.splitlines()[0]),
     ))
 
     def start(self):
@@ -308,10 +308,14 @@ def push(self, lines):
             return False
 
         self._update_indent(lines)
+        return self._compile_source()
+
+    def _compile_source(self):
+        """Compile the current source, and return whether it is complete."""
         try:
             with warnings.catch_warnings():
                 warnings.simplefilter('error', SyntaxWarning)
-                self.code = self._compile(source, symbol="exec")
+                self.code = self._compile(self.source, symbol="exec")
         # Invalid syntax can produce any of a number of different errors from
         # inside the compiler, so we have to catch them all.  Syntax errors
         # immediately produce a 'ready' block, so the invalid Python can be
@@ -470,6 +474,10 @@ class IPythonInputSplitter(InputSplitter):
 
     # List with lines of raw input accumulated so far.
     _buffer_raw = None
+    # Whether push() is storing lines without compiling them, and whether
+    # some were stored that way
+    _deferring = False
+    _deferred = False
 
     def __init__(self, line_input_checker=True, physical_line_transforms=None,
                     logical_line_transforms=None, python_line_transforms=None):
@@ -526,6 +534,7 @@ def reset(self):
         """Reset the input buffer and associated state."""
         super(IPythonInputSplitter, self).reset()
         self._buffer_raw[:] = []
+        self._deferred = False
         self.source_raw = ''
         self.transformer_accumulating = False
         self.within_python_line = False
@@ -637,9 +646,28 @@ def push(self, lines):
         # flush the buffer.
         self._store(lines, self._buffer_raw, 'source_raw')
 
-        for line in lines_list:
-            out = self.push_line(line)
-
+        # Only the state after the last line matters, so the lines are stored
+        # and the source is compiled once at the end, rather than after every
+        # line (which is quadratic in the length of the cell).
+        self._deferring = True
+        try:
+            for line in lines_list:
+                out = self.push_line(line)
+        finally:
+            self._deferring = False
+            if self._deferred:
+                self.source = self._set_source(self._buffer)
+
+        if self._deferred:
+            self._deferred = False
+            self.code, self._is_complete = None, None
+            self._is_invalid = False
+            if self.source.endswith('\\\n'):
+                is_complete = False
+            else:
+                is_complete = self._compile_source()
+            if not self.transformer_accumulating:
+                out = is_complete
         return out
     
     def push_line(self, line):
@@ -679,4 +707,17 @@ def _accumulating(dbg):
 
         #print("transformers clear") #debug
         self.transformer_accumulating = False
+        if self._deferring:
+            self._defer_line(line)
+            return False
         return super(IPythonInputSplitter, self).push(line)
+
+    def _defer_line(self, line):
+        """Store a line like InputSplitter.push, without compiling it."""
+        if not line.endswith('\n'):
+            line += '\n'
+        self._buffer.append(line)
+        self._deferred = True
+        # The indentation is not updated after a line continuation
+        if not line.endswith('\\\n'):
+            self._update_indent(line)
@@ -118,6 +118,43 @@ def reset(self):
         """
         return self.coro.send(None)
 
+# Quotes, brackets, comments and escapes, or anything which may make an error
+# token
+_bracket_scan_re = re.compile(r'''\\.|'{3}|"{3}|!=|['"#()\[\]{}]|[^\w\s.,:;=+\-*/%<>&|^~@]''',
+                              re.UNICODE)
+
+def _scan_brackets(line, depth, quote):
+    """Follow the open brackets and strings through a line of Python.
+
+    Returns the new bracket depth and open string quote, or None if the line
+    has anything unusual for which the tokenizer must be used.
+    """
+    for m in _bracket_scan_re.finditer(line):
+        tok = m.group()
+        if quote:
+            # Inside a string only the closing quote matters, and escapes
+            # were matched as a whole
+            if tok == quote or (len(quote) == 1 and tok[0] == quote):
+                quote = None
+            continue
+        if tok == '#':
+            break
+        elif tok in ('(', '[', '{'):
+            depth += 1
+        elif tok in (')', ']', '}'):
+            depth -= 1
+            if depth < 0:
+                return None
+        elif tok[0] in '\'"':
+            quote = tok
+        elif tok != '!=':
+            return None
+    if quote and len(quote) == 1:
+        # Unterminated string
+        return None
+    return depth, quote
+
+
 class TokenInputTransformer(InputTransformer):
     """Wrapper for a token-based input transformer.
     
@@ -126,8 +163,11 @@ class TokenInputTransformer(InputTransformer):
     """
     def __init__(self, func):
         self.func = func
+        self.buf = []
         self.current_line = ""
         self.line_used = False
+        # Open brackets and string of the current statement, if known
+        self.scan_state = (0, None)
         self.reset_tokenizer()
     
     def reset_tokenizer(self):
@@ -140,10 +180,19 @@ def get_line(self):
         return self.current_line
     
     def push(self, line):
-        self.current_line += line + "\n"
-        if self.current_line.isspace():
+        self.buf.append(line + "\n")
+        if len(self.buf) == 1 and self.buf[0].isspace():
             return self.reset()
-        
+
+        # Don't tokenize the whole statement again for each of its lines when
+        # it certainly continues: this would be quadratic for long statements.
+        if self.scan_state is not None:
+            self.scan_state = _scan_brackets(line, *self.scan_state)
+            if self.scan_state is not None and \
+                    (self.scan_state[0] > 0 or self.scan_state[1]):
+                return None
+
+        self.current_line = u''.join(self.buf)
         self.line_used = False
         tokens = []
         stop_at_NL = False
@@ -164,13 +213,17 @@ def push(self, line):
         return self.output(tokens)
     
     def output(self, tokens):
+        self.buf = []
         self.current_line = ""
+        self.scan_state = (0, None)
         self.reset_tokenizer()
         return untokenize(self.func(tokens)).rstrip('\n')
     
     def reset(self):
-        l = self.current_line
+        l = u''.join(self.buf)
+        self.buf = []
         self.current_line = ""
+        self.scan_state = (0, None)
         self.reset_tokenizer()
         if l:
             return l.rstrip('\n')
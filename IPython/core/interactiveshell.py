@@ -26,6 +26,7 @@
 import types
 import subprocess
 import warnings
+from collections import OrderedDict
 from io import open as io_open
 
 from pickleshare import PickleShareDB
@@ -41,10 +42,13 @@
 from IPython.core.autocall import ExitAutocall
 from IPython.core.builtin_trap import BuiltinTrap
 from IPython.core.events import EventManager, available_events
-from IPython.core.compilerop import CachingCompiler, check_linecache_ipython
+from IPython.core.compilerop import (CachingCompiler, check_linecache_ipython,
+                                     code_name, code_number, CodeCache,
+                                     ReplayCompiler)
 from IPython.core.display_trap import DisplayTrap
 from IPython.core.displayhook import DisplayHook
-from IPython.core.displaypub import DisplayPublisher
+from IPython.core.displaypub import (DisplayPublisher,
+                                     coalescing_publisher_class)
 from IPython.core.error import InputRejected, UsageError
 from IPython.core.extensions import ExtensionManager
 from IPython.core.formatters import DisplayFormatter
@@ -72,6 +76,7 @@
                                      with_metaclass, iteritems)
 from IPython.utils.strdispatch import StrDispatch
 from IPython.utils.syspathcontext import prepended_to_syspath
+from IPython.utils.timing import default_timer, gc_timer, peak_rss
 from IPython.utils.text import (format_screen, LSString, SList,
                                 DollarFormatter)
 from traitlets import (Integer, Bool, CBool, CaselessStrEnum, Enum,
@@ -199,11 +204,24 @@ class ExecutionResult(object):
     """The result of a call to :meth:`InteractiveShell.run_cell`
 
     Stores information about what took place.
+
+    `timings` maps each of the `phases` of running the cell, in order, to the
+    seconds spent on it: input transformation, prefiltering, parsing, AST
+    transformation, compilation, execution, display of the results, and
+    storing in the history.  `gc_time` is the time spent collecting garbage
+    meanwhile (None before Python 3.3), and `peak_rss_delta` the growth of
+    the peak resident memory of the process, in bytes (None on Windows).
     """
+    phases = ('transform', 'prefilter', 'parse', 'ast_transform', 'compile',
+              'exec', 'display', 'history')
+
     execution_count = None
     error_before_exec = None
     error_in_exec = None
     result = None
+    timings = None
+    gc_time = None
+    peak_rss_delta = None
 
     @property
     def success(self):
@@ -309,6 +327,17 @@ class InteractiveShell(SingletonConfigurable):
     display_formatter = Instance(DisplayFormatter, allow_none=True)
     displayhook_class = Type(DisplayHook)
     display_pub_class = Type(DisplayPublisher)
+    coalesce_display = CBool(False, config=True,
+        help="""Limit the rate of display updates sent to the frontend.
+
+        Outputs are batched, and outputs cleared before they are sent are
+        dropped, so that at most CoalescingDisplayPublisher.update_rate
+        updates are sent per second.  Pending outputs are sent when a cell
+        finishes.  Outputs published from other threads are only sent from
+        the main thread, with its next output or when a cell finishes, so
+        the outputs of background threads are held while no cell runs.
+        """
+    )
     data_pub_class = None
 
     exit_now = CBool(False)
@@ -443,6 +472,36 @@ def _readline_parse_and_bind_changed(self, name, old, new):
         'all', 'last', 'last_expr' or 'none', specifying which nodes should be
         run interactively (displaying output from expressions).""")
 
+    source_cache_max_bytes = Integer(32 * 1024 * 1024, config=True,
+        help="""Maximum size of the sources of the cells kept for tracebacks.
+
+        The least recently used sources are dropped beyond it, and found
+        again in the input history when needed.
+        """
+    )
+    def _source_cache_max_bytes_changed(self, name, old, new):
+        compiler = getattr(self, 'compile', None)
+        if compiler is not None:
+            compiler.source_cache.max_bytes = new
+            compiler.source_cache.evict()
+
+    code_cache_size = Integer(0, config=True,
+        help="""Number of cells whose transformed source, AST and code objects
+        are kept, so that running one of them again skips their parsing,
+        transformation and compilation. 0 disables the cache.
+
+        The input and AST transformers are assumed to give the same result
+        every time for the same input.
+        """
+    )
+    def _code_cache_size_changed(self, name, old, new):
+        self.code_cache.size = new
+        self.code_cache.evict()
+
+    code_cache = Instance(CodeCache, allow_none=False)
+    def _code_cache_default(self):
+        return CodeCache(self.code_cache_size)
+
     # TODO: this part of prompt management should be moved to the frontends.
     # Use custom TraitTypes that convert '0'->'' and '\\n'->'\n'
     separate_in = SeparateUnicode('\n', config=True)
@@ -611,6 +670,8 @@ def init_instance_attrs(self):
 
         # command compiler
         self.compile = CachingCompiler()
+        self.compile.source_cache.max_bytes = self.source_cache_max_bytes
+        self.compile.source_cache.fetchers.append(self._cell_source_from_history)
 
         # Make an empty namespace, which extension writers can rely on both
         # existing and NEVER being used by ipython itself.  This gives them a
@@ -732,7 +793,10 @@ def init_display_formatter(self):
         self.configurables.append(self.display_formatter)
 
     def init_display_pub(self):
-        self.display_pub = self.display_pub_class(parent=self)
+        display_pub_class = self.display_pub_class
+        if self.coalesce_display:
+            display_pub_class = coalescing_publisher_class(display_pub_class)
+        self.display_pub = display_pub_class(parent=self)
         self.configurables.append(self.display_pub)
 
     def init_data_pub(self):
@@ -1636,6 +1700,22 @@ def init_history(self):
         self.history_manager = HistoryManager(shell=self, parent=self)
         self.configurables.append(self.history_manager)
 
+    def _cell_source_from_history(self, name):
+        """Find the source of a cell compiled under `name` in the history.
+
+        Used to find the sources dropped from the compiler's source cache.
+        """
+        number = code_number(name)
+        history_manager = getattr(self, 'history_manager', None)
+        if number is None or history_manager is None:
+            return None
+        for _, _, source in history_manager.get_range(0, number, number + 1,
+                                                      raw=False):
+            # The history strips the trailing newline of the cells
+            for code in (source, source + '\n'):
+                if code_name(code, number) == name:
+                    return code
+
     #-------------------------------------------------------------------------
     # Things related to exception handling and tracebacks (not debugging)
     #-------------------------------------------------------------------------
@@ -2086,7 +2166,8 @@ def init_completer(self):
         """
         from IPython.core.completer import IPCompleter
         from IPython.core.completerlib import (module_completer,
-                magic_run_completer, cd_completer, reset_completer)
+                magic_run_completer, cd_completer, reset_completer,
+                update_root_modules_async)
 
         self.Completer = IPCompleter(shell=self,
                                      namespace=self.user_ns,
@@ -2106,6 +2187,9 @@ def init_completer(self):
         self.set_hook('complete_command', magic_run_completer, str_key = '%run')
         self.set_hook('complete_command', cd_completer, str_key = '%cd')
         self.set_hook('complete_command', reset_completer, str_key = '%reset')
+        # Check for new or changed modules on sys.path for import completion
+        if self.Completer.index_root_modules_on_startup:
+            update_root_modules_async(self)
 
         # Only configure readline if we truly are using readline.  IPython can
         # do tab-completion over the network, in GUIs, etc, where readline
@@ -2814,14 +2898,35 @@ def run_cell(self, raw_cell, store_history=False, silent=False, shell_futures=Tr
         if store_history:
             result.execution_count = self.execution_count
 
+        timings = result.timings = OrderedDict((phase, 0.)
+                                               for phase in result.phases)
+        gc_timer.install()
+        gc_start = gc_timer.total
+        rss_start = peak_rss()
+        start = [0.]
+        def lap(phase):
+            """Add the time since the last lap to a phase"""
+            now = default_timer()
+            timings[phase] += now - start[0]
+            start[0] = now
+
+        def finish_telemetry():
+            if gc_start is not None:
+                result.gc_time = gc_timer.total - gc_start
+            if rss_start is not None:
+                result.peak_rss_delta = peak_rss() - rss_start
+
         def error_before_exec(value):
             result.error_before_exec = value
+            finish_telemetry()
             return result
 
         self.events.trigger('pre_execute')
         if not silent:
             self.events.trigger('pre_run_cell')
 
+        start[0] = default_timer()
+
         # If any of our input transformation (input_transformer_manager or
         # prefilter_manager) raises an exception, we store it in this variable
         # so that we can display the error after logging the input and storing
@@ -2829,11 +2934,13 @@ def error_before_exec(value):
         preprocessing_exc_tuple = None
         try:
             # Static input transformations
-            cell = self.input_transformer_manager.transform_cell(raw_cell)
+            cell = self._transform_cell(raw_cell)
         except SyntaxError:
             preprocessing_exc_tuple = sys.exc_info()
             cell = raw_cell  # cell has to exist so it can be stored/logged
+            lap('transform')
         else:
+            lap('transform')
             if len(cell.splitlines()) == 1:
                 # Dynamic transformations - only applied for single line commands
                 with self.builtin_trap:
@@ -2844,6 +2951,7 @@ def error_before_exec(value):
                     except Exception:
                         # don't allow prefilter errors to crash IPython
                         preprocessing_exc_tuple = sys.exc_info()
+                lap('prefilter')
 
         # Store raw and processed history
         if store_history:
@@ -2851,6 +2959,7 @@ def error_before_exec(value):
                                               cell, raw_cell)
         if not silent:
             self.logger.log(cell, raw_cell)
+        lap('history')
 
         # Display the exception if input processing failed.
         if preprocessing_exc_tuple is not None:
@@ -2866,58 +2975,117 @@ def error_before_exec(value):
 
         with self.builtin_trap:
             cell_name = self.compile.cache(cell, self.execution_count)
+            lap('compile')
 
             with self.display_trap:
-                # Compile to bytecode
-                try:
-                    code_ast = compiler.ast_parse(cell, filename=cell_name)
-                except IndentationError as e:
-                    self.showindentationerror()
-                    if store_history:
-                        self.execution_count += 1
-                    return error_before_exec(e)
-                except (OverflowError, SyntaxError, ValueError, TypeError,
-                        MemoryError) as e:
-                    self.showsyntaxerror()
-                    if store_history:
-                        self.execution_count += 1
-                    return error_before_exec(e)
-
-                # Apply AST transformations
-                try:
-                    code_ast = self.transform_ast(code_ast)
-                except InputRejected as e:
-                    self.showtraceback()
-                    if store_history:
-                        self.execution_count += 1
-                    return error_before_exec(e)
+                interactivity = "none" if silent else self.ast_node_interactivity
+                cached = None
+                if self.code_cache_size:
+                    # Between runs of a cell, its code objects only differ by
+                    # their filename, which has the execution count.
+                    key = ('code', cell, compiler.flags, interactivity,
+                           tuple(map(id, self.ast_transformers)))
+                    cached = self.code_cache.lookup(key)
+
+                if cached is not None:
+                    code_ast, codes = cached
+                    lap('parse')
+                else:
+                    # Compile to bytecode
+                    try:
+                        code_ast = compiler.ast_parse(cell, filename=cell_name)
+                    except IndentationError as e:
+                        self.showindentationerror()
+                        if store_history:
+                            self.execution_count += 1
+                        return error_before_exec(e)
+                    except (OverflowError, SyntaxError, ValueError, TypeError,
+                            MemoryError) as e:
+                        self.showsyntaxerror()
+                        if store_history:
+                            self.execution_count += 1
+                        return error_before_exec(e)
+                    lap('parse')
+
+                    # Apply AST transformations
+                    try:
+                        code_ast = self.transform_ast(code_ast)
+                    except InputRejected as e:
+                        self.showtraceback()
+                        if store_history:
+                            self.execution_count += 1
+                        return error_before_exec(e)
+                    lap('ast_transform')
+
+                    codes = []
+                    if self.code_cache_size:
+                        self.code_cache[key] = (code_ast, codes)
+
+                if self.code_cache_size:
+                    compiler = ReplayCompiler(compiler, codes)
+
+                # The nodes are compiled as they are run, and their results
+                # displayed, so time the compiler and the displayhook apart.
+                def timed_compiler(source, filename, symbol,
+                                   compiler=compiler):
+                    compile_start = default_timer()
+                    try:
+                        return compiler(source, filename, symbol)
+                    finally:
+                        timings['compile'] += default_timer() - compile_start
+                nested = timings['compile'] + timings['display']
 
                 # Give the displayhook a reference to our ExecutionResult so it
                 # can fill in the output value.
                 self.displayhook.exec_result = result
 
                 # Execute the user code
-                interactivity = "none" if silent else self.ast_node_interactivity
                 self.run_ast_nodes(code_ast.body, cell_name,
-                   interactivity=interactivity, compiler=compiler, result=result)
+                   interactivity=interactivity, compiler=timed_compiler,
+                   result=result)
+                lap('exec')
+                timings['exec'] -= (timings['compile'] + timings['display']
+                                    - nested)
 
                 # Reset this so later displayed values do not modify the
                 # ExecutionResult
                 self.displayhook.exec_result = None
 
+                self.display_pub.flush()
+                lap('display')
+                if store_history:
+                    # Write output to the database. Does nothing unless
+                    # history output logging is enabled.
+                    self.history_manager.store_output(self.execution_count)
+                    lap('history')
+                finish_telemetry()
+
                 self.events.trigger('post_execute')
                 if not silent:
                     self.events.trigger('post_run_cell')
+                    self.events.trigger('post_run_cell_result', result)
 
         if store_history:
-            # Write output to the database. Does nothing unless
-            # history output logging is enabled.
-            self.history_manager.store_output(self.execution_count)
             # Each cell is a *single* input, regardless of how many lines it has
             self.execution_count += 1
 
         return result
-    
+
+    def _transform_cell(self, raw_cell):
+        """Apply the static input transformations to a cell, reusing the
+        result of a previous run of the same cell if code_cache_size allows.
+        """
+        manager = self.input_transformer_manager
+        if not self.code_cache_size:
+            return manager.transform_cell(raw_cell)
+        key = ('transform', raw_cell, id(manager),
+               tuple(map(id, manager.transforms)))
+        cell = self.code_cache.lookup(key)
+        if cell is None:
+            cell = manager.transform_cell(raw_cell)
+            self.code_cache[key] = cell
+        return cell
+
     def transform_ast(self, node):
         """Apply the AST transformations from self.ast_transformers
         
@@ -0,0 +1,196 @@
+# encoding: utf-8
+"""A line profiler, used by ``%prun -L/-M`` and ``%run -p -L/-M``.
+
+It traces only the lines of the functions it is given.  Functions wrapped
+with :meth:`LineProfiler.wrap` turn tracing on while they run, so the rest of
+the code runs at its normal speed.  Otherwise, tracing is on for the whole
+run, and the other functions pay for a check when they are called, but their
+lines aren't traced.
+
+For each line, it counts how many times it ran, and measures the time spent
+on it, and optionally the memory it allocated, with :mod:`tracemalloc`.  The
+time and memory of a line include those of the functions it calls.
+"""
+
+# Copyright (c) IPython Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+from __future__ import print_function
+
+import functools
+import inspect
+import linecache
+import sys
+from timeit import default_timer
+
+from IPython.utils.py3compat import string_types
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python < 3.4
+    tracemalloc = None
+
+
+def _traced_memory():
+    return tracemalloc.get_traced_memory()[0]
+
+
+def _no_memory():
+    return 0
+
+
+class LineProfiler(object):
+    """Profile the lines of some functions.
+
+    The functions are given as function objects, or as names which match all
+    the functions with that name.
+
+    After :meth:`runctx`, `lines` maps the functions which ran, as
+    ``(filename, first line, name)`` tuples like in :mod:`pstats`, to dicts
+    mapping their line numbers to ``[hits, time, memory]``: the number of
+    times the line ran, the time spent on it in seconds, and the memory it
+    allocated in bytes, less what it freed, if `memory` is true.
+    """
+
+    def __init__(self, functions=(), memory=False, timer=default_timer):
+        self.codes = set()
+        self.names = set()
+        # Codes of the functions which turn tracing on themselves
+        self.wrapped = set()
+        for func in functions:
+            if isinstance(func, string_types):
+                self.names.add(func.rsplit('.', 1)[-1])
+            else:
+                func = getattr(func, '__func__', func)
+                self.codes.add(func.__code__)
+        if memory and tracemalloc is None:
+            raise RuntimeError("Measuring memory needs tracemalloc, "
+                               "from Python 3.4")
+        self.memory = memory
+        self.timer = timer
+        self.lines = {}
+        # The current line of the frames being traced, and the time and
+        # memory when it started.
+        self._frames = {}
+        self._memory = _traced_memory if memory else _no_memory
+
+    def _trace(self, frame, event, arg):
+        code = frame.f_code
+        if code in self.codes or code.co_name in self.names:
+            self._frames[frame] = (None, 0., 0)
+            return self._trace_lines
+
+    def _trace_lines(self, frame, event, arg):
+        if event != 'line' and event != 'return':
+            return self._trace_lines
+        now = self.timer()
+        memory = self._memory()
+        code = frame.f_code
+        key = (code.co_filename, code.co_firstlineno, code.co_name)
+        lines = self.lines.get(key)
+        if lines is None:
+            lines = self.lines[key] = {}
+        line, start, start_memory = self._frames.get(frame, (None, 0., 0))
+        if line is not None:
+            entry = lines[line]
+            entry[1] += now - start
+            entry[2] += memory - start_memory
+        if event == 'line':
+            line = frame.f_lineno
+            if line not in lines:
+                lines[line] = [0, 0., 0]
+            lines[line][0] += 1
+            # Leave our own time out
+            self._frames[frame] = (line, self.timer(), memory)
+        else:
+            # Generators are traced again when they resume
+            self._frames.pop(frame, None)
+        return self._trace_lines
+
+    def wrap(self, func):
+        """Return a wrapper of func which traces it while it runs, to keep
+        the rest of the code from being slowed down.
+
+        Generator functions are returned as is, and traced during the whole
+        run, since they run outside of calls to them.
+        """
+        code = func.__code__
+        self.codes.add(code)
+        if inspect.isgeneratorfunction(func):
+            return func
+        self.wrapped.add(code)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = sys.gettrace()
+            sys.settrace(self._trace)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                sys.settrace(trace)
+        return wrapper
+
+    def runctx(self, cmd, globals, locals):
+        """Run cmd, a string or code object, while profiling."""
+        started = self.memory and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        trace = sys.gettrace()
+        if self.names or self.codes - self.wrapped:
+            sys.settrace(self._trace)
+        try:
+            exec(cmd, globals, locals)
+        finally:
+            sys.settrace(trace)
+            if started:
+                tracemalloc.stop()
+            self._frames.clear()
+        return self
+
+    def find(self, name):
+        """The line stats of the first function named name, or None."""
+        for key in sorted(self.lines):
+            if key[2] == name:
+                return self.lines[key]
+
+    def format(self):
+        """A report of the stats of each line, with its source."""
+        out = []
+        header = u"%6s %9s %12s %12s %8s" % ('Line', 'Hits', 'Time (ms)',
+                                             'Per hit (us)', '% Time')
+        if self.memory:
+            header += u" %12s" % 'Memory (KiB)'
+        width = len(header)
+        header += u"  Line contents"
+        for key in sorted(self.lines):
+            filename, first, name = key
+            lines = self.lines[key]
+            total = sum(entry[1] for entry in lines.values())
+            out.append(u"Function: %s at %s:%d" % (name, filename, first))
+            out.append(u"Total time: %g s" % total)
+            out.append(u"")
+            out.append(header)
+            out.append(u"=" * len(header))
+            source = linecache.getlines(filename)
+            try:
+                block = inspect.getblock(source[first - 1:])
+            except Exception:
+                block = []
+            numbers = range(first, first + len(block)) if block \
+                else sorted(lines)
+            for number in numbers:
+                text = source[number - 1].rstrip() \
+                    if number <= len(source) else u''
+                if number not in lines:
+                    out.append((u"%6d" % number).ljust(width) + u"  " + text)
+                    continue
+                hits, elapsed, memory = lines[number]
+                row = u"%6d %9d %12.3f %12.1f %8.1f" % (number, hits,
+                    elapsed * 1e3, elapsed * 1e6 / hits,
+                    100 * elapsed / total if total else 0.)
+                if self.memory:
+                    row += u" %12.1f" % (memory / 1024.)
+                out.append(row + u"  " + text)
+            out.append(u"")
+        return u"\n".join(out).rstrip()
@@ -8,12 +8,21 @@
 
 import ast
 import bdb
+import functools
 import gc
+import inspect
 import itertools
+import json
+import math
 import os
+import platform
+import re
 import sys
 import time
 import timeit
+import types
+from collections import OrderedDict
+from io import open as io_open
 from pdb import Restart
 
 # cProfile was added in Python2.5
@@ -31,7 +40,9 @@
 from IPython.core import magic_arguments
 from IPython.core import page
 from IPython.core.error import UsageError
+from IPython.core.lineprofiler import LineProfiler
 from IPython.core.macro import Macro
+from IPython.core.sampling import SamplingProfiler
 from IPython.core.magic import (Magics, magics_class, line_magic, cell_magic,
                                 line_cell_magic, on_off, needs_local_scope)
 from IPython.testing.skipdoctest import skip_doctest
@@ -41,7 +52,8 @@
 from IPython.utils.capture import capture_output
 from IPython.utils.ipstruct import Struct
 from IPython.utils.module_paths import find_mod
-from IPython.utils.path import get_py_filename, unquote_filename, shellglob
+from IPython.utils.path import (get_py_filename, unquote_filename, shellglob,
+                                ensure_dir_exists)
 from IPython.utils.timing import clock, clock2
 from IPython.utils.warn import warn, error
 
@@ -65,25 +77,112 @@ class TimeitResult(object):
     repeat: (int) number of time the mesurement has been repeated
     best: (float) best execusion time / number
     all_runs: (list of float) execusion time of each run (in s)
+    warmup_runs: (list of float) execution time of the first runs, slower
+        than the others and left out of all_runs (in s)
     compile_time: (float) time of statement compilation (s)
 
+    and the statistics of the time per loop of the runs (in s):
+
+    timings: (list of float) time per loop of each run
+    mean, median, stdev: (float) mean, median and standard deviation
+    ci: (float) half-width of the 95% confidence interval of the mean
+    percentiles: (dict) 5th, 25th, 75th and 95th percentiles
+    outliers: (list of float) timings beyond 1.5 interquartile ranges from
+        the first or third quartile
+
     """
 
-    def __init__(self, loops, repeat, best, worst, all_runs, compile_time, precision):
+    def __init__(self, loops, repeat, best, worst, all_runs, compile_time,
+                 precision, warmup_runs=()):
         self.loops = loops
         self.repeat = repeat
         self.best = best
         self.worst = worst
         self.all_runs = all_runs
+        self.warmup_runs = list(warmup_runs)
         self.compile_time = compile_time
         self._precision = precision
 
+        self.timings = [t / loops for t in all_runs]
+        stats = _timing_stats(self.timings)
+        self.mean = stats['mean']
+        self.median = stats['median']
+        self.stdev = stats['stdev']
+        self.ci = stats['ci']
+        self.percentiles = stats['percentiles']
+        self.outliers = stats['outliers']
+
     def _repr_pretty_(self, p , cycle):
          unic =  u"%d loops, best of %d: %s per loop" % (self.loops, self.repeat,
                                             _format_time(self.best, self._precision))
          p.text(u'<TimeitResult : '+unic+u'>')
 
 
+class BenchmarkResult(object):
+    """
+    Object returned by the bench magic with the results of a suite, compared
+    with its baseline.
+
+    Contain the following attributes :
+
+    suite: (str) name of the suite
+    results: (OrderedDict) TimeitResult of each statement
+    baseline: (dict) time per loop of the runs of each statement in the
+        baseline, empty if there is none
+    rows: (list of tuple) for each statement, the median time per loop in
+        the baseline (or None) and now, the relative change, the p-value of
+        the difference (or None) and 'slower', 'faster' or ''
+    regressions: (list of str) statements significantly slower than in the
+        baseline
+
+    """
+
+    def __init__(self, suite, results, baseline, alpha=0.05, precision=3):
+        self.suite = suite
+        self.results = results
+        self.baseline = baseline
+        self._precision = precision
+        self.rows = []
+        for stmt, result in results.items():
+            old = baseline.get(stmt)
+            if not old:
+                self.rows.append((stmt, None, result.median, None, None, ''))
+                continue
+            old_median = _timing_stats(old)['median']
+            change = result.median / old_median - 1 if old_median else 0.
+            pvalue = _mann_whitney(old, result.timings)
+            verdict = ''
+            if pvalue < alpha:
+                verdict = 'slower' if change > 0 else 'faster'
+            self.rows.append((stmt, old_median, result.median, change, pvalue,
+                              verdict))
+
+    @property
+    def regressions(self):
+        return [row[0] for row in self.rows if row[-1] == 'slower']
+
+    def table(self):
+        """The comparison as a text table"""
+        fmt = u"%-32s %10s %10s %8s %8s  %s"
+        lines = [(fmt % ('statement', 'baseline', 'current', 'change',
+                         'p-value', '')).rstrip()]
+        for stmt, old, new, change, pvalue, verdict in self.rows:
+            first = stmt.split('\n', 1)[0]
+            if len(stmt) > 32 or first != stmt:
+                stmt = first[:29] + '...'
+            lines.append((fmt % (stmt,
+                '-' if old is None else _format_time(old, self._precision),
+                _format_time(new, self._precision),
+                '-' if change is None else '%+.1f%%' % (100 * change),
+                '-' if pvalue is None else '%.3g' % pvalue,
+                verdict)).rstrip())
+        return u'\n'.join(lines)
+
+    def _repr_pretty_(self, p, cycle):
+        p.text(u'<BenchmarkResult %s: %d statements, %d slower>'
+               % (self.suite, len(self.rows), len(self.regressions)))
+
+
 class TimeitTemplateFiller(ast.NodeTransformer):
     """Fill in the AST template for timing execution.
 
@@ -259,6 +358,40 @@ def prun(self, parameter_s='', cell=None):
         -q
           suppress output to the pager.  Best used with -T and/or -D above.
 
+        -S <interval>
+          profile by sampling the stack every <interval> milliseconds of CPU
+          time (e.g. ``-S 1``), rather than by tracing every call.  The code
+          runs at nearly its normal speed, but the times are statistical and
+          the "ncalls" column counts samples instead of calls.  Not available
+          on Windows.
+
+        -F <filename>
+          save the stacks sampled with -S to the given file, in the collapsed
+          format read by flame graph tools (one line per stack, with its
+          semicolon separated frames and its number of samples).
+
+        -L <function>
+          profile the lines of the given function instead of the calls of
+          all functions: for each line, print how many times it ran and the
+          time spent on it, including in the functions it calls.  You can
+          profile several functions by using the option several times.
+          Functions of the namespace, or of classes and modules in it (like
+          ``-L MyClass.method``), are replaced while the code runs, in the
+          namespace and in their module, by wrappers which only trace them
+          while they run, so the rest of the code runs at its normal speed.
+          If they are also referenced from elsewhere (e.g. a list or a
+          closure), they are traced during the whole run instead, and the
+          calls of the other functions are slowed down by a check; functions
+          which aren't found are too, and all the functions with that name
+          are profiled.
+          With -r, the LineProfiler is returned, whose ``lines`` attribute
+          has the stats of each line.  The options -l, -s, -D, -S and -F don't
+          apply.
+
+        -M <function>
+          like -L, and also print the memory allocated by each line, less the
+          memory it freed, measured with tracemalloc (Python 3.4 or later).
+
         If you want to run complete programs under the profiler's control, use
         ``%run -p [prof_opts] filename.py [args to program]`` where prof_opts
         contains profiler specific options as described here.
@@ -267,7 +400,7 @@ def prun(self, parameter_s='', cell=None):
 
           In [1]: import profile; profile.help()
         """
-        opts, arg_str = self.parse_options(parameter_s, 'D:l:rs:T:q',
+        opts, arg_str = self.parse_options(parameter_s, 'D:l:rs:T:qS:F:L:M:',
                                            list_all=True, posix=False)
         if cell is not None:
             arg_str += '\n' + cell
@@ -290,9 +423,24 @@ def _run_with_profiler(self, code, opts, namespace):
         """
 
         # Fill default values for unspecified options:
-        opts.merge(Struct(D=[''], l=[], s=['time'], T=['']))
-
-        prof = profile.Profile()
+        opts.merge(Struct(D=[''], l=[], s=['time'], T=[''], S=[''], F=[''],
+                          L=[], M=[]))
+
+        if opts.L or opts.M:
+            return self._run_with_line_profiler(code, opts, namespace)
+        if opts.S[0]:
+            if not SamplingProfiler.available():
+                raise UsageError("The sampling profiler is not available "
+                                 "on this platform.")
+            try:
+                interval = float(opts.S[0]) / 1000
+            except ValueError:
+                raise UsageError("Invalid sampling interval: %r" % opts.S[0])
+            prof = SamplingProfiler(interval)
+        elif opts.F[0]:
+            raise UsageError("-F needs the sampling profiler, enabled by -S.")
+        else:
+            prof = profile.Profile()
         try:
             prof = prof.runctx(code, namespace, namespace)
             sys_exit = ''
@@ -331,6 +479,7 @@ def _run_with_profiler(self, code, opts, namespace):
 
         dump_file = opts.D[0]
         text_file = opts.T[0]
+        stacks_file = opts.F[0]
         if dump_file:
             dump_file = unquote_filename(dump_file)
             prof.dump_stats(dump_file)
@@ -343,12 +492,134 @@ def _run_with_profiler(self, code, opts, namespace):
             pfile.close()
             print('\n*** Profile printout saved to text file',\
                   repr(text_file)+'.',sys_exit)
+        if stacks_file:
+            stacks_file = unquote_filename(stacks_file)
+            with open(stacks_file, 'w') as pfile:
+                pfile.write(prof.collapsed() + '\n')
+            print('\n*** Sampled stacks saved to text file',\
+                  repr(stacks_file)+'.',sys_exit)
 
         if 'r' in opts:
             return stats
         else:
             return None
 
+    def _run_with_line_profiler(self, code, opts, namespace):
+        """
+        Run `code` with the line profiler.  Used by ``%prun`` and ``%run -p``
+        with the ``-L`` or ``-M`` options, and takes the same arguments as
+        :meth:`_run_with_profiler`.
+        """
+        try:
+            prof = LineProfiler(memory=bool(opts.M))
+        except RuntimeError as e:
+            raise UsageError(str(e))
+        # Replace the functions found with wrappers, which trace them only
+        # while they run, and match the others by name.  Functions which may
+        # also be called through other references than those replaced are
+        # matched by code, with tracing on during the whole run.
+        bindings = []
+        for name in opts.L + opts.M:
+            found = self._find_function(name, namespace)
+            if found is None:
+                prof.names.add(name.rsplit('.', 1)[-1])
+                continue
+            scope, set_value, value = found
+            # Not to count the tuple among the references of the function
+            found = None
+            func = getattr(value, '__func__', value)
+            setters = [set_value]
+            scopes = [scope]
+            # The global of its module, which calls from there go through,
+            # and the names imported in the namespaces of the code
+            for other in (func.__globals__, namespace, self.shell.user_ns):
+                if other.get(func.__name__) is value and \
+                        not any(other is known for known in scopes):
+                    setters.append(functools.partial(other.__setitem__,
+                                                     func.__name__))
+                    scopes.append(other)
+            if self._referenced_elsewhere(func, value, scopes):
+                prof.codes.add(func.__code__)
+                continue
+            wrapper = prof.wrap(func)
+            if isinstance(value, (staticmethod, classmethod)):
+                wrapper = type(value)(wrapper)
+            for set_value in setters:
+                set_value(wrapper)
+                bindings.append((set_value, value))
+        try:
+            prof.runctx(code, namespace, namespace)
+            sys_exit = ''
+        except SystemExit:
+            sys_exit = """*** SystemExit exception caught in code being profiled."""
+        finally:
+            for set_value, value in bindings:
+                set_value(value)
+
+        output = prof.format() or 'No line of the functions was run.'
+        if 'q' not in opts:
+            page.page(output)
+        print(sys_exit, end=' ')
+
+        text_file = opts.T[0]
+        if text_file:
+            text_file = unquote_filename(text_file)
+            with io_open(text_file, 'w', encoding='utf-8') as pfile:
+                pfile.write(py3compat.cast_unicode(output))
+            print('\n*** Profile printout saved to text file',\
+                  repr(text_file)+'.',sys_exit)
+
+        if 'r' in opts:
+            return prof
+
+    def _find_function(self, name, namespace):
+        """Find the Python function called name in namespace or the user
+        namespace, as a global or an attribute of a class or module, given
+        by a dotted name like ``module.Class.method``.
+
+        Returns the dict holding it, a function setting the variable or
+        attribute, and its value, which may be a static or class method, or
+        None if it isn't found.
+        """
+        parts = name.split('.')
+        if not all(re.match(r'[A-Za-z_]\w*$', part) for part in parts):
+            return None
+        attr = parts.pop()
+        if parts:
+            first = parts[0]
+            scope = namespace if first in namespace else self.shell.user_ns
+            owner = scope.get(first)
+            for part in parts[1:] + [None]:
+                # Only look into classes and modules, whose attributes don't
+                # run code
+                if not isinstance(owner, (type, types.ModuleType)):
+                    return None
+                if part is not None:
+                    owner = owner.__dict__.get(part)
+            scope = owner.__dict__
+            set_value = lambda value: setattr(owner, attr, value)
+        else:
+            scope = namespace if attr in namespace else self.shell.user_ns
+            set_value = lambda value: scope.__setitem__(attr, value)
+        value = scope.get(attr)
+        if not inspect.isfunction(getattr(value, '__func__', value)):
+            return None
+        return scope, set_value, value
+
+    @staticmethod
+    def _referenced_elsewhere(func, value, scopes):
+        """Whether func is referenced from other objects than the dicts in
+        scopes, or value, the static or class method wrapping it."""
+        # The dicts behind the dict proxies of classes
+        scopes = [scope if isinstance(scope, dict)
+                  else gc.get_referents(scope)[0] for scope in scopes]
+        for referrer in gc.get_referrers(func):
+            if referrer is value or isinstance(referrer, types.FrameType) \
+                    or any(referrer is scope for scope in scopes):
+                continue
+            return True
+        return False
+
     @line_magic
     def pdb(self, parameter_s=''):
         """Control the automatic calling of the pdb interactive debugger.
@@ -564,7 +835,8 @@ def run(self, parameter_s='', runner=None,
           prints a detailed report of execution times, function calls, etc).
 
           You can pass other options after -p which affect the behavior of the
-          profiler itself. See the docs for %prun for details.
+          profiler itself, like -S to sample the stack instead of tracing
+          every call. See the docs for %prun for details.
 
           In this mode, the program's variables do NOT propagate back to the
           IPython interactive namespace (because they remain in the namespace
@@ -595,7 +867,7 @@ def run(self, parameter_s='', runner=None,
 
         # get arguments and set sys.argv for program to be run.
         opts, arg_lst = self.parse_options(parameter_s,
-                                           'nidtN:b:pD:l:rs:T:em:G',
+                                           'nidtN:b:pD:l:rs:T:em:GS:F:L:M:',
                                            mode='list', list_all=1)
         if "m" in opts:
             modulename = opts["m"][0]
@@ -893,15 +1165,56 @@ def _run_with_timing(run, nruns):
         twall1 = time.time()
         print("Wall time: %10.2f s." % (twall1 - twall0))
 
+    def _make_timer(self, setup, stmt, timefunc=timeit.default_timer):
+        """Make a :class:`Timer` running stmt after setup, both cells of code,
+        in the user namespace.
+
+        Returns the timer and the time it took to compile the code.
+        """
+        timer = Timer(timer=timefunc)
+        # this code has tight coupling to the inner workings of timeit.Timer,
+        # but is there a better way to achieve that the code stmt has access
+        # to the shell namespace?
+        transform  = self.shell.input_splitter.transform_cell
+
+        ast_setup = self.shell.compile.ast_parse(transform(setup))
+        ast_stmt = self.shell.compile.ast_parse(transform(stmt))
+
+        ast_setup = self.shell.transform_ast(ast_setup)
+        ast_stmt = self.shell.transform_ast(ast_stmt)
+
+        # This codestring is taken from timeit.template - we fill it in as an
+        # AST, so that we can apply our AST transformations to the user code
+        # without affecting the timing code.
+        timeit_ast_template = ast.parse('def inner(_it, _timer):\n'
+                                        '    setup\n'
+                                        '    _t0 = _timer()\n'
+                                        '    for _i in _it:\n'
+                                        '        stmt\n'
+                                        '    _t1 = _timer()\n'
+                                        '    return _t1 - _t0\n')
+
+        timeit_ast = TimeitTemplateFiller(ast_setup, ast_stmt).visit(timeit_ast_template)
+        timeit_ast = ast.fix_missing_locations(timeit_ast)
+
+        t0 = clock()
+        code = self.shell.compile(timeit_ast, "<magic-timeit>", "exec")
+        tc = clock()-t0
+
+        ns = {}
+        exec(code, self.shell.user_ns, ns)
+        timer.inner = ns["inner"]
+        return timer, tc
+
     @skip_doctest
     @line_cell_magic
     def timeit(self, line='', cell=None):
         """Time execution of a Python statement or expression
 
         Usage, in line mode:
-          %timeit [-n<N> -r<R> [-t|-c] -q -p<P> -o] statement
+          %timeit [-n<N> -r<R> [-t|-c] -q -p<P> -o -a<A> -b<B>] statement
         or in cell mode:
-          %%timeit [-n<N> -r<R> [-t|-c] -q -p<P> -o] setup_code
+          %%timeit [-n<N> -r<R> [-t|-c] -q -p<P> -o -a<A> -b<B>] setup_code
           code
           code...
 
@@ -937,6 +1250,17 @@ def timeit(self, line='', cell=None):
         -o: return a TimeitResult that can be stored in a variable to inspect
             the result in more details.
 
+        -a<A>: adaptive mode: instead of <R> runs, keep timing runs until the
+        95% confidence interval of their mean is within the fraction <A> of
+        it (e.g. 0.01), or the time budget is spent, at least <R> times.
+        The first runs that are much slower than the others are discarded as
+        warmup, and the mean, median, standard deviation, percentiles and
+        outliers of the others are reported.
+        Default: 0.01
+
+        -b<B>: time budget of the adaptive mode in seconds, which it enables.
+        Default: 10
+
 
         Examples
         --------
@@ -958,6 +1282,11 @@ def timeit(self, line='', cell=None):
           In [6]: %timeit -n1 time.sleep(2)
           1 loops, best of 3: 2 s per loop
 
+          In [7]: %timeit -a0.005 u == None
+          10000000 loops, 23 runs: 41.2 ns +- 0.43% per loop (mean +- 95% CI)
+          median: 41.1 ns, stdev: 0.405 ns, 5%-95%: 40.7 ns - 41.9 ns
+          1 warmup run discarded
+
 
         The times reported by %timeit will be slightly higher than those
         reported by the timeit.py script when variables are accessed. This is
@@ -967,7 +1296,7 @@ def timeit(self, line='', cell=None):
         does not matter as long as results from timeit.py are not mixed with
         those from %timeit."""
 
-        opts, stmt = self.parse_options(line,'n:r:tcp:qo',
+        opts, stmt = self.parse_options(line,'n:r:tcp:qoa:b:',
                                         posix=False, strict=False)
         if stmt == "" and cell is None:
             return
@@ -978,73 +1307,63 @@ def timeit(self, line='', cell=None):
         precision = int(getattr(opts, "p", 3))
         quiet = 'q' in opts
         return_result = 'o' in opts
+        adaptive = 'a' in opts or 'b' in opts
+        rtol = float(getattr(opts, "a", 0.01))
+        budget = float(getattr(opts, "b", 10))
         if hasattr(opts, "t"):
             timefunc = time.time
         if hasattr(opts, "c"):
             timefunc = clock
 
-        timer = Timer(timer=timefunc)
-        # this code has tight coupling to the inner workings of timeit.Timer,
-        # but is there a better way to achieve that the code stmt has access
-        # to the shell namespace?
-        transform  = self.shell.input_splitter.transform_cell
-
         if cell is None:
             # called as line magic
-            ast_setup = self.shell.compile.ast_parse("pass")
-            ast_stmt = self.shell.compile.ast_parse(transform(stmt))
+            timer, tc = self._make_timer("pass", stmt, timefunc)
         else:
-            ast_setup = self.shell.compile.ast_parse(transform(stmt))
-            ast_stmt = self.shell.compile.ast_parse(transform(cell))
-
-        ast_setup = self.shell.transform_ast(ast_setup)
-        ast_stmt = self.shell.transform_ast(ast_stmt)
-
-        # This codestring is taken from timeit.template - we fill it in as an
-        # AST, so that we can apply our AST transformations to the user code
-        # without affecting the timing code.
-        timeit_ast_template = ast.parse('def inner(_it, _timer):\n'
-                                        '    setup\n'
-                                        '    _t0 = _timer()\n'
-                                        '    for _i in _it:\n'
-                                        '        stmt\n'
-                                        '    _t1 = _timer()\n'
-                                        '    return _t1 - _t0\n')
-
-        timeit_ast = TimeitTemplateFiller(ast_setup, ast_stmt).visit(timeit_ast_template)
-        timeit_ast = ast.fix_missing_locations(timeit_ast)
+            timer, tc = self._make_timer(stmt, cell, timefunc)
 
         # Track compilation time so it can be reported if too long
         # Minimum time above which compilation time will be reported
         tc_min = 0.1
 
-        t0 = clock()
-        code = self.shell.compile(timeit_ast, "<magic-timeit>", "exec")
-        tc = clock()-t0
-
-        ns = {}
-        exec(code, self.shell.user_ns, ns)
-        timer.inner = ns["inner"]
-
         # This is used to check if there is a huge difference between the
         # best and worst timings.
         # Issue: https://github.com/ipython/ipython/issues/6471
         worst_tuning = 0
         if number == 0:
-            # determine number so that 0.2 <= total time < 2.0
-            number = 1
-            for _ in range(1, 10):
-                time_number = timer.timeit(number)
-                worst_tuning = max(worst_tuning, time_number / number)
-                if time_number >= 0.2:
-                    break
-                number *= 10
-        all_runs = timer.repeat(repeat, number)
+            # determine number so that 0.2 <= total time < 2.0, or in adaptive
+            # mode so that there is time for about 200 runs
+            target = min(0.2, budget / 200) if adaptive else 0.2
+            number, worst_tuning = _autorange(timer, target, scale=adaptive)
+        warmup_runs = []
+        if adaptive:
+            warmup_runs, all_runs = _sample_until(timer, number, rtol, budget,
+                                                  max(repeat, 3))
+            repeat = len(all_runs)
+        else:
+            all_runs = timer.repeat(repeat, number)
         best = min(all_runs) / number
-        if not quiet :
-            worst = max(all_runs) / number
-            if worst_tuning:
-                worst = max(worst, worst_tuning)
+        worst = max(all_runs) / number
+        if worst_tuning and not adaptive:
+            worst = max(worst, worst_tuning)
+        result = TimeitResult(number, repeat, best, worst, all_runs, tc,
+                              precision, warmup_runs)
+        if not quiet and adaptive:
+            print(u"%d loops, %d runs: %s +- %.2g%% per loop (mean +- 95%% CI)"
+                  % (number, repeat, _format_time(result.mean, precision),
+                     100 * result.ci / result.mean if result.mean else 0))
+            print(u"median: %s, stdev: %s, 5%%-95%%: %s - %s"
+                  % tuple(_format_time(t, precision) for t in
+                          (result.median, result.stdev,
+                           result.percentiles[5], result.percentiles[95])))
+            if warmup_runs:
+                print("%d warmup run%s discarded" % (len(warmup_runs),
+                        's' if len(warmup_runs) > 1 else ''))
+            if result.outliers:
+                print("%d of the runs were outliers" % len(result.outliers))
+            if not result.ci <= rtol * result.mean:
+                print("The time budget was spent before the confidence "
+                      "interval was within %.2g%% of the mean" % (100 * rtol))
+        elif not quiet:
             # Check best timing is greater than zero to avoid a
             # ZeroDivisionError.
             # In cases where the slowest timing is lesser than a micosecond
@@ -1056,10 +1375,118 @@ def timeit(self, line='', cell=None):
                       "is being cached " % (worst / best))
             print(u"%d loops, best of %d: %s per loop" % (number, repeat,
                                                               _format_time(best, precision)))
-            if tc > tc_min:
-                print("Compiler time: %.2f s" % tc)
+        if not quiet and tc > tc_min:
+            print("Compiler time: %.2f s" % tc)
         if return_result:
-            return TimeitResult(number, repeat, best, worst, all_runs, tc, precision)
+            return result
+
+    @magic_arguments.magic_arguments()
+    @magic_arguments.argument('suite',
+        help="""Name of the suite."""
+    )
+    @magic_arguments.argument('-n', type=int, default=0,
+        help="""Number of loops per run. Default: chosen so that a run takes
+        at least 0.2 s."""
+    )
+    @magic_arguments.argument('-r', type=int, default=10,
+        help="""Number of runs of each statement. Default: 10"""
+    )
+    @magic_arguments.argument('--save', action='store_true',
+        help="""Store the results as the new baseline of the suite."""
+    )
+    @magic_arguments.argument('--alpha', type=float, default=0.05,
+        help="""Significance level under which a difference with the baseline
+        is reported. Default: 0.05"""
+    )
+    @magic_arguments.argument('-q', action='store_true',
+        help="""Quiet, do not print the results."""
+    )
+    @magic_arguments.argument('-o', action='store_true',
+        help="""Return a BenchmarkResult."""
+    )
+    @skip_doctest
+    @line_cell_magic
+    def bench(self, line, cell=None):
+        """Time a named suite of statements, and compare with its baseline.
+
+        In cell mode, each top-level statement of the cell is a statement of
+        the suite, with the blocks of compound statements like ``for`` or
+        ``with``. In line mode, the statements of
+        the stored baseline of the suite are timed again.
+
+        Each statement is timed like with %timeit, and the median time per
+        loop is compared with the one stored in the baseline of the suite for
+        this machine, in the benchmarks directory of the profile. A difference
+        is reported when the Mann-Whitney U test finds that the timings of
+        the runs are unlikely to come from the same distribution.
+
+        Examples
+        --------
+        ::
+
+          In [1]: %%bench --save sorting
+             ...: sorted(data)
+             ...: data.sort()
+
+          In [2]: %bench sorting
+          statement                          baseline    current   change  p-value
+          sorted(data)                        1.73 ms    2.09 ms   +20.8% 0.000183  slower
+          data.sort()                          130 us     129 us    -0.8%    0.545
+        """
+        args = magic_arguments.parse_argstring(self.bench, line)
+        if not re.match(r'^[\w.-]+$', args.suite):
+            raise UsageError("Invalid suite name: %r" % args.suite)
+        path = os.path.join(self.shell.profile_dir.location, 'benchmarks',
+                            _machine_name(), args.suite + '.json')
+        stored = dict(statements=[], timings={})
+        if os.path.isfile(path):
+            with io_open(path, encoding='utf-8') as f:
+                stored = json.load(f)
+        baseline = stored['timings']
+
+        if cell is None:
+            if not baseline:
+                raise UsageError("No baseline for suite %r on this machine"
+                                 % args.suite)
+            statements = stored['statements']
+        else:
+            cell = self.shell.input_splitter.transform_cell(cell)
+            try:
+                statements = _split_statements(cell)
+            except SyntaxError as e:
+                raise UsageError("Syntax error on line %s of the suite: %s"
+                                 % (e.lineno, (e.text or '').strip()))
+
+        results = OrderedDict()
+        for stmt in statements:
+            try:
+                timer = self._make_timer("pass", stmt)[0]
+            except SyntaxError as e:
+                raise UsageError("Syntax error in statement %r: %s"
+                                 % (stmt, e))
+            number = args.n or _autorange(timer)[0]
+            runs = timer.repeat(args.r, number)
+            results[stmt] = TimeitResult(number, args.r, min(runs) / number,
+                                         max(runs) / number, runs, 0, 3)
+        bench = BenchmarkResult(args.suite, results, baseline, args.alpha)
+
+        if not args.q:
+            print(bench.table())
+            if not baseline and not args.save:
+                print("No baseline for suite %r on this machine, use --save "
+                      "to store one." % args.suite)
+        if args.save:
+            ensure_dir_exists(os.path.dirname(path))
+            data = dict(suite=args.suite, machine=platform.node(),
+                        python=platform.python_version(),
+                        date=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                        statements=statements,
+                        timings=dict((stmt, result.timings)
+                                     for stmt, result in results.items()))
+            with io_open(path, 'w', encoding='utf-8') as f:
+                f.write(py3compat.cast_unicode(json.dumps(data, indent=1)))
+        if args.o:
+            return bench
 
     @skip_doctest
     @needs_local_scope
@@ -1350,3 +1777,153 @@ def _format_time(timespan, precision=3):
     else:
         order = 3
     return u"%.*g %s" % (precision, timespan * scaling[order], units[order])
+
+
+def _autorange(timer, target=0.2, scale=False):
+    """Find a number of loops for which timer takes at least target seconds,
+    trying powers of 10, or about target seconds if scale is true.
+
+    Returns the number and the worst time per loop seen.
+    """
+    number = 1
+    worst = 0
+    for _ in range(1, 10):
+        time_number = timer.timeit(number)
+        worst = max(worst, time_number / number)
+        if time_number >= target:
+            break
+        number *= 10
+    if scale and time_number > 0:
+        number = max(1, int(number * target / time_number))
+    return number, worst
+
+
+# Two-sided 95% critical values of Student's t distribution, by degrees of
+# freedom; the normal one is close enough beyond.
+_t95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def _percentile(values, p):
+    """The p-th percentile of sorted values, interpolated linearly"""
+    pos = (len(values) - 1) * p / 100.0
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+def _fences(values):
+    """Tukey's fences of sorted values, beyond which they are outliers"""
+    q1, q3 = _percentile(values, 25), _percentile(values, 75)
+    return q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+
+
+def _timing_stats(timings):
+    """Mean, median, standard deviation, 95% confidence interval of the mean,
+    percentiles and outliers of a list of timings"""
+    n = len(timings)
+    if not n:
+        return dict(mean=None, median=None, stdev=None, ci=None,
+                    percentiles={}, outliers=[])
+    values = sorted(timings)
+    mean = sum(values) / n
+    if n > 1:
+        stdev = (sum((t - mean) ** 2 for t in values) / (n - 1)) ** 0.5
+        t = _t95[n - 2] if n - 2 < len(_t95) else 1.96
+        ci = t * stdev / n ** 0.5
+    else:
+        stdev, ci = 0.0, float('inf')
+    low, high = _fences(values)
+    return dict(mean=mean, median=_percentile(values, 50), stdev=stdev, ci=ci,
+                percentiles=dict((p, _percentile(values, p))
+                                 for p in (5, 25, 75, 95)),
+                outliers=[t for t in timings if not low <= t <= high])
+
+
+def _split_warmup(runs):
+    """Split the first runs slower than the upper fence of the last half of
+    the runs, which were most likely warming up caches, from the others."""
+    if len(runs) < 4:
+        return [], runs
+    high = _fences(sorted(runs[len(runs) // 2:]))[1]
+    n = 0
+    while n < len(runs) // 2 and runs[n] > high:
+        n += 1
+    return runs[:n], runs[n:]
+
+
+def _sample_until(timer, number, rtol, budget, min_runs):
+    """Time runs of number loops, until the 95% confidence interval of their
+    mean is within rtol of it, or for budget seconds.
+
+    Returns the warmup runs and the other ones, as :func:`_split_warmup`.
+    """
+    runs = []
+    deadline = time.time() + budget
+    while True:
+        runs.append(timer.timeit(number))
+        if time.time() >= deadline:
+            break
+        warmup, steady = _split_warmup(runs)
+        if len(steady) >= min_runs:
+            stats = _timing_stats(steady)
+            if stats['ci'] <= rtol * stats['mean']:
+                break
+    return _split_warmup(runs)
+
+
+def _mann_whitney(x, y):
+    """Two-sided p-value of the Mann-Whitney U test of the hypothesis that
+    the samples x and y come from the same distribution, using the normal
+    approximation with corrections for ties and continuity."""
+    n1, n2 = len(x), len(y)
+    n = n1 + n2
+    values = sorted([(v, 0) for v in x] + [(v, 1) for v in y])
+    rank_sum = 0.
+    ties = 0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and values[j + 1][0] == values[i][0]:
+            j += 1
+        # Tied values share the mean of their ranks
+        rank = (i + j) / 2. + 1
+        rank_sum += rank * sum(1 for v in values[i:j + 1] if v[1] == 0)
+        ties += (j - i + 1) ** 3 - (j - i + 1)
+        i = j + 1
+    u = rank_sum - n1 * (n1 + 1) / 2.
+    sigma = (n1 * n2 / 12. * (n + 1 - ties / float(n * (n - 1)))) ** 0.5
+    if not sigma:
+        return 1.
+    z = max(abs(u - n1 * n2 / 2.) - 0.5, 0) / sigma
+    return math.erfc(z / 2 ** 0.5)
+
+
+def _machine_name():
+    """A name for this machine, usable as a directory name"""
+    return re.sub(r'[^\w.-]', '_', platform.node()) or 'unknown'
+
+
+def _split_statements(source):
+    """Split Python source into the source of its top-level statements.
+
+    Compound statements (``for``, ``with``, ``def``...) are kept whole, with
+    their decorators, and statements on the same line, separated by
+    semicolons, together. Blank lines and comments between statements are
+    left out. Raises SyntaxError if the source can't be parsed.
+    """
+    lines = source.splitlines()
+    starts = set()
+    for node in ast.parse(source).body:
+        decorators = getattr(node, 'decorator_list', [])
+        starts.add(min([node.lineno] + [d.lineno for d in decorators]))
+    starts = sorted(starts) + [len(lines) + 1]
+    statements = []
+    for start, end in zip(starts, starts[1:]):
+        block = lines[start - 1:end - 1]
+        while block and (not block[-1].strip() or
+                         block[-1].lstrip().startswith('#')):
+            block.pop()
+        statements.append('\n'.join(block))
+    return statements
@@ -193,8 +193,11 @@ def _format_lineno(session, line):
         # it into a list in memory. Anything that needs more space will just
         # misalign.
         width = 4
+        # The history is read from the database a page at a time; flush after
+        # each page so that the lines show up while the rest is fetched.
+        page_size = history_manager.page_size
 
-        for session, lineno, inline in hist:
+        for i, (session, lineno, inline) in enumerate(hist, start=1):
             # Print user history with tabs expanded to 4 spaces.  The GUI
             # clients use hard tabs for easier usability in auto-indented code,
             # but we want to produce PEP-8 compliant history for safe pasting
@@ -215,6 +218,8 @@ def _format_lineno(session, line):
             print(inline, file=outfile)
             if get_output and output:
                 print(cast_unicode_py2(output), file=outfile)
+            if i % page_size == 0:
+                outfile.flush()
 
         if close_at_end:
             outfile.close()
@@ -159,9 +159,10 @@ def rehashx(self, parameter_s=''):
         used on slow filesystems.
         """
         from IPython.core.alias import InvalidAliasError
+        from IPython.core.completerlib import reset_root_modules
 
-        # for the benefit of module completer in ipy_completers.py
-        del self.shell.db['rootmodules_cache']
+        # for the benefit of the module completer in completerlib
+        reset_root_modules(self.shell)
 
         path = [os.path.abspath(os.path.expanduser(p)) for p in
             os.environ.get('PATH','').split(os.pathsep)]
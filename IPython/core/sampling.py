@@ -0,0 +1,116 @@
+# encoding: utf-8
+"""A sampling profiler, used by ``%prun -S`` and ``%run -p -S``.
+
+Rather than tracing every call like :mod:`profile` and :mod:`cProfile`, which
+can slow numeric code down several times, it records the stack of the main
+thread every few milliseconds of CPU time, from a ``SIGPROF`` handler.  The
+cost is a few microseconds per sample, so the code runs at nearly its normal
+speed, at the price of statistical results: functions are credited with the
+time of the samples they were in, and the numbers of calls are numbers of
+samples.
+
+It is only available where :func:`signal.setitimer` is (not on Windows), and
+from the main thread.
+"""
+
+# Copyright (c) IPython Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+from __future__ import print_function
+
+import marshal
+import signal
+import sys
+
+
+class SamplingProfiler(object):
+    """Profile code by sampling its stack every `interval` seconds of CPU
+    time.
+
+    Like :class:`profile.Profile`, it can be given to :class:`pstats.Stats`
+    once it has run some code.  The stacks sampled can also be written in the
+    collapsed format read by flame graph tools, with :meth:`collapsed`.
+    """
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        # Number of samples of each stack, as tuples of (filename, line,
+        # function name) from the innermost frame out.
+        self.samples = {}
+        self.stats = {}
+        self._top = None
+
+    @staticmethod
+    def available():
+        """Whether sampling is possible on this platform"""
+        return hasattr(signal, 'setitimer')
+
+    def _sample(self, signum, frame):
+        stack = []
+        top = self._top
+        while frame is not None and frame is not top:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        if stack:
+            stack = tuple(stack)
+            self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    def runctx(self, cmd, globals, locals):
+        """Run cmd, a string or code object, while sampling its stack."""
+        # The frames from this one out aren't part of the profile
+        self._top = sys._getframe()
+        handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        try:
+            exec(cmd, globals, locals)
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, handler)
+            self._top = None
+        return self
+
+    def create_stats(self):
+        """Fill `stats` with the samples, in the format of
+        :class:`profile.Profile`, for :class:`pstats.Stats`."""
+        stats = {}
+        for stack, count in self.samples.items():
+            elapsed = count * self.interval
+            seen = set()
+            for i, func in enumerate(stack):
+                entry = stats.setdefault(func, [0, 0, 0., 0., {}])
+                own = elapsed if i == 0 else 0.
+                entry[2] += own
+                # Recursive functions only count once per sample
+                if func not in seen:
+                    seen.add(func)
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += elapsed
+                if i + 1 < len(stack):
+                    caller = entry[4].get(stack[i + 1], (0, 0, 0., 0.))
+                    entry[4][stack[i + 1]] = (caller[0] + count,
+                                              caller[1] + count,
+                                              caller[2] + own,
+                                              caller[3] + elapsed)
+        self.stats = dict((func, tuple(entry))
+                          for func, entry in stats.items())
+
+    def dump_stats(self, filename):
+        """Write the stats in a file which :mod:`pstats` can load."""
+        self.create_stats()
+        with open(filename, 'wb') as f:
+            marshal.dump(self.stats, f)
+
+    def collapsed(self):
+        """The samples in the collapsed stack format of flame graph tools:
+        one line per stack, with its frames from the outermost in, separated
+        by semicolons, and its number of samples.
+        """
+        lines = []
+        for stack, count in sorted(self.samples.items(),
+                                   key=lambda item: item[0][::-1]):
+            frames = ['%s (%s:%d)' % (name, filename, line)
+                      for filename, line, name in reversed(stack)]
+            lines.append('%s %d' % (';'.join(frames), count))
+        return '\n'.join(lines)
@@ -73,3 +73,86 @@ def test_compiler_check_cache():
             break
     else:
         raise AssertionError('Entry for input-99 missing from linecache')
+
+def test_source_cache_eviction():
+    cache = compilerop.SourceCache(max_bytes=100)
+    names = [compilerop.code_name('x = %d  # %s' % (i, 'x' * 30), i)
+             for i in range(3)]
+    for i, name in enumerate(names):
+        cache.add(name, 'x = %d  # %s' % (i, 'x' * 30))
+    nt.assert_equal(cache.nbytes, 78)
+    nt.assert_equal(list(cache), names[1:])
+    nt.assert_not_in(names[0], linecache.cache)
+
+    # Evicted entries can be found again
+    nt.assert_false(cache.fetch(names[0]))
+    cache.fetchers.append(lambda name: 'x = 0' if name == names[0] else None)
+    nt.assert_true(cache.fetch(names[0]))
+    nt.assert_equal(linecache.cache[names[0]][2], ['x = 0\n'])
+    nt.assert_equal(list(cache), names[1:] + names[:1])
+
+def test_getlines_fetches_evicted():
+    cp = compilerop.CachingCompiler()
+    cache = cp.source_cache
+    name = cp.cache('y = 2', 98)
+    fetcher = lambda n: 'y = 2' if n == name else None
+    cache.fetchers.append(fetcher)
+    try:
+        del cache[name]
+        del linecache.cache[name]
+        nt.assert_equal(linecache.getlines(name), ['y = 2\n'])
+        # Clearing linecache doesn't lose the entries
+        linecache.clearcache()
+        linecache.checkcache()
+        nt.assert_in(name, linecache.cache)
+    finally:
+        cache.fetchers.remove(fetcher)
+
+def test_replay_compiler():
+    cp = compilerop.CachingCompiler()
+    codes = []
+    src = 'def f():\n    return 1\n'
+    code = compilerop.ReplayCompiler(cp, codes)(src, '<cell-1>', 'exec')
+    nt.assert_equal(codes, [code])
+    replayed = compilerop.ReplayCompiler(cp, codes)(src, '<cell-2>', 'exec')
+    nt.assert_equal(replayed.co_filename, '<cell-2>')
+    inner = [c for c in replayed.co_consts if hasattr(c, 'co_filename')]
+    nt.assert_equal(inner[0].co_filename, '<cell-2>')
+
+def test_relabel_code():
+    src = 'def f():\n    def g():\n        return 1\n    return g\n'
+    code = compile(src, '<cell-1>', 'exec')
+    relabeled = compilerop.relabel_code(code, '<cell-2>')
+    nt.assert_equal(relabeled.co_filename, '<cell-2>')
+    ns = {}
+    exec(relabeled, ns)
+    g = ns['f']()
+    nt.assert_equal(ns['f'].__code__.co_filename, '<cell-2>')
+    nt.assert_equal(g.__code__.co_filename, '<cell-2>')
+    nt.assert_equal(g(), 1)
+    nt.assert_is(compilerop.relabel_code(code, '<cell-1>'), code)
+
+def test_replay_compiler_fallback():
+    """Code objects which can't be relabeled are compiled again"""
+    cp = compilerop.CachingCompiler()
+    codes = []
+    src = 'x = 1\n'
+    compilerop.ReplayCompiler(cp, codes)(src, '<cell-1>', 'exec')
+    relabel_code = compilerop.relabel_code
+    compilerop.relabel_code = lambda code, filename: None
+    try:
+        code = compilerop.ReplayCompiler(cp, codes)(src, '<cell-2>', 'exec')
+    finally:
+        compilerop.relabel_code = relabel_code
+    nt.assert_equal(code.co_filename, '<cell-2>')
+    nt.assert_equal(codes, [code])
+
+def test_code_cache_lru():
+    cache = compilerop.CodeCache(size=2)
+    cache['a'] = 1
+    cache['b'] = 2
+    nt.assert_equal(cache.lookup('a'), 1)
+    cache['c'] = 3
+    nt.assert_equal(list(cache), ['a', 'c'])
+    nt.assert_is_none(cache.lookup('b'))
+    nt.assert_equal((cache.hits, cache.misses), (1, 1))
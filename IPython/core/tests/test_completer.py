@@ -6,6 +6,7 @@
 
 import os
 import sys
+import time
 import unittest
 
 from contextlib import contextmanager
@@ -268,6 +269,31 @@ def test_local_file_completions():
         nt.assert_equal(c, comp)
 
 
+def test_dir_cache_file_completions():
+    ip = get_ipython()
+    ip.Completer.use_dir_cache = True
+    try:
+        with TemporaryDirectory() as tmpdir:
+            prefix = os.path.join(tmpdir, 'foo')
+            open(prefix + '1', 'w').close()
+            os.mkdir(prefix + 'dir')
+            c = ip.complete(prefix)[1]
+            nt.assert_equal(c, [prefix + '1', prefix + 'dir/'])
+            nt.assert_in(tmpdir, ip.Completer.dir_cache._listings)
+        cache = ip.Completer.dir_cache
+        thread = cache._thread
+    finally:
+        ip.Completer.use_dir_cache = False
+    # Disabling the cache stops its thread, and the cache is reused
+    thread.join(5)
+    nt.assert_false(thread.is_alive())
+    ip.Completer.use_dir_cache = True
+    try:
+        nt.assert_is(ip.Completer.dir_cache, cache)
+    finally:
+        ip.Completer.use_dir_cache = False
+
+
 def test_greedy_completions():
     ip = get_ipython()
     ip.ex('a=list(range(5))')
@@ -459,6 +485,78 @@ def test_magic_completion_order():
     nt.assert_equal(matches, ["timeit", "%timeit","%%timeit"])
 
 
+def test_completion_cache():
+    ip = get_ipython()
+    c = ip.Completer
+
+    class Wide(object):
+        dir_calls = 0
+        def __dir__(self):
+            Wide.dir_calls += 1
+            return ['column_%d' % i for i in range(100)] + ['col', 'other']
+
+    ip.user_ns['wide'] = Wide()
+    cache_size = c.completion_cache_size
+    c.completion_cache_size = 4
+    try:
+        _, matches = c.complete(line_buffer='wide.col')
+        nt.assert_equal(len(matches), 101)
+        nt.assert_equal(Wide.dir_calls, 1)
+        _, matches = c.complete(line_buffer='wide.column_1')
+        nt.assert_equal(matches, ['wide.column_1'] +
+                        ['wide.column_1%d' % i for i in range(10)])
+        _, matches = c.complete(line_buffer='wide.column_12')
+        nt.assert_equal(matches, ['wide.column_12'])
+        nt.assert_equal(Wide.dir_calls, 1)
+
+        # Not an extension of a cached completion
+        c.complete(line_buffer='wide.c')
+        nt.assert_equal(Wide.dir_calls, 2)
+        # Executing code invalidates the cache
+        ip.run_cell('pass', store_history=True)
+        c.complete(line_buffer='wide.column_12')
+        nt.assert_equal(Wide.dir_calls, 3)
+    finally:
+        c.completion_cache_size = cache_size
+        del ip.user_ns['wide']
+
+
+def test_completion_time_limits():
+    ip = get_ipython()
+    c = ip.Completer
+
+    def slow_matcher(text):
+        time.sleep(0.05)
+        return ['slow_match']
+
+    c.matcher_stats.clear()
+    c.matchers.insert(0, slow_matcher)
+    c.completion_time_budget = 0.01
+    try:
+        _, matches = c.complete(line_buffer='slow')
+        nt.assert_equal(matches, ['slow_match'])
+        stats = c.matcher_stats
+        nt.assert_equal(stats['slow_matcher']['calls'], 1)
+        nt.assert_equal(stats['slow_matcher']['overruns'], 1)
+        nt.assert_greater_equal(stats['slow_matcher']['time'], 0.05)
+        # The other matchers were skipped
+        nt.assert_equal(stats['file_matches']['skipped'], 1)
+    finally:
+        c.matchers.remove(slow_matcher)
+        c.completion_time_budget = 0
+
+    # Dictionary keys are cut short at the limit
+    ip.user_ns['big'] = dict(('key%d' % i, i) for i in range(10000))
+    c.matcher_time_limit = 1e-9
+    try:
+        _, matches = c.complete(line_buffer='big["key')
+        nt.assert_less(len(matches), 10000)
+        nt.assert_equal(c.matcher_stats['dict_key_matches']['partial'], 1)
+    finally:
+        c.matcher_time_limit = 0
+        del ip.user_ns['big']
+
+
 def test_dict_key_completion_string():
     """Test dictionary key completion for string keys"""
     ip = get_ipython()
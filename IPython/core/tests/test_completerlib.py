@@ -12,12 +12,16 @@
 import shutil
 import sys
 import tempfile
+import threading
+import time
 import unittest
 from os.path import join
 
 import nose.tools as nt
 
-from IPython.core.completerlib import magic_run_completer, module_completion
+from IPython.core import completerlib
+from IPython.core.completerlib import (magic_run_completer, module_completion,
+                                      RootModuleIndex, update_root_modules_async)
 from IPython.utils import py3compat
 from IPython.utils.tempdir import TemporaryDirectory
 from IPython.testing.decorators import onlyif_unicode_paths
@@ -145,3 +149,88 @@ def test_import_invalid_module():
         nt.assert_equal(intersection, set())
 
         assert valid_module_names.issubset(s), valid_module_names.intersection(s)
+
+
+def test_root_module_index():
+    """The module index is stored, and only changed entries are rescanned"""
+    with TemporaryDirectory() as tmpdir:
+        open(join(tmpdir, 'mod_a.py'), 'w').close()
+        db = {}
+        index = RootModuleIndex(db)
+        index.update([tmpdir])
+        nt.assert_equal(index.modules([tmpdir]), set(['mod_a']))
+        nt.assert_equal(db[RootModuleIndex.key]['entries'][tmpdir][1],
+                        ['mod_a'])
+
+        # A new index loads the stored one
+        index = RootModuleIndex(db)
+        nt.assert_equal(index.modules([tmpdir]), set(['mod_a']))
+
+        os.mkdir(join(tmpdir, 'pkg_b'))
+        open(join(tmpdir, 'pkg_b', '__init__.py'), 'w').close()
+        # Make sure the change is visible even with coarse mtimes
+        mtime = os.stat(tmpdir).st_mtime
+        os.utime(tmpdir, (mtime + 10, mtime + 10))
+        index.update([tmpdir])
+        nt.assert_equal(index.modules([tmpdir]), set(['mod_a', 'pkg_b']))
+
+    # Indexes in another format are discarded
+    nt.assert_equal(RootModuleIndex({RootModuleIndex.key: {'x': []}}).entries,
+                    {})
+
+
+class BlockedIndex(RootModuleIndex):
+    """An index whose scans wait for `go` to be set"""
+    def __init__(self, db):
+        super(BlockedIndex, self).__init__(db)
+        self.go = threading.Event()
+
+    def scan(self, path):
+        self.go.wait(10)
+        return RootModuleIndex.scan(path)
+
+
+def test_root_module_index_concurrency():
+    """The index can be read during scans, and reset discards them"""
+    with TemporaryDirectory() as tmpdir:
+        open(join(tmpdir, 'mod_a.py'), 'w').close()
+        db = {}
+        index = BlockedIndex(db)
+        index.entries['other'] = (None, ['old'])
+        t = threading.Thread(target=index.update, args=([tmpdir],))
+        t.start()
+        for _ in range(100):
+            if index.scanning:
+                break
+            time.sleep(0.01)
+        nt.assert_equal(index.scanning, 1)
+        # Not blocked by the scan
+        nt.assert_equal(index.modules(['other', tmpdir]), set(['old']))
+        index.reset()
+        index.go.set()
+        t.join(10)
+        nt.assert_equal(index.scanning, 0)
+        # The results of the scan started before the reset were discarded
+        nt.assert_equal(index.entries, {})
+        nt.assert_not_in(RootModuleIndex.key, db)
+        nt.assert_true(index.update([tmpdir]))
+        nt.assert_equal(index.modules([tmpdir]), set(['mod_a']))
+
+
+def test_update_root_modules_async():
+    """The index is only updated at startup if it is stale"""
+    nt.assert_false(get_ipython().Completer.index_root_modules_on_startup)
+    with TemporaryDirectory() as tmpdir:
+        open(join(tmpdir, 'mod_a.py'), 'w').close()
+        old_index, old_path = completerlib._root_module_index, sys.path
+        completerlib._root_module_index = index = RootModuleIndex({})
+        sys.path = ['', tmpdir]
+        try:
+            t = update_root_modules_async()
+            t.join(10)
+            nt.assert_equal(index.modules([tmpdir]), set(['mod_a']))
+            # The current directory isn't scanned, and tmpdir is up to date
+            nt.assert_not_in('', index.entries)
+            nt.assert_is_none(update_root_modules_async())
+        finally:
+            completerlib._root_module_index, sys.path = old_index, old_path
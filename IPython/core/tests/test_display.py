@@ -3,11 +3,17 @@
 
 import json
 import os
+import threading
+import time
 import warnings
 
 import nose.tools as nt
 
 from IPython.core import display
+from IPython.core.displaypub import (CapturingDisplayPublisher,
+                                     CoalescingDisplayPublisher,
+                                     DisplayPublisher,
+                                     coalescing_publisher_class)
 from IPython.core.getipython import get_ipython
 from IPython import paths as ipath
 
@@ -150,3 +156,71 @@ def test_json():
         nt.assert_equal(j._repr_json_(), lis)
     
     
+
+
+CoalescingCapture = coalescing_publisher_class(CapturingDisplayPublisher)
+
+def test_coalescing_display_pub():
+    nt.assert_is(coalescing_publisher_class(CapturingDisplayPublisher),
+                 CoalescingCapture)
+    nt.assert_is(coalescing_publisher_class(DisplayPublisher),
+                 CoalescingDisplayPublisher)
+    pub = CoalescingCapture(update_rate=0.01)
+    pub.publish({'text/plain': 'first'})
+    # The first output is sent at once, later ones wait for the next frame
+    nt.assert_equal(pub.outputs, [({'text/plain': 'first'}, None)])
+    for i in range(100):
+        pub.clear_output(wait=True)
+        pub.publish({'text/plain': str(i)})
+    pub.publish({'text/plain': 'last'})
+    nt.assert_equal(len(pub.outputs), 1)
+    nt.assert_equal(pub.coalesced, 99)
+    pub.flush()
+    # Only the final state was sent, after clearing the first output
+    nt.assert_equal(pub.outputs, [({'text/plain': '99'}, None),
+                                  ({'text/plain': 'last'}, None)])
+
+def test_coalescing_display_pub_threads():
+    pub = CoalescingCapture(update_rate=0)
+    def worker(n):
+        for i in range(200):
+            pub.publish({'text/plain': '%d-%d' % (n, i)})
+        pub.flush()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # Nothing is sent from other threads
+    nt.assert_equal(pub.outputs, [])
+    pub.flush()
+    nt.assert_equal(len(pub.outputs), 800)
+    for n in range(4):
+        sent = [d['text/plain'] for d, md in pub.outputs
+                if d['text/plain'].startswith('%d-' % n)]
+        nt.assert_equal(sent, ['%d-%d' % (n, i) for i in range(200)])
+
+def test_coalescing_display_pub_idle_owner():
+    """Outputs of other threads are held until the owner thread publishes"""
+    pub = CoalescingCapture(update_rate=1000)
+    t = threading.Thread(target=pub.publish, args=({'text/plain': 'a'},))
+    t.start()
+    t.join()
+    # There is no timer: the frame is over, but the output is still held
+    time.sleep(0.01)
+    nt.assert_equal(pub.outputs, [])
+    pub.publish({'text/plain': 'b'})
+    nt.assert_equal([d['text/plain'] for d, md in pub.outputs], ['a', 'b'])
+
+def test_display_pub_flushed_after_cell():
+    ip = get_ipython()
+    save_pub = ip.display_pub
+    ip.display_pub = pub = CoalescingCapture(update_rate=0.01)
+    try:
+        pub.publish({'text/plain': 'a'})
+        pub.publish({'text/plain': 'b'})
+        nt.assert_equal(len(pub.outputs), 1)
+        ip.run_cell('1;')
+        nt.assert_equal(len(pub.outputs), 2)
+    finally:
+        ip.display_pub = save_pub
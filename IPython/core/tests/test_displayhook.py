@@ -1,3 +1,8 @@
+import gc
+
+import nose.tools as nt
+
+from IPython.core.displayhook import estimate_size
 from IPython.testing.tools import AssertPrints, AssertNotPrints
 
 ip = get_ipython()
@@ -19,3 +24,97 @@ def test_output_quiet():
       
     with AssertNotPrints('2'):
         ip.run_cell('1+1; # comment with a semicolon', store_history=True)
+
+class Sized(object):
+    def __init__(self, size):
+        self.size = size
+    def __sizeof__(self):
+        return self.size
+    def __repr__(self):
+        return "Sized(%d)" % self.size
+
+def test_output_cache_size_limits():
+    """Results are evicted from the output cache by estimated size"""
+    dh = ip.displayhook
+    ip.user_ns['Sized'] = Sized
+    size = estimate_size(Sized(1000))
+    dh.cache_max_bytes = int(2.5 * size)
+    dh.flush()
+    stats = dh.cache_stats
+    evictions = stats['evictions']
+    try:
+        with AssertPrints('Sized'):
+            ip.run_cell('Sized(1000)', store_history=True)
+        first = ip.execution_count - 1
+        ip.run_cell('Sized(1000)', store_history=True)
+        nt.assert_equal(stats['bytes'], 2 * size)
+        with AssertPrints('Output cache size limit', channel='stderr'):
+            ip.run_cell('Sized(1000)', store_history=True)
+        nt.assert_equal(stats['evictions'], evictions + 1)
+        nt.assert_not_in(first, ip.user_ns['Out'])
+        nt.assert_not_in('_%d' % first, ip.user_ns)
+        nt.assert_equal(stats['bytes'], 2 * size)
+        # Warned only once
+        with AssertNotPrints('Output cache size limit', channel='stderr'):
+            ip.run_cell('Sized(1000)', store_history=True)
+        nt.assert_equal(stats['evictions'], evictions + 2)
+
+        # Too big on its own
+        ip.run_cell('Sized(5000)', store_history=True)
+        nt.assert_not_in(ip.execution_count - 1, ip.user_ns['Out'])
+        nt.assert_equal(ip.user_ns['_'].size, 5000)
+
+        # Cached by weak reference
+        dh.weak_cache_min_bytes = 2000
+        ip.user_ns['big'] = Sized(2000)
+        ip.run_cell('big', store_history=True)
+        n = ip.execution_count - 1
+        nt.assert_is(ip.user_ns['Out'][n], ip.user_ns['big'])
+        nt.assert_in(n, ip.user_ns['Out'])
+        nt.assert_is(ip.user_ns['Out'].get(n), ip.user_ns['big'])
+        nt.assert_not_in('_%d' % n, ip.user_ns)
+        del ip.user_ns['big']
+        ip.run_cell('1', store_history=True)
+        ip.run_cell('2', store_history=True)
+        ip.run_cell('3', store_history=True)
+        gc.collect()
+        with nt.assert_raises(KeyError):
+            ip.user_ns['Out'][n]
+        nt.assert_not_in(n, ip.user_ns['Out'])
+        nt.assert_is(ip.user_ns['Out'].get(n), None)
+        # The dead reference was dropped
+        nt.assert_not_in(n, ip.user_ns['Out'].weak)
+    finally:
+        dh.cache_max_bytes = 0
+        dh.weak_cache_min_bytes = 0
+
+def test_output_cache_size_several_results():
+    """A cell with several results is counted once in the output cache size"""
+    dh = ip.displayhook
+    ip.user_ns['Sized'] = Sized
+    size = estimate_size(Sized(1000))
+    dh.cache_max_bytes = 10 * size
+    dh.flush()
+    stats = dh.cache_stats
+    interactivity = ip.ast_node_interactivity
+    ip.ast_node_interactivity = 'all'
+    try:
+        ip.run_cell('Sized(1000)\nSized(1000)\nSized(1000)', store_history=True)
+        nt.assert_equal(stats['bytes'], size)
+        nt.assert_equal(stats['bytes'], sum(dh._result_sizes.values()))
+
+        # The last result is cached by weak reference
+        dh.weak_cache_min_bytes = 2000
+        ip.user_ns['big'] = Sized(2000)
+        ip.run_cell('Sized(1000)\nbig', store_history=True)
+        n = ip.execution_count - 1
+        nt.assert_equal(stats['bytes'], size)
+        nt.assert_equal(stats['bytes'], sum(dh._result_sizes.values()))
+        nt.assert_is(ip.user_ns['Out'][n], ip.user_ns['big'])
+        nt.assert_not_in('_%d' % n, ip.user_ns)
+    finally:
+        ip.ast_node_interactivity = interactivity
+        ip.user_ns.pop('big', None)
+        dh.cache_max_bytes = 0
+        dh.weak_cache_min_bytes = 0
+        dh.flush()
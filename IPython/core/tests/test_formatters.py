@@ -1,6 +1,8 @@
 """Tests for the Formatters."""
 
+import gc
 import warnings
+import weakref
 from math import pi
 
 try:
@@ -15,6 +17,7 @@
     PlainTextFormatter, HTMLFormatter, PDFFormatter, _mod_name_key,
     DisplayFormatter, JSONFormatter,
 )
+from IPython.core.displaypub import CapturingDisplayPublisher
 from IPython.utils.io import capture_output
 
 class A(object):
@@ -239,7 +242,33 @@ def test_pop_string():
     with nt.assert_raises(KeyError):
         f.pop(type_str)
     nt.assert_is(f.pop(type_str, None), None)
-    
+
+def test_dispatch_cache():
+    """Printers found for a type are forgotten when the registries change"""
+    def bar_printer(obj, pp, cycle):
+        pp.text('bar')
+    f = PlainTextFormatter()
+    f.for_type(A, foo_printer)
+    nt.assert_equal(f(B()), 'foo')
+    nt.assert_is(f.lookup_by_type(B), foo_printer)
+
+    f.for_type(B, bar_printer)
+    nt.assert_equal(f(B()), 'bar')
+    nt.assert_is(f.lookup_by_type(B), bar_printer)
+    f.pop(B)
+    nt.assert_equal(f(B()), 'foo')
+    nt.assert_is(f.lookup_by_type(B), foo_printer)
+
+    f.for_type_by_name(B.__module__, 'B', bar_printer)
+    nt.assert_equal(f(B()), 'bar')
+    nt.assert_is(f.lookup_by_type(B), bar_printer)
+    f.pop(B)
+
+    # Changing the registries directly
+    f.type_printers[B] = bar_printer
+    nt.assert_equal(f(B()), 'bar')
+    nt.assert_is(f.lookup_by_type(B), bar_printer)
+
 
 def test_error_method():
     f = HTMLFormatter()
@@ -420,6 +449,78 @@ def _ipython_display_(self):
     nt.assert_equal(md, {})
     nt.assert_equal(catcher, [yes])
 
+def test_negotiated_format():
+    """Only text/plain and the best accepted type are computed"""
+    calls = []
+    class Rich(object):
+        def _repr_html_(self):
+            calls.append('html')
+        def _repr_png_(self):
+            calls.append('png')
+            return b'png'
+        def _repr_svg_(self):
+            calls.append('svg')
+            return '<svg/>'
+        def _repr_latex_(self):
+            calls.append('latex')
+            return '$x$'
+        def __repr__(self):
+            return 'Rich()'
+
+    f = DisplayFormatter(mime_priority=['text/html', 'image/png',
+                                        'image/svg+xml'])
+    d, md = f.format(Rich())
+    # text/html is preferred, but not available
+    nt.assert_equal(dict(d), {'text/plain': 'Rich()', 'image/png': b'png'})
+    nt.assert_equal(sorted(calls), ['html', 'png'])
+    nt.assert_equal(d.pending, ['image/svg+xml'])
+
+    nt.assert_not_in('text/latex', d)
+    d.fill(['text/latex'])
+    nt.assert_equal(d['text/latex'], '$x$')
+    nt.assert_equal(d.pending, ['image/svg+xml'])
+    d.fill()
+    nt.assert_equal(d['image/svg+xml'], '<svg/>')
+    nt.assert_equal(d.pending, [])
+    nt.assert_equal(sorted(calls), ['html', 'latex', 'png', 'svg'])
+    # Nothing is pending, so the object and the formatter are released
+    nt.assert_is_none(d.obj)
+    nt.assert_is_none(d.display_formatter)
+
+    # By default, all the types are computed
+    del calls[:]
+    d, md = DisplayFormatter().format(Rich())
+    nt.assert_equal(sorted(calls), ['html', 'latex', 'png', 'svg'])
+
+def test_mime_bundle_references():
+    """Format data doesn't keep the displayed object alive"""
+    class Rich(object):
+        def _repr_png_(self):
+            return b'png'
+        def __repr__(self):
+            return 'Rich()'
+
+    f = DisplayFormatter(mime_priority=['image/png', 'image/svg+xml'])
+    obj = Rich()
+    ref = weakref.ref(obj)
+    d, md = f.format(obj)
+    nt.assert_equal(d.pending, ['image/svg+xml'])
+    del obj
+    gc.collect()
+    # Kept while a representation is pending
+    nt.assert_is_not_none(ref())
+    d.fill()
+    gc.collect()
+    nt.assert_is_none(ref())
+    nt.assert_equal(dict(d), {'text/plain': 'Rich()', 'image/png': b'png'})
+
+    # Captured outputs are plain dicts
+    pub = CapturingDisplayPublisher()
+    pub.publish(*f.format(Rich()))
+    data, md = pub.outputs[0]
+    nt.assert_is(type(data), dict)
+    nt.assert_equal(data, {'text/plain': 'Rich()', 'image/png': b'png'})
+
 def test_json_as_string_deprecated():
     class JSONString(object):
         def _repr_json_(self):
@@ -8,8 +8,10 @@
 # stdlib
 import io
 import os
+import sqlite3
 import sys
 import tempfile
+import time
 from datetime import datetime
 
 # third party
@@ -18,7 +20,12 @@
 # our own packages
 from traitlets.config.loader import Config
 from IPython.utils.tempdir import TemporaryDirectory
-from IPython.core.history import HistoryManager, extract_hist_ranges
+from IPython.core.history import (
+    HistoryAccessor, HistoryManager, extract_hist_ranges, fts_supported,
+    _key_condition,
+)
+from IPython.core.historyapp import HistoryCompact
+from IPython.testing import decorators as dec
 from IPython.utils import py3compat
 
 def setUp():
@@ -143,6 +150,243 @@ def test_history():
             ip.history_manager = hist_manager_ori
 
 
+@dec.skipif(not fts_supported(), "SQLite has no FTS5 trigram tokenizer")
+def test_search_fts_index():
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        hist = HistoryAccessor(hist_file=hist_file)
+        # Rows written before the index exists are picked up when it is built
+        with hist.db:
+            hist.db.execute("INSERT INTO history VALUES (1, 1, 'a=1', 'a=1')")
+            hist.db.execute("INSERT INTO history VALUES (1, 2, 'x=get_ipython()', '%x')")
+        hist.db.close()
+
+        hist = HistoryAccessor(hist_file=hist_file, fts_index=True)
+        try:
+            nt.assert_true(hist._fts_active)
+            with hist.db:
+                hist.db.execute("INSERT INTO history VALUES (2, 1, 'b=1', 'b=1')")
+                hist.db.execute("INSERT INTO history VALUES (2, 2, 'a=12', 'a=12')")
+            nt.assert_equal(list(hist.search("*get_ipy*")), [])
+            nt.assert_equal(list(hist.search("*get_ipy*", search_raw=False)),
+                            [(1, 2, '%x')])
+            nt.assert_equal(list(hist.search("a=1*")),
+                            [(1, 1, 'a=1'), (2, 2, 'a=12')])
+            nt.assert_equal(list(hist.search("*a=1*", n=1)), [(2, 2, 'a=12')])
+            # Too short to use the index: plain GLOB
+            nt.assert_equal(list(hist.search("b*")), [(2, 1, 'b=1')])
+        finally:
+            hist.db.close()
+
+
+def test_journal_mode():
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        hist = HistoryAccessor(hist_file=hist_file, journal_mode='wal',
+                               synchronous='normal')
+        try:
+            mode, = hist.db.execute("PRAGMA journal_mode").fetchone()
+            nt.assert_equal(mode, 'wal')
+            level, = hist.db.execute("PRAGMA synchronous").fetchone()
+            nt.assert_equal(level, 1)
+        finally:
+            hist.db.close()
+        # By default the journal mode of the file is left as it is
+        hist = HistoryAccessor(hist_file=hist_file)
+        try:
+            nt.assert_is_none(hist.journal_mode)
+            mode, = hist.db.execute("PRAGMA journal_mode").fetchone()
+            nt.assert_equal(mode, 'wal')
+        finally:
+            hist.db.close()
+
+
+def test_journal_mode_locked():
+    """Opening the history while another accessor writes in WAL mode"""
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        writer = HistoryAccessor(hist_file=hist_file, journal_mode='wal')
+        try:
+            writer.db.execute("INSERT INTO history VALUES (1, 1, 'a', 'a')")
+            writer.db.commit()
+            writer.db.execute("INSERT INTO history VALUES (1, 2, 'b', 'b')")
+            for journal_mode in (None, 'delete'):
+                reader = HistoryAccessor(hist_file=hist_file,
+                                         journal_mode=journal_mode,
+                                         connection_options=dict(timeout=0.1))
+                try:
+                    nt.assert_equal(list(reader.get_range(1)), [(1, 1, 'a')])
+                finally:
+                    reader.db.close()
+                nt.assert_equal(sorted(os.listdir(tmpdir))[0], 'history.sqlite')
+                nt.assert_false(os.path.exists(
+                    os.path.join(tmpdir, 'history-corrupt.sqlite')))
+            writer.db.commit()
+        finally:
+            writer.db.close()
+
+
+def test_writeout_policy():
+    ip = get_ipython()
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        hm = HistoryManager(shell=ip, hist_file=hist_file, db_cache_size=100,
+                            db_cache_max_bytes=20, db_cache_max_age=0.2)
+        try:
+            nt.assert_false(hm._writeout_due())
+            hm.store_inputs(1, u'a=1')
+            nt.assert_false(hm._writeout_due())
+            nt.assert_true(0 < hm._writeout_wait_time() <= 0.2)
+            hm.store_inputs(2, u'b = "a long string"')
+            nt.assert_true(hm._writeout_due())
+            hm.writeout_cache()
+            nt.assert_equal(hm.writeout_stats['flushes'], 1)
+            nt.assert_equal(hm.writeout_stats['rows'], 2)
+            nt.assert_is_none(hm._writeout_wait_time())
+
+            # The saving thread writes out old entries by itself
+            hm.store_inputs(3, u'c=3')
+            for _ in range(50):
+                if not hm.db_input_cache:
+                    break
+                time.sleep(0.1)
+            nt.assert_equal(hm.db_input_cache, [])
+            nt.assert_equal(hm.writeout_stats['flushes'], 2)
+            nt.assert_equal(hm.writeout_stats['rows'], 3)
+        finally:
+            hm.save_thread.stop()
+            hm.db.close()
+
+
+def test_paged_retrieval():
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        hist = HistoryAccessor(hist_file=hist_file, page_size=3)
+        rows = [(s, n, u'x=%d' % n) for s in (1, 2, 3) for n in range(1, 5)]
+        try:
+            with hist.db:
+                hist.db.executemany("INSERT INTO history VALUES (?, ?, ?, ?)",
+                                    [r + (r[2],) for r in rows])
+            nt.assert_equal(hist.get_page(), rows[:3])
+            nt.assert_equal(hist.get_page(after=(2, 4)), rows[8:11])
+            nt.assert_equal(hist.get_page(after=(3, 4)), [])
+            nt.assert_equal(hist.get_page(page_size=5), rows[:5])
+
+            # Longer results are streamed across several pages
+            nt.assert_equal(list(hist.get_tail(7)), rows[-8:-1])
+            nt.assert_equal(list(hist.get_tail(7, include_latest=True)),
+                            rows[-7:])
+            nt.assert_equal(list(hist.get_tail(100)), rows[:-1])
+            nt.assert_equal(list(hist.search(u"*=1")), rows[::4])
+            nt.assert_equal(list(hist.search(u"x*", n=5)), rows[-5:])
+        finally:
+            hist.db.close()
+
+
+def test_key_condition():
+    """Keys are compared like tuples, without SQLite's row values"""
+    db = sqlite3.connect(':memory:')
+    keys = [(s, n) for s in (1, 2, 3) for n in (1, 2, 3)]
+    try:
+        db.execute("CREATE TABLE t (session integer, line integer)")
+        db.executemany("INSERT INTO t VALUES (?, ?)", keys)
+        for op, compare in [('<', tuple.__lt__), ('<=', tuple.__le__),
+                            ('>', tuple.__gt__), ('>=', tuple.__ge__)]:
+            sql, params = _key_condition(op, (2, 2))
+            found = db.execute("SELECT session, line FROM t WHERE %s "
+                               "ORDER BY session, line" % sql, params)
+            nt.assert_equal(list(found),
+                            [k for k in keys if compare(k, (2, 2))], op)
+    finally:
+        db.close()
+
+
+def test_compressed_entries():
+    ip = get_ipython()
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        hm = HistoryManager(shell=ip, hist_file=hist_file, compress_threshold=20,
+                            db_log_output=True)
+        try:
+            long_cell = u"x = [%s]" % u", ".join([u"'€'"] * 50)
+            hm.store_inputs(1, u"a = 1")
+            hm.store_inputs(2, long_cell)
+            hm.output_hist_reprs[2] = u"spam " * 20
+            hm.store_output(2)
+            hm.writeout_cache()
+            stored = [r[0] for r in hm.db.execute("SELECT typeof(source_raw) "
+                                                  "FROM history ORDER BY line")]
+            nt.assert_equal(stored, ['text', 'blob'])
+
+            session = hm.session_number
+            hm.reset()
+            expected = [(session, 1, (u"a = 1", None)),
+                        (session, 2, (long_cell, u"spam " * 20))]
+            nt.assert_equal(list(hm.get_range(session, output=True)), expected)
+            nt.assert_equal(list(hm.search(u"*'€', '€'*")), [(session, 2, long_cell)])
+
+            # Decompress everything again, then recompress
+            compact = HistoryCompact(threshold=0)
+            compact._compact_table(hm.db, 'history', ('source', 'source_raw'))
+            compact._compact_table(hm.db, 'output_history', ('output',))
+            nt.assert_equal(hm.db.execute("SELECT count(*) FROM history WHERE "
+                                "typeof(source_raw) = 'blob'").fetchone()[0], 0)
+            compact.threshold = 3
+            compact._compact_table(hm.db, 'history', ('source', 'source_raw'))
+            nt.assert_equal(hm.db.execute("SELECT count(*) FROM history WHERE "
+                                "typeof(source_raw) = 'blob'").fetchone()[0], 2)
+            nt.assert_equal(list(hm.get_range(session, output=True)), expected)
+        finally:
+            hm.save_thread.stop()
+            hm.db.close()
+
+
+def test_dedup_sources():
+    ip = get_ipython()
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        hm = HistoryManager(shell=ip, hist_file=hist_file)
+        cmds = [u"ls", u"a = 1", u"ls", u"%run foo.py", u"ls"]
+        try:
+            for i, cmd in enumerate(cmds, start=1):
+                hm.store_inputs(i, cmd)
+            hm.writeout_cache()
+            session = hm.session_number
+        finally:
+            hm.end_session()
+            hm.save_thread.stop()
+            hm.db.close()
+
+        # The existing history is converted to the deduplicated layout
+        hm = HistoryManager(shell=ip, hist_file=hist_file, dedup_sources=True)
+        try:
+            nt.assert_true(hm._dedup)
+            hm.store_inputs(1, u"a = 1")
+            hm.store_inputs(2, u"b = 2")
+            hm.writeout_cache()
+            nsources = hm.db.execute("SELECT count(*) FROM sources").fetchone()[0]
+            nt.assert_equal(nsources, 4)
+
+            new = hm.session_number
+            hm.reset()
+            nt.assert_equal(list(hm.get_range(session, 2, 4)),
+                            [(session, 2, u"a = 1"), (session, 3, u"ls")])
+            nt.assert_equal(list(hm.get_tail(2, include_latest=True)),
+                            [(new, 1, u"a = 1"), (new, 2, u"b = 2")])
+            nt.assert_equal(list(hm.search(u"a*")),
+                            [(session, 2, u"a = 1"), (new, 1, u"a = 1")])
+            nt.assert_equal(list(hm.search(u"*", unique=True)),
+                            [(session, 4, u"%run foo.py"),
+                             (session, 5, u"ls"),
+                             (new, 1, u"a = 1"),
+                             (new, 2, u"b = 2")])
+            nt.assert_equal(list(hm.search(u"*", unique=True, n=1, output=True)),
+                            [(new, 2, (u"b = 2", None))])
+        finally:
+            hm.save_thread.stop()
+            hm.db.close()
+
+
 def test_extract_hist_ranges():
     instr = "1 2/3 ~4/5-6 ~4/7-~4/9 ~9/2-~7/5 ~10/"
     expected = [(0, 1, 2),  # 0 == current session
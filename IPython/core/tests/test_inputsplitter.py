@@ -446,6 +446,24 @@ def test_syntax_multiline_cell(self):
                 # Match ignoring trailing whitespace
                 self.assertEqual(out.rstrip(), out_t.rstrip())
     
+    def test_long_cell_compiled_once(self):
+        isp = self.isp
+        compiles = []
+        compile_ = isp._compile
+        def counting_compile(source, *args, **kwargs):
+            compiles.append(source)
+            return compile_(source, *args, **kwargs)
+        isp._compile = counting_compile
+
+        cell = u'\n'.join([u'x%d = %d' % (i, i) for i in range(500)] +
+                          [u'd = {'] + [u' %d: %d,' % (i, i) for i in range(500)]
+                          + [u'}', u'%time x = 1', u'if x:'])
+        self.assertEqual(isp.check_complete(cell), ('incomplete', 4))
+        self.assertEqual(len(compiles), 1)
+        out = isp.transform_cell(cell)
+        self.assertEqual(len(compiles), 2)
+        self.assertIn(u"get_ipython().magic('time x = 1')\nif x:", out)
+
     def test_cellmagic_preempt(self):
         isp = self.isp
         for raw, name, line, cell in [
@@ -402,11 +402,35 @@ def test_assemble_python_lines():
        (u"2,", None),
        (None, u"a = [1,\n2,"),
       ],
+      [(u"a = {'(': 1,  # ]", None),  # Brackets in strings and comments
+       (u"   ']': '''", None),
+       (u")'''}", u"a = {'(': 1,  # ]\n   ']': '''\n)'''}"),
+      ],
+      [(u"a = [1,", None),  # Error tokens end the statement, as before
+       (u"$b", u"a = [1,\n$b"),
+      ],
     ] + syntax_ml['multiline_datastructure']
     for example in tests:
         transform_checker(example, ipt.assemble_python_lines)
 
 
+def test_scan_brackets():
+    for line, state, expected in [
+        (u"a = 1", (0, None), (0, None)),
+        (u"f(x, [1,", (0, None), (2, None)),
+        (u"2])", (2, None), (0, None)),
+        (u"'(', \"[\", '\\'' # {", (0, None), (0, None)),
+        (u"s = '''a", (0, None), (0, u"'''")),
+        (u"it's'''", (0, u"'''"), (0, None)),
+        (u"'a''' + '''", (0, None), (0, u"'''")),
+        (u"x != y)", (1, None), (0, None)),
+        (u"])", (0, None), None),
+        (u"'unterminated", (0, None), None),
+        (u"a?", (0, None), None),
+        (u"a \\", (1, None), None),
+    ]:
+        nt.assert_equal(ipt._scan_brackets(line, *state), expected, line)
+
 def test_help_end():
     tt.check_pairs(transform_and_reset(ipt.help_end), syntax['end_help'])
 
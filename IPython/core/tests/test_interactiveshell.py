@@ -10,6 +10,7 @@
 # Distributed under the terms of the Modified BSD License.
 
 import ast
+import linecache
 import os
 import signal
 import shutil
@@ -71,6 +72,52 @@ def test_run_empty_cell(self):
         self.assertEqual(ip.execution_count, old_xc)
         self.assertEqual(res.execution_count, None)
 
+    def test_evicted_cell_source(self):
+        """Sources dropped from the source cache are found in the history"""
+        ip.run_cell('evicted_cell_source = 1', store_history=True)
+        cache = ip.compile.source_cache
+        name = next(reversed(cache))
+        del cache[name]
+        linecache.cache.pop(name, None)
+        self.assertEqual(linecache.getlines(name),
+                         ['evicted_cell_source = 1\n'])
+        self.assertIn(name, cache)
+
+    def test_code_cache(self):
+        """Cells run again reuse their transformed source and code"""
+        funcs = ip.user_ns['code_cache_funcs'] = []
+        cell = u"code_cache_funcs.append(lambda: 1)"
+        ip.code_cache_size = 10
+        try:
+            hits = ip.code_cache.hits
+            ip.run_cell(cell, store_history=True)
+            ip.run_cell(cell, store_history=True)
+            first, second = [f.__code__ for f in funcs]
+            self.assertEqual(ip.code_cache.hits, hits + 2)
+            # Tracebacks point at the latest cell
+            self.assertNotEqual(first.co_filename, second.co_filename)
+            self.assertEqual(second.co_filename,
+                             next(reversed(ip.compile.source_cache)))
+        finally:
+            ip.code_cache_size = 0
+        self.assertEqual(len(ip.code_cache), 0)
+
+    def test_execution_telemetry(self):
+        """run_cell times its phases, and passes its result to post_run_cell_result"""
+        results = []
+        ip.events.register('post_run_cell_result', results.append)
+        try:
+            res = ip.run_cell(u"len(list(range(1000)))", store_history=True)
+        finally:
+            ip.events.unregister('post_run_cell_result', results.append)
+        self.assertEqual(results, [res])
+        self.assertEqual(tuple(res.timings), res.phases)
+        for phase, elapsed in res.timings.items():
+            self.assertGreaterEqual(elapsed, 0, phase)
+        self.assertGreater(res.timings['exec'], 0)
+        if res.peak_rss_delta is not None:
+            self.assertGreaterEqual(res.peak_rss_delta, 0)
+
     def test_run_cell_multiline(self):
         """Multi-block, multi-line cells must execute correctly.
         """
@@ -0,0 +1,77 @@
+# coding: utf-8
+"""Tests for the line profiler."""
+
+# Copyright (c) IPython Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import sys
+
+import nose.tools as nt
+
+from IPython.core import lineprofiler
+from IPython.core.lineprofiler import LineProfiler
+from IPython.testing import decorators as dec
+
+
+def squares(n):
+    total = 0
+    for i in range(n):
+        total += i * i
+    return total
+
+
+def evens(n):
+    for i in range(n):
+        if i % 2 == 0:
+            yield i
+
+
+def first_line(func):
+    return func.__code__.co_firstlineno
+
+
+def test_function():
+    prof = LineProfiler([squares]).runctx('squares(10); squares(5)',
+                                          globals(), {})
+    lines = prof.lines[(squares.__code__.co_filename, first_line(squares),
+                        'squares')]
+    start = first_line(squares)
+    hits = dict((line - start, entry[0]) for line, entry in lines.items())
+    nt.assert_equal(hits, {1: 2, 2: 17, 3: 15, 4: 2})
+    nt.assert_true(all(entry[1] >= 0 for entry in lines.values()))
+    nt.assert_in('total += i * i', prof.format())
+    # Functions that weren't named aren't traced
+    nt.assert_equal(len(prof.lines), 1)
+
+
+def test_wrap():
+    prof = LineProfiler()
+    ns = {'squares': prof.wrap(squares), 'sys': sys}
+    prof.runctx('traces = [sys.gettrace()]\n'
+                'squares(3)\n'
+                'traces.append(sys.gettrace())\n', ns, ns)
+    # Tracing was only on while squares ran
+    nt.assert_not_in(prof._trace, ns['traces'])
+    nt.assert_equal(prof.find('squares')[first_line(squares) + 4][0], 1)
+
+
+def test_generator_by_name():
+    prof = LineProfiler(['module.evens']).runctx('list(evens(6))',
+                                                 globals(), {})
+    lines = prof.find('evens')
+    start = first_line(evens)
+    nt.assert_equal(lines[start + 3][0], 3)
+    nt.assert_equal(lines[start + 2][0], 6)
+
+
+@dec.skipif(lineprofiler.tracemalloc is None, "no tracemalloc")
+def test_memory():
+    prof = LineProfiler(['allocate'], memory=True)
+    ns = {}
+    prof.runctx('def allocate():\n'
+                '    x = bytearray(1000000)\n'
+                '    return x\n'
+                'allocate()\n', ns, ns)
+    lines = prof.find('allocate')
+    nt.assert_greater(lines[2][2], 900000)
+    nt.assert_in('Memory (KiB)', prof.format())
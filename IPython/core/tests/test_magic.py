@@ -8,6 +8,7 @@
 import io
 import os
 import sys
+import types
 import warnings
 from unittest import TestCase, skipIf
 
@@ -27,6 +28,7 @@ def invalidate_caches():
                                 register_line_magic, register_cell_magic,
                                 register_line_cell_magic)
 from IPython.core.magics import execution, script, code
+from IPython.core.sampling import SamplingProfiler
 from IPython.testing import decorators as dec
 from IPython.testing import tools as tt
 from IPython.utils import py3compat
@@ -568,6 +570,85 @@ def test_timeit_quiet():
     with tt.AssertNotPrints("loops"):
         _ip.run_cell("%timeit -n1 -r1 -q 1")
 
+def test_timeit_adaptive():
+    "Test the statistics of %timeit in adaptive mode"
+    with tt.AssertPrints("mean +- 95% CI"):
+        res = _ip.run_line_magic('timeit', '-n10 -r5 -a0.5 -b1 -o 1')
+    nt.assert_greater_equal(len(res.all_runs), 5)
+    nt.assert_equal(res.repeat, len(res.all_runs))
+    nt.assert_equal(len(res.timings), len(res.all_runs))
+    nt.assert_less_equal(res.percentiles[5], res.median)
+    nt.assert_less_equal(res.median, res.percentiles[95])
+
+def test_timing_stats():
+    stats = execution._timing_stats([1.0, 2.0, 3.0, 4.0, 100.0])
+    nt.assert_equal(stats['mean'], 22.0)
+    nt.assert_equal(stats['median'], 3.0)
+    nt.assert_equal(stats['percentiles'][25], 2.0)
+    nt.assert_equal(stats['outliers'], [100.0])
+    nt.assert_almost_equal(stats['stdev'], 43.6177, places=4)
+    nt.assert_almost_equal(stats['ci'], 2.776 * stats['stdev'] / 5 ** 0.5)
+
+    warmup, runs = execution._split_warmup([9, 8, 1, 1.1, 1, 0.9, 1, 1.2])
+    nt.assert_equal(warmup, [9, 8])
+    nt.assert_equal(runs, [1, 1.1, 1, 0.9, 1, 1.2])
+    nt.assert_equal(execution._split_warmup([1, 9, 1, 1]), ([], [1, 9, 1, 1]))
+
+def test_bench():
+    "Test %bench against a stored baseline"
+    suite = 'test_bench_%d' % os.getpid()
+    _ip.user_ns['bench_data'] = list(range(100))
+    try:
+        with tt.AssertPrints("use --save"):
+            _ip.run_cell_magic('bench', '-n10 -r5 ' + suite, 'sum(bench_data)')
+        with tt.AssertNotPrints("use --save"):
+            _ip.run_cell_magic('bench', '-n10 -r5 -q --save ' + suite,
+                               'sum(bench_data)\n# comment\nlen(bench_data)')
+        _ip.user_ns['bench_data'] = list(range(100000))
+        res = _ip.run_line_magic('bench', '-n10 -r5 -q -o ' + suite)
+        nt.assert_equal(list(res.results), ['sum(bench_data)', 'len(bench_data)'])
+        nt.assert_in('sum(bench_data)', res.regressions)
+        nt.assert_in('slower', res.table())
+    finally:
+        path = os.path.join(_ip.profile_dir.location, 'benchmarks',
+                            execution._machine_name(), suite + '.json')
+        if os.path.exists(path):
+            os.remove(path)
+    with nt.assert_raises(UsageError):
+        _ip.run_line_magic('bench', suite)
+
+def test_bench_compound_statements():
+    "Test %%bench with statements over several lines"
+    cell = ("x = 0; y = 1\n"
+            "\n"
+            "# a comment\n"
+            "for i in range(3):\n"
+            "    x += i\n"
+            "\n"
+            "@staticmethod\n"
+            "def f():\n"
+            "    pass\n"
+            "sum([1,\n"
+            "     2])\n")
+    nt.assert_equal(execution._split_statements(cell),
+                    ["x = 0; y = 1",
+                     "for i in range(3):\n    x += i",
+                     "@staticmethod\ndef f():\n    pass",
+                     "sum([1,\n     2])"])
+    res = _ip.run_cell_magic('bench', '-n1 -r2 -q -o test_bench_compound',
+                             'for i in range(3):\n    pass\nlen([])')
+    nt.assert_equal(list(res.results),
+                    ['for i in range(3):\n    pass', 'len([])'])
+    with nt.assert_raises(UsageError):
+        _ip.run_cell_magic('bench', '-n1 -r1 -q test_bench_compound',
+                           'len([])\nfor i in range(3):\n')
+
+def test_mann_whitney():
+    nt.assert_almost_equal(execution._mann_whitney([1, 2, 3], [4, 5, 6]),
+                           0.0809, places=4)
+    nt.assert_equal(execution._mann_whitney([1, 1], [1, 1]), 1.)
+    nt.assert_greater(execution._mann_whitney([1, 3, 5], [2, 4, 6]), 0.5)
+
 @dec.skipif(sys.version_info[0] >= 3, "no differences with __future__ in py3")
 def test_timeit_futures():
     "Test %timeit with __future__ environments"
@@ -600,6 +681,77 @@ def test_prun_quotes():
     _ip.magic(r"prun -q x = '\t'")
     nt.assert_equal(_ip.user_ns['x'], '\t')
 
+@dec.skipif(not SamplingProfiler.available())
+def test_prun_sampling():
+    "Test %prun with the sampling profiler"
+    _ip.user_ns['sampled'] = lambda: sum(i * i for i in range(2000000))
+    with TemporaryDirectory() as td:
+        stacks = os.path.join(td, 'stacks.txt')
+        stats = _ip.run_line_magic('prun', '-q -r -S 1 -F %s sampled()'
+                                   % stacks)
+        nt.assert_in('<lambda>', set(f[2] for f in stats.stats))
+        with open(stacks) as f:
+            nt.assert_in('<lambda> (', f.read())
+    with nt.assert_raises(UsageError):
+        _ip.run_line_magic('prun', '-q -F stacks.txt sampled()')
+
+def test_prun_lines():
+    "Test %prun with the line profiler"
+    _ip.ex("def prun_lines(n):\n"
+           "    return [i * i for i in range(n)]\n")
+    func = _ip.user_ns['prun_lines']
+    prof = _ip.run_line_magic('prun', '-q -r -L prun_lines prun_lines(10)')
+    nt.assert_equal(prof.find('prun_lines')[2][0], 1)
+    nt.assert_is(_ip.user_ns['prun_lines'], func)
+    # Methods are wrapped in their class
+    _ip.ex("class PrunLines(object):\n"
+           "    @staticmethod\n"
+           "    def method():\n"
+           "        return 1\n")
+    prof = _ip.run_line_magic('prun', '-q -r -L PrunLines.method '
+                              'PrunLines().method()')
+    nt.assert_equal(prof.find('method')[4][0], 1)
+    nt.assert_equal(prof.wrapped,
+                    set([_ip.user_ns['PrunLines'].method.__code__]))
+    nt.assert_is_instance(_ip.user_ns['PrunLines'].__dict__['method'],
+                          staticmethod)
+    # Unknown functions are matched by name
+    prof = _ip.run_line_magic('prun', '-q -r -L nothing prun_lines(10)')
+    nt.assert_equal(prof.lines, {})
+
+def test_prun_lines_references():
+    "Test %prun -L with functions called through other references"
+    mod = types.ModuleType('prun_lines_mod')
+    exec("def helper(n):\n"
+         "    return n + 1\n"
+         "def run():\n"
+         "    return helper(1)\n", mod.__dict__)
+    _ip.user_ns['prun_lines_mod'] = mod
+    _ip.user_ns['helper'] = helper = mod.helper
+    try:
+        # Wrapped in the module too, where run() finds it
+        prof = _ip.run_line_magic('prun', '-q -r -L helper '
+                                  'prun_lines_mod.run()')
+        nt.assert_equal(prof.find('helper')[2][0], 1)
+        nt.assert_equal(prof.wrapped, set([helper.__code__]))
+        nt.assert_is(mod.helper, helper)
+        nt.assert_is(_ip.user_ns['helper'], helper)
+        # Referenced from elsewhere: traced during the whole run
+        _ip.user_ns['helpers'] = [helper]
+        prof = _ip.run_line_magic('prun', '-q -r -L prun_lines_mod.helper '
+                                  'helpers[0](1)')
+        nt.assert_equal(prof.find('helper')[2][0], 1)
+        nt.assert_equal(prof.wrapped, set())
+        # Names are not evaluated
+        _ip.user_ns['calls'] = calls = []
+        _ip.user_ns['get_mod'] = lambda: calls.append(1) or mod
+        _ip.run_line_magic('prun', '-q -L get_mod().helper helper(1)')
+        nt.assert_equal(calls, [])
+    finally:
+        for name in ('prun_lines_mod', 'helper', 'helpers', 'calls',
+                     'get_mod'):
+            _ip.user_ns.pop(name, None)
+
 def test_extension():
     tmpdir = TemporaryDirectory()
     orig_ipython_dir = _ip.ipython_dir
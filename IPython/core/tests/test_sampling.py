@@ -0,0 +1,48 @@
+# coding: utf-8
+"""Tests for the sampling profiler."""
+
+# Copyright (c) IPython Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import pstats
+
+import nose.tools as nt
+
+from IPython.core.sampling import SamplingProfiler
+from IPython.testing import decorators as dec
+
+
+def test_create_stats():
+    prof = SamplingProfiler(0.01)
+    f, g, h = ('a.py', 1, 'f'), ('a.py', 5, 'g'), ('b.py', 1, 'h')
+    # h -> g -> f, and f -> f recursively
+    prof.samples = {(f, g, h): 3, (g, h): 1, (f, f, h): 2}
+    stats = pstats.Stats(prof).stats
+    nt.assert_equal(stats[h][:4], (6, 6, 0., 0.06))
+    cc, nc, tt, ct, callers = stats[f]
+    nt.assert_equal((cc, nc), (5, 5))
+    nt.assert_almost_equal(tt, 0.05)
+    nt.assert_almost_equal(ct, 0.05)
+    nt.assert_equal(callers[g][0], 3)
+    nt.assert_equal(callers[f][0], 2)
+    nt.assert_equal(prof.collapsed().splitlines(), [
+        'h (b.py:1);f (a.py:1);f (a.py:1) 2',
+        'h (b.py:1);g (a.py:5) 1',
+        'h (b.py:1);g (a.py:5);f (a.py:1) 3',
+    ])
+
+
+@dec.skipif(not SamplingProfiler.available(), "no signal.setitimer")
+def test_runctx():
+    ns = {}
+    code = ("def spin():\n"
+            "    return sum(i * i for i in range(1000000))\n"
+            "for _ in range(10):\n"
+            "    spin()\n")
+    prof = SamplingProfiler(0.001).runctx(code, ns, ns)
+    nt.assert_true(prof.samples)
+    for stack in prof.samples:
+        # Only the frames of the code run are sampled
+        nt.assert_equal(stack[-1][:2], ('<string>', 1))
+    names = set(func[2] for func in pstats.Stats(prof).stats)
+    nt.assert_in('spin', names)
@@ -48,6 +48,19 @@
     Reload all modules (except those excluded by ``%aimport``) every
     time before executing the Python code typed.
 
+``%autoreload 2 --watch``
+
+    Watch the files of the modules in the background (with inotify on
+    Linux, or a polling thread elsewhere), so that only the modules whose
+    files changed are checked before executing code. ``--no-watch`` goes
+    back to checking the modification time of every module.
+
+``%autoreload 2 --dependents``
+
+    Also reload the modules which use names from a changed module, after
+    it, so that values imported with ``from foo import bar`` are updated.
+    ``--no-dependents``, the default, only reloads the changed modules.
+
 ``%aimport``
 
     List modules which are to be automatically imported or not to be imported.
@@ -72,6 +85,10 @@
 - Functions and classes imported via 'from xxx import foo' are upgraded
   to new versions when 'xxx' is reloaded.
 
+- With ``--dependents``, modules which use names from 'xxx' are reloaded
+  after it, so that other names imported via 'from xxx import bar' are
+  updated too.
+
 - Methods and properties of classes are upgraded on reload, so that
   calling 'c.foo()' on an object 'c' created before the reload causes
   the new code for 'foo' to be executed.
@@ -108,7 +125,11 @@
 #-----------------------------------------------------------------------------
 
 import os
+import select
+import struct
 import sys
+import threading
+import time
 import traceback
 import types
 import weakref
@@ -120,12 +141,208 @@
     from imp import reload
 
 from IPython.utils import openpy
-from IPython.utils.py3compat import PY3
+from IPython.utils.py3compat import PY3, string_types
+
+#------------------------------------------------------------------------------
+# File watchers
+#------------------------------------------------------------------------------
+
+class FileWatcher(object):
+    """Record the watched files that changed, in the background."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._stopped = False
+
+    def watch(self, filename):
+        """Start watching a file. Watching a file twice does nothing."""
+        raise NotImplementedError
+
+    def changed(self):
+        """Return the set of files which changed since the last call."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def stop(self):
+        """Stop watching."""
+        self._stopped = True
+
+    def _mark(self, filenames):
+        with self._lock:
+            self._dirty.update(filenames)
+
+
+class PollingWatcher(FileWatcher):
+    """Watch files by polling their modification times every `interval`
+    seconds, from a background thread.
+    """
+
+    def __init__(self, interval=1.):
+        super(PollingWatcher, self).__init__()
+        self.interval = interval
+        # filename -> mtime
+        self._mtimes = {}
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @staticmethod
+    def _mtime(filename):
+        try:
+            return os.stat(filename).st_mtime
+        except OSError:
+            return None
+
+    def watch(self, filename):
+        filename = os.path.abspath(filename)
+        with self._lock:
+            if filename in self._mtimes:
+                return
+        mtime = self._mtime(filename)
+        with self._lock:
+            self._mtimes.setdefault(filename, mtime)
+
+    def _run(self):
+        while not self._stopped:
+            time.sleep(self.interval)
+            with self._lock:
+                watched = list(self._mtimes.items())
+            changed = []
+            for filename, mtime in watched:
+                new_mtime = self._mtime(filename)
+                if new_mtime != mtime:
+                    changed.append(filename)
+                    with self._lock:
+                        self._mtimes[filename] = new_mtime
+            if changed:
+                self._mark(changed)
+
+
+class InotifyWatcher(FileWatcher):
+    """Watch files with Linux's inotify.
+
+    The kernel queues the events in the background; they are read when
+    :meth:`changed` is called, so a file saved just before is never missed.
+    The directories containing the files are watched, so that files replaced
+    by editors (rather than written in place) are noticed too.
+
+    Raises OSError if inotify is not available.
+    """
+
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE_SELF = 0x400
+    IN_MOVE_SELF = 0x800
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+
+    mask = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+            | IN_DELETE_SELF | IN_MOVE_SELF)
+
+    _header = struct.Struct('iIII')
+
+    def __init__(self):
+        super(InotifyWatcher, self).__init__()
+        import ctypes
+        import ctypes.util
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or libc_name is None:
+            raise OSError("inotify is not available")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init'):
+            raise OSError("inotify is not available")
+        self._fd = self._libc.inotify_init()
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        # directory -> set of watched file names, watch descriptor -> directory
+        self._files = {}
+        self._dirs = {}
+
+    def watch(self, filename):
+        import ctypes
+        dirname, name = os.path.split(os.path.abspath(filename))
+        with self._lock:
+            if dirname in self._files:
+                self._files[dirname].add(name)
+                return
+            path = os.fsencode(dirname) if PY3 else dirname
+            wd = self._libc.inotify_add_watch(self._fd, ctypes.c_char_p(path),
+                                              self.mask)
+            if wd < 0:
+                # Can't watch it: always consider it changed
+                self._dirty.add(os.path.join(dirname, name))
+                return
+            self._dirs[wd] = dirname
+            self._files.setdefault(dirname, set()).add(name)
+
+    def changed(self):
+        with self._lock:
+            while not self._stopped and \
+                    select.select([self._fd], [], [], 0)[0]:
+                self._read_events()
+        return super(InotifyWatcher, self).changed()
+
+    def stop(self):
+        with self._lock:
+            if not self._stopped and hasattr(self, '_fd'):
+                os.close(self._fd)
+            self._stopped = True
+
+    def __del__(self):
+        self.stop()
+
+    def _read_events(self):
+        data = os.read(self._fd, 65536)
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, length = self._header.unpack_from(data, pos)
+            pos += self._header.size
+            name = data[pos:pos + length].rstrip(b'\0')
+            pos += length
+            if mask & self.IN_Q_OVERFLOW:
+                # Events were lost: everything may have changed
+                for dirname, names in self._files.items():
+                    self._dirty.update(os.path.join(dirname, n) for n in names)
+                continue
+            dirname = self._dirs.get(wd)
+            if dirname is None:
+                continue
+            names = self._files[dirname]
+            if mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF
+                       | self.IN_IGNORED):
+                self._dirty.update(os.path.join(dirname, n) for n in names)
+                if mask & self.IN_IGNORED:
+                    del self._dirs[wd], self._files[dirname]
+                continue
+            if PY3:
+                name = os.fsdecode(name)
+            if name in names:
+                self._dirty.add(os.path.join(dirname, name))
+
+
+def make_watcher():
+    """Return an InotifyWatcher if possible, else a PollingWatcher."""
+    try:
+        return InotifyWatcher()
+    except OSError:
+        return PollingWatcher()
 
 #------------------------------------------------------------------------------
 # Autoreload functionality
 #------------------------------------------------------------------------------
 
+# Immutable values, which may be the same objects in unrelated modules (small
+# ints and interned strings are), so they don't tell which modules are used.
+shared_atom_types = (bool, int, float, complex, bytes, tuple, frozenset,
+                     types.ModuleType) + string_types
+if not PY3:
+    shared_atom_types += (long,)
+
 class ModuleReloader(object):
     enabled = False
     """Whether this reloader is enabled"""
@@ -133,6 +350,9 @@ class ModuleReloader(object):
     check_all = True
     """Autoreload all modules, not just those listed in 'modules'"""
 
+    reload_dependents = False
+    """Also reload the modules which use the names of a changed module"""
+
     def __init__(self):
         # Modules that failed to reload: {module: mtime-on-failed-reload, ...}
         self.failed = {}
@@ -144,6 +364,14 @@ def __init__(self):
         self.old_objects = {}
         # Module modification timestamps
         self.modules_mtimes = {}
+        # FileWatcher telling which files changed, if any
+        self.watcher = None
+        # Files watched for each module: {module-name: (__file__, py_filename)}
+        self.watched_files = {}
+        # Import graph: {module-name: set of the modules it uses} and the
+        # reverse {module-name: set of the modules using it}
+        self.imports = {}
+        self.importers = {}
 
         # Cache module modification times
         self.check(check_all=True, do_reload=False)
@@ -208,6 +436,46 @@ def filename_and_mtime(self, module):
 
         return py_filename, pymtime
 
+    def start_watching(self, watcher=None):
+        """Only check the modules whose files changed, as reported by a
+        FileWatcher (by default, the best one available).
+        """
+        self.stop_watching()
+        self.watcher = watcher if watcher is not None else make_watcher()
+
+    def stop_watching(self):
+        """Check the modification time of every module again."""
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.watcher = None
+        self.watched_files = {}
+
+    def _watched_unchanged(self, modname, m, changed):
+        """Whether the watcher tells that a module's file did not change.
+
+        Modules seen for the first time are watched, and their modification
+        time is checked once.
+        """
+        module_file = getattr(m, '__file__', None)
+        try:
+            watched_file, py_filename = self.watched_files[modname]
+        except KeyError:
+            pass
+        else:
+            if watched_file == module_file:
+                if py_filename is None or py_filename not in changed:
+                    return True
+                # It may have been replaced: watch it again
+                self.watcher.watch(py_filename)
+                return False
+
+        py_filename, _ = self.filename_and_mtime(m)
+        if py_filename is not None:
+            py_filename = os.path.abspath(py_filename)
+            self.watcher.watch(py_filename)
+        self.watched_files[modname] = (module_file, py_filename)
+        return False
+
     def check(self, check_all=False, do_reload=True):
         """Check whether some modules need to be reloaded."""
 
@@ -219,12 +487,20 @@ def check(self, check_all=False, do_reload=True):
         else:
             modules = list(self.modules.keys())
 
+        if self.watcher is not None:
+            changed = self.watcher.changed()
+
+        changed_modules = {}
         for modname in modules:
             m = sys.modules.get(modname, None)
 
             if modname in self.skip_modules:
                 continue
 
+            if self.watcher is not None and \
+                    self._watched_unchanged(modname, m, changed):
+                continue
+
             py_filename, pymtime = self.filename_and_mtime(m)
             if py_filename is None:
                 continue
@@ -234,6 +510,7 @@ def check(self, check_all=False, do_reload=True):
                     continue
             except KeyError:
                 self.modules_mtimes[modname] = pymtime
+                self.record_imports(modname, m)
                 continue
             else:
                 if self.failed.get(py_filename, None) == pymtime:
@@ -243,14 +520,138 @@ def check(self, check_all=False, do_reload=True):
 
             # If we've reached this point, we should try to reload the module
             if do_reload:
-                try:
-                    superreload(m, reload, self.old_objects)
-                    if py_filename in self.failed:
-                        del self.failed[py_filename]
-                except:
-                    print("[autoreload of %s failed: %s]" % (
-                            modname, traceback.format_exc(1)), file=sys.stderr)
-                    self.failed[py_filename] = pymtime
+                changed_modules[modname] = (py_filename, pymtime)
+
+        if changed_modules:
+            self.reload_modules(changed_modules, modules)
+
+    def record_imports(self, modname, module):
+        """Record the modules whose names are used in a module's namespace.
+
+        A module uses another one when it holds a reference to it, or to a
+        function or class defined in it (as with ``from foo import bar``).
+        """
+        uses = set()
+        for value in list(module.__dict__.values()):
+            if isinstance(value, types.ModuleType):
+                name = getattr(value, '__name__', None)
+            elif isinstance(value, class_types + (types.FunctionType,)):
+                name = getattr(value, '__module__', None)
+            else:
+                continue
+            if isinstance(name, string_types) and name != modname:
+                uses.add(name)
+
+        for name in self.imports.get(modname, set()) - uses:
+            self.importers[name].discard(modname)
+        for name in uses:
+            self.importers.setdefault(name, set()).add(modname)
+        self.imports[modname] = uses
+
+    def record_shared_names(self, changed, candidates):
+        """Record the modules using values of the `changed` modules.
+
+        Names bound with ``from foo import x`` can't be told from other
+        names when `x` is neither a function nor a class, so they are found
+        by looking for the same objects under the same names.  Numbers,
+        strings, tuples and other immutable values are left out: equal ones
+        are often the same object in unrelated modules.  This must be called
+        before the changed modules are reloaded.
+        """
+        missing = object()
+        for base in changed:
+            module = sys.modules.get(base, None)
+            if module is None:
+                continue
+            values = [(name, value) for name, value in module.__dict__.items()
+                      if not name.startswith('__') and value is not None
+                      and not isinstance(value, shared_atom_types)]
+            for modname in candidates:
+                if modname == base or modname not in self.imports:
+                    continue
+                namespace = getattr(sys.modules.get(modname, None),
+                                    '__dict__', {})
+                for name, value in values:
+                    if namespace.get(name, missing) is value:
+                        self.imports[modname].add(base)
+                        self.importers.setdefault(base, set()).add(modname)
+                        break
+
+    def reload_order(self, changed, candidates):
+        """Return the names of the modules to reload, dependencies first.
+
+        These are the `changed` modules, and the modules among `candidates`
+        which use them, directly or not.  Otherwise, modules are in the order
+        of `candidates`.
+        """
+        affected = set(changed)
+        if self.reload_dependents:
+            candidate_set = set(candidates)
+            todo = list(changed)
+            while todo:
+                for name in self.importers.get(todo.pop(), ()):
+                    if name not in affected and name in candidate_set \
+                            and name not in self.skip_modules:
+                        affected.add(name)
+                        todo.append(name)
+
+        def uses(name):
+            return iter(sorted(self.imports.get(name, set()) & affected))
+
+        # Depth-first search, listing each module after the modules it uses.
+        # Import cycles are broken where they are first met.
+        order = []
+        seen = set()
+        for root in candidates:
+            if root not in affected or root in seen:
+                continue
+            seen.add(root)
+            stack = [(root, uses(root))]
+            while stack:
+                name, deps = stack[-1]
+                for dep in deps:
+                    if dep not in seen:
+                        seen.add(dep)
+                        stack.append((dep, uses(dep)))
+                        break
+                else:
+                    stack.pop()
+                    order.append(name)
+        return order
+
+    def reload_modules(self, changed, candidates):
+        """Reload the changed modules and the modules using them, in one pass.
+
+        Parameters
+        ----------
+        changed : dict
+            {module-name: (py_filename, mtime)} for the modules which changed.
+        candidates : list
+            The names of the modules which may be reloaded.
+        """
+        if self.reload_dependents:
+            self.record_shared_names(changed, candidates)
+        for modname in self.reload_order(changed, candidates):
+            m = sys.modules.get(modname, None)
+            if m is None:
+                continue
+            try:
+                py_filename, pymtime = changed[modname]
+            except KeyError:
+                py_filename, pymtime = self.filename_and_mtime(m)
+                if py_filename is None:
+                    continue
+            try:
+                superreload(m, reload, self.old_objects)
+                if py_filename in self.failed:
+                    del self.failed[py_filename]
+            except:
+                print("[autoreload of %s failed: %s]" % (
+                        modname, traceback.format_exc(1)), file=sys.stderr)
+                self.failed[py_filename] = pymtime
+            else:
+                self.record_imports(modname, m)
+        prune_old_objects(self.old_objects)
 
 #------------------------------------------------------------------------------
 # superreload
@@ -259,9 +660,11 @@ def check(self, check_all=False, do_reload=True):
 if PY3:
     func_attrs = ['__code__', '__defaults__', '__doc__',
                   '__closure__', '__globals__', '__dict__']
+    class_types = (type,)
 else:
     func_attrs = ['func_code', 'func_defaults', 'func_doc',
                   'func_closure', 'func_globals', 'func_dict']
+    class_types = (type, types.ClassType)
 
 
 def update_function(old, new):
@@ -345,6 +748,16 @@ def __call__(self):
         return self.obj
 
 
+def prune_old_objects(old_objects):
+    """Remove the dead references from superreload's `old_objects`."""
+    for key, refs in list(old_objects.items()):
+        live = [ref for ref in refs if ref() is not None]
+        if live:
+            old_objects[key] = live
+        else:
+            del old_objects[key]
+
+
 def superreload(module, reload=reload, old_objects={}):
     """Enhanced version of the builtin reload function.
 
@@ -439,6 +852,16 @@ def autoreload(self, parameter_s=''):
         Reload all modules (except those excluded by %aimport) every time
         before executing the Python code typed.
 
+        %autoreload 2 --watch
+        Watch the module files in the background, and only check the modules
+        whose files changed (also with %autoreload 1). --no-watch checks the
+        modification time of every module again.
+
+        %autoreload 2 --dependents
+        Also reload the modules which use names from a reloaded module,
+        after it. --no-dependents, the default, only reloads the changed
+        modules.
+
         Reloading Python modules in a reliable way is in general
         difficult, and unexpected things may occur. %autoreload tries to
         work around common pitfalls by replacing function code objects and
@@ -448,6 +871,10 @@ def autoreload(self, parameter_s=''):
         - Functions and classes imported via 'from xxx import foo' are upgraded
           to new versions when 'xxx' is reloaded.
 
+        - With --dependents, modules which use names from 'xxx' are reloaded
+          after it, so that other names imported via 'from xxx import bar'
+          are updated too.
+
         - Methods and properties of classes are upgraded on reload, so that
           calling 'c.foo()' on an object 'c' created before the reload causes
           the new code for 'foo' to be executed.
@@ -465,10 +892,27 @@ def autoreload(self, parameter_s=''):
           autoreloaded.
 
         """
+        args = parameter_s.split()
+        if '--watch' in args:
+            self._reloader.start_watching()
+        elif '--no-watch' in args:
+            self._reloader.stop_watching()
+        if '--dependents' in args:
+            self._reloader.reload_dependents = True
+        elif '--no-dependents' in args:
+            self._reloader.reload_dependents = False
+        args = [a for a in args if a not in ('--watch', '--no-watch',
+                                             '--dependents', '--no-dependents')]
+        if not args and args != parameter_s.split():
+            # Only the options were changed
+            return
+        parameter_s = ' '.join(args)
+
         if parameter_s == '':
             self._reloader.check(True)
         elif parameter_s == '0':
             self._reloader.enabled = False
+            self._reloader.stop_watching()
         elif parameter_s == '1':
             self._reloader.check_all = False
             self._reloader.enabled = True
@@ -521,9 +965,11 @@ def post_execute_hook(self):
         """
         newly_loaded_modules = set(sys.modules) - self.loaded_modules
         for modname in newly_loaded_modules:
-            _, pymtime = self._reloader.filename_and_mtime(sys.modules[modname])
+            module = sys.modules[modname]
+            _, pymtime = self._reloader.filename_and_mtime(module)
             if pymtime is not None:
                 self._reloader.modules_mtimes[modname] = pymtime
+                self._reloader.record_imports(modname, module)
 
         self.loaded_modules.update(newly_loaded_modules)
 
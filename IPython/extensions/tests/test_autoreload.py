@@ -12,17 +12,22 @@
 # Imports
 #-----------------------------------------------------------------------------
 
+import gc
 import os
 import sys
 import tempfile
 import shutil
 import random
 import time
+import weakref
 
 import nose.tools as nt
 import IPython.testing.tools as tt
 
-from IPython.extensions.autoreload import AutoreloadMagics
+from nose import SkipTest
+
+from IPython.extensions.autoreload import (AutoreloadMagics, InotifyWatcher,
+                                           PollingWatcher, prune_old_objects)
 from IPython.core.events import EventManager, pre_run_cell
 from IPython.utils.py3compat import PY3
 
@@ -131,10 +136,10 @@ def new_module(self, code):
 #-----------------------------------------------------------------------------
 
 class TestAutoreload(Fixture):
-    def _check_smoketest(self, use_aimport=True):
+    def _check_smoketest(self, use_aimport=True, watch=False):
         """
         Functional test for the automatic reloader using either
-        '%autoreload 1' or '%autoreload 2'
+        '%autoreload 1' or '%autoreload 2', optionally with '--watch'
         """
 
         mod_name, mod_fn = self.new_module("""
@@ -177,6 +182,9 @@ def foo(self):
         else:
             self.shell.magic_autoreload("2")
             self.shell.run_code("import %s" % mod_name)
+            if watch:
+                self.shell.magic_autoreload("--watch")
+                nt.assert_is_not_none(self.shell.auto_magics._reloader.watcher)
             stream = StringIO()
             self.shell.magic_aimport("", stream=stream)
             nt.assert_true("Modules to reload:\nall-except-skipped" in
@@ -319,3 +327,102 @@ def test_smoketest_aimport(self):
 
     def test_smoketest_autoreload(self):
         self._check_smoketest(use_aimport=False)
+
+    def test_smoketest_watch(self):
+        try:
+            InotifyWatcher().stop()
+        except OSError:
+            raise SkipTest("inotify is not available")
+        self._check_smoketest(use_aimport=False, watch=True)
+
+    def test_reload_dependents(self):
+        base_name, base_fn = self.new_module("x = [1]\n")
+        user_name, user_fn = self.new_module(
+            "from %s import x\ny = x[0] * 10\n" % base_name)
+        self.shell.magic_autoreload("2 --dependents")
+        self.shell.run_code("import %s" % user_name)
+        user = sys.modules[user_name]
+        nt.assert_equal(user.y, 10)
+
+        self.write_file(base_fn, "x = [2]\n")
+        self.shell.run_code("pass")
+        # The user of the changed module was reloaded after it
+        nt.assert_equal(user.y, 20)
+        self.write_file(base_fn, "x = [3]\n")
+        self.shell.run_code("pass")
+        nt.assert_equal(user.y, 30)
+
+        self.shell.magic_autoreload("--no-dependents")
+        self.write_file(base_fn, "x = [4]\n")
+        self.shell.run_code("pass")
+        nt.assert_equal(user.y, 30)
+
+    def test_shared_constants_are_not_dependencies(self):
+        a_name, a_fn = self.new_module("TIMEOUT = 10\nNAME = 'a'\n")
+        b_name, b_fn = self.new_module(
+            "TIMEOUT = 10\nNAME = 'a'\nloads = []\nloads.append(1)\n")
+        self.shell.magic_autoreload("2 --dependents")
+        self.shell.run_code("import %s, %s" % (a_name, b_name))
+        b = sys.modules[b_name]
+        loads = b.loads
+
+        self.write_file(a_fn, "TIMEOUT = 20\nNAME = 'a'\n")
+        self.shell.run_code("pass")
+        nt.assert_equal(sys.modules[a_name].TIMEOUT, 20)
+        # b doesn't import a, so it wasn't run again
+        nt.assert_is(b.loads, loads)
+        nt.assert_equal(b.loads, [1])
+
+    def test_reload_order(self):
+        reloader = self.shell.auto_magics._reloader
+        reloader.reload_dependents = True
+        graph = {'a': [], 'b': ['a'], 'c': ['b', 'a'], 'd': ['c'], 'e': []}
+        for name, uses in graph.items():
+            reloader.imports[name] = set(uses)
+            for used in uses:
+                reloader.importers.setdefault(used, set()).add(name)
+        candidates = ['e', 'd', 'c', 'b', 'a']
+        nt.assert_equal(reloader.reload_order({'a': None}, candidates),
+                        ['a', 'b', 'c', 'd'])
+        nt.assert_equal(reloader.reload_order({'c': None, 'e': None},
+                                              candidates),
+                        ['e', 'c', 'd'])
+        reloader.skip_modules['c'] = True
+        nt.assert_equal(reloader.reload_order({'a': None}, candidates),
+                        ['a', 'b'])
+        reloader.reload_dependents = False
+        nt.assert_equal(reloader.reload_order({'c': None, 'a': None},
+                                              candidates),
+                        ['a', 'c'])
+
+    def test_polling_watcher(self):
+        mod_name, mod_fn = self.new_module("x = 1\n")
+        other = os.path.join(self.test_dir, 'other.py')
+        watcher = PollingWatcher(interval=0.01)
+        try:
+            watcher.watch(mod_fn)
+            nt.assert_equal(watcher.changed(), set())
+            self.write_file(mod_fn, "x = 2\n")
+            self.write_file(other, "")
+            for _ in range(100):
+                changed = watcher.changed()
+                if changed:
+                    break
+                time.sleep(0.01)
+            nt.assert_equal(changed, set([os.path.abspath(mod_fn)]))
+        finally:
+            watcher.stop()
+
+
+class Referenced(object):
+    pass
+
+def test_prune_old_objects():
+    kept, dropped = Referenced(), Referenced()
+    old_objects = {('m', 'kept'): [weakref.ref(kept), weakref.ref(dropped)],
+                   ('m', 'dropped'): [weakref.ref(dropped)]}
+    del dropped
+    gc.collect()
+    prune_old_objects(old_objects)
+    nt.assert_equal(list(old_objects), [('m', 'kept')])
+    nt.assert_equal([ref() for ref in old_objects[('m', 'kept')]], [kept])
@@ -68,6 +68,14 @@ def _repr_pretty_(self, p, cycle):
     with p.indent(2):
         ...
 
+Limiting the output
+-------------------
+
+Long sequences are cut after `max_seq_length` items. The whole output can
+also be limited with `max_chars` and `max_lines`: printing stops as soon as
+either budget is spent, and the output then ends with ``...``. With
+`max_depth`, containers nested deeper than that are shown as ``[...]``.
+
 Inheritance diagram:
 
 .. inheritance-diagram:: IPython.lib.pretty
@@ -119,27 +127,71 @@ def write(self, text):
                 cast_unicode(text, encoding=get_stream_enc(sys.stdout)))
 
 
-def pretty(obj, verbose=False, max_width=79, newline='\n', max_seq_length=MAX_SEQ_LENGTH):
+def pretty(obj, verbose=False, max_width=79, newline='\n', max_seq_length=MAX_SEQ_LENGTH,
+           max_chars=0, max_lines=0, max_depth=0):
     """
     Pretty print the object's representation.
     """
     stream = CUnicodeIO()
-    printer = RepresentationPrinter(stream, verbose, max_width, newline, max_seq_length)
+    printer = RepresentationPrinter(stream, verbose, max_width, newline, max_seq_length,
+                                    max_chars=max_chars, max_lines=max_lines,
+                                    max_depth=max_depth)
     printer.pretty(obj)
     printer.flush()
     return stream.getvalue()
 
 
-def pprint(obj, verbose=False, max_width=79, newline='\n', max_seq_length=MAX_SEQ_LENGTH):
+def pprint(obj, verbose=False, max_width=79, newline='\n', max_seq_length=MAX_SEQ_LENGTH,
+           max_chars=0, max_lines=0, max_depth=0):
     """
     Like `pretty` but print to stdout.
     """
-    printer = RepresentationPrinter(sys.stdout, verbose, max_width, newline, max_seq_length)
+    printer = RepresentationPrinter(sys.stdout, verbose, max_width, newline, max_seq_length,
+                                    max_chars=max_chars, max_lines=max_lines,
+                                    max_depth=max_depth)
     printer.pretty(obj)
     printer.flush()
     sys.stdout.write(newline)
     sys.stdout.flush()
 
+class _OutputBudget(object):
+    """Wraps an output stream, dropping what is written after a number of
+    characters or lines.
+    """
+
+    def __init__(self, stream, max_chars=0, max_lines=0, newline='\n'):
+        self.stream = stream
+        self.chars_left = max_chars or None
+        self.newlines_left = max_lines - 1 if max_lines else None
+        self.newline = newline
+        # Whether some output was dropped, and whether that was marked
+        self.spent = False
+        self.marked = False
+
+    def write(self, text):
+        if self.spent:
+            return
+        if self.newlines_left is not None and self.newline in text:
+            lines = text.split(self.newline)
+            if len(lines) - 1 > self.newlines_left:
+                text = self.newline.join(lines[:self.newlines_left + 1])
+                self.spent = True
+            self.newlines_left -= len(lines) - 1
+        if self.chars_left is not None:
+            if len(text) > self.chars_left:
+                text = text[:self.chars_left]
+                self.spent = True
+            self.chars_left -= len(text)
+        self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+class _Truncated(Exception):
+    """Raised to stop printing once the output budget is spent."""
+
+
 class _PrettyPrinterBase(object):
 
     @contextmanager
@@ -168,7 +220,18 @@ class PrettyPrinter(_PrettyPrinterBase):
     callback method.
     """
 
-    def __init__(self, output, max_width=79, newline='\n', max_seq_length=MAX_SEQ_LENGTH):
+    def __init__(self, output, max_width=79, newline='\n', max_seq_length=MAX_SEQ_LENGTH,
+                 max_chars=0, max_lines=0):
+        self.max_chars = max_chars
+        self.max_lines = max_lines
+        # Set when the output budget is spent: nothing more is added then
+        self.truncated = False
+        self._emitted = 0
+        if max_chars or max_lines:
+            self._budget = output = _OutputBudget(output, max_chars,
+                                                  max_lines, newline)
+        else:
+            self._budget = None
         self.output = output
         self.max_width = max_width
         self.newline = newline
@@ -196,9 +259,21 @@ def _break_outer_groups(self):
                 self.output_width = x.output(self.output, self.output_width)
                 self.buffer_width -= x.width
 
+    def _spend(self, width):
+        """Count text added to the output against the budget."""
+        self._emitted += width
+        if self._budget.spent or (self.max_chars and
+                                  self._emitted > self.max_chars):
+            # The text is still added, so that the output is cut exactly
+            self.truncated = True
+
     def text(self, obj):
         """Add literal text to the output."""
+        if self.truncated:
+            return
         width = len(obj)
+        if self._budget is not None:
+            self._spend(width)
         if self.buffer:
             text = self.buffer[-1]
             if not isinstance(text, Text):
@@ -217,7 +292,11 @@ def breakable(self, sep=' '):
         will automatically break here.  If no breaking on this position takes
         place the `sep` is inserted which default to one space.
         """
+        if self.truncated:
+            return
         width = len(sep)
+        if self._budget is not None:
+            self._spend(width)
         group = self.group_stack[-1]
         if group.want_break:
             self.flush()
@@ -234,6 +313,10 @@ def break_(self):
         """
         Explicitly insert a newline into the output, maintaining correct indentation.
         """
+        if self.truncated:
+            return
+        if self._budget is not None:
+            self._spend(1)
         self.flush()
         self.output.write(self.newline)
         self.output.write(' ' * self.indentation)
@@ -273,8 +356,13 @@ def _enumerate(self, seq):
                 self.text(',')
                 self.breakable()
                 self.text('...')
-                raise StopIteration
+                return
             yield idx, x
+
+    def _will_truncate(self, length):
+        """Whether a container with this many items is printed partially."""
+        return bool((self.max_seq_length and length >= self.max_seq_length) or
+                    (self.max_chars and length > self.max_chars))
     
     def end_group(self, dedent=0, close=''):
         """End a group. See `begin_group` for more details."""
@@ -291,6 +379,10 @@ def flush(self):
             self.output_width += data.output(self.output, self.output_width)
         self.buffer.clear()
         self.buffer_width = 0
+        if self.truncated and not self._budget.marked:
+            # mark the output as incomplete, and stop there
+            self._budget.spent = self._budget.marked = True
+            self._budget.stream.write('...')
 
 
 def _get_mro(obj_class):
@@ -312,6 +404,58 @@ def _get_mro(obj_class):
     return mro
 
 
+class _DispatchCache(object):
+    """Cache of the classes whose printers apply to each type.
+
+    Finding the printer for an object means walking the MRO of its class and
+    checking the printer registries for each base. This caches the result
+    by type, for each kind of lookup. A formatter shares its cache with the
+    :class:`RepresentationPrinter` it uses, so that the lookups are done once
+    per type rather than once per printed object.
+
+    The cache must be cleared when a printer is registered or removed. It
+    also clears itself when the registries are replaced or change size, e.g.
+    when they are modified directly.
+    """
+
+    # Bound on the number of cached types, which are kept alive by the cache
+    max_size = 1000
+
+    def __init__(self):
+        self.entries = {}
+        self._state = None
+
+    def clear(self):
+        self.entries.clear()
+
+    def get(self, kind, typ, type_printers, deferred_printers, resolve):
+        """Get the cached resolve(typ), calling it if needed.
+
+        type_printers and deferred_printers are the registries that resolve
+        looks up.
+        """
+        state = (id(type_printers), len(type_printers),
+                 id(deferred_printers), len(deferred_printers))
+        if state != self._state:
+            self.entries.clear()
+        key = (kind, typ)
+        try:
+            return self.entries[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable type
+            return resolve(typ)
+        value = resolve(typ)
+        # resolve may move deferred printers to the type registry
+        self._state = (id(type_printers), len(type_printers),
+                       id(deferred_printers), len(deferred_printers))
+        if len(self.entries) >= self.max_size:
+            self.entries.clear()
+        self.entries[key] = value
+        return value
+
+
 class RepresentationPrinter(PrettyPrinter):
     """
     Special pretty printer that has a `pretty` method that calls the pretty
@@ -329,10 +473,13 @@ class RepresentationPrinter(PrettyPrinter):
 
     def __init__(self, output, verbose=False, max_width=79, newline='\n',
         singleton_pprinters=None, type_pprinters=None, deferred_pprinters=None,
-        max_seq_length=MAX_SEQ_LENGTH):
+        max_seq_length=MAX_SEQ_LENGTH, dispatch_cache=None, max_chars=0,
+        max_lines=0, max_depth=0):
 
-        PrettyPrinter.__init__(self, output, max_width, newline, max_seq_length=max_seq_length)
+        PrettyPrinter.__init__(self, output, max_width, newline, max_seq_length=max_seq_length,
+                               max_chars=max_chars, max_lines=max_lines)
         self.verbose = verbose
+        self.max_depth = max_depth
         self.stack = []
         if singleton_pprinters is None:
             singleton_pprinters = _singleton_pprinters.copy()
@@ -343,9 +490,18 @@ def __init__(self, output, verbose=False, max_width=79, newline='\n',
         if deferred_pprinters is None:
             deferred_pprinters = _deferred_type_pprinters.copy()
         self.deferred_pprinters = deferred_pprinters
+        if dispatch_cache is None:
+            dispatch_cache = _DispatchCache()
+        self.dispatch_cache = dispatch_cache
 
     def pretty(self, obj):
         """Pretty print the given object."""
+        if self.truncated:
+            # The output budget is spent: unwind the printers of the enclosing
+            # containers, instead of letting them go through all their items
+            if self.stack:
+                raise _Truncated()
+            return
         obj_id = id(obj)
         cycle = obj_id in self.stack
         self.stack.append(obj_id)
@@ -359,32 +515,53 @@ def pretty(self, obj):
                 pass
             else:
                 return printer(obj, self, cycle)
-            # Next walk the mro and check for either:
-            #   1) a registered printer
-            #   2) a _repr_pretty_ method
-            for cls in _get_mro(obj_class):
-                if cls in self.type_pprinters:
-                    # printer registered in self.type_pprinters
-                    return self.type_pprinters[cls](obj, self, cycle)
-                else:
-                    # deferred printer
-                    printer = self._in_deferred_types(cls)
-                    if printer is not None:
-                        return printer(obj, self, cycle)
-                    else:
-                        # Finally look for special method names.
-                        # Some objects automatically create any requested
-                        # attribute. Try to ignore most of them by checking for
-                        # callability.
-                        if '_repr_pretty_' in cls.__dict__:
-                            meth = cls._repr_pretty_
-                            if callable(meth):
-                                return meth(obj, self, cycle)
-            return _default_pprint(obj, self, cycle)
+            # Next find a registered printer or a _repr_pretty_ method in the
+            # mro, once per type
+            found = self.dispatch_cache.get('pretty', obj_class,
+                        self.type_pprinters, self.deferred_pprinters,
+                        self._find_printer)
+            if found is None:
+                return _default_pprint(obj, self, cycle)
+            cls, registered = found
+            if registered:
+                return self.type_pprinters[cls](obj, self, cycle)
+            return cls._repr_pretty_(obj, self, cycle)
+        except _Truncated:
+            if len(self.stack) > 1:
+                raise
         finally:
             self.end_group()
             self.stack.pop()
 
+    def _too_deep(self):
+        """Whether the object being printed is nested deeper than max_depth."""
+        return bool(self.max_depth and len(self.stack) > self.max_depth)
+
+    def _find_printer(self, obj_class):
+        """Walk the mro of obj_class and check for either:
+
+        1) a registered printer
+        2) a _repr_pretty_ method
+
+        Returns (cls, True) for a printer registered for cls, (cls, False) for
+        the _repr_pretty_ method of cls, or None if neither was found.
+        """
+        for cls in _get_mro(obj_class):
+            if cls in self.type_pprinters:
+                # printer registered in self.type_pprinters
+                return cls, True
+            # deferred printer
+            if self._in_deferred_types(cls) is not None:
+                return cls, True
+            # Finally look for special method names.
+            # Some objects automatically create any requested
+            # attribute. Try to ignore most of them by checking for
+            # callability.
+            if '_repr_pretty_' in cls.__dict__:
+                if callable(cls._repr_pretty_):
+                    return cls, False
+        return None
+
     def _in_deferred_types(self, cls):
         """
         Check if the given class is specified in the deferred type registry.
@@ -541,7 +718,7 @@ def inner(obj, p, cycle):
             # If the subclass provides its own repr, use it instead.
             return p.text(typ.__repr__(obj))
 
-        if cycle:
+        if cycle or (len(obj) and p._too_deep()):
             return p.text(start + '...' + end)
         step = len(start)
         p.begin_group(step, start)
@@ -567,7 +744,7 @@ def inner(obj, p, cycle):
             # If the subclass provides its own repr, use it instead.
             return p.text(typ.__repr__(obj))
 
-        if cycle:
+        if cycle or (len(obj) and p._too_deep()):
             return p.text(start + '...' + end)
         if len(obj) == 0:
             # Special case.
@@ -577,7 +754,7 @@ def inner(obj, p, cycle):
             p.begin_group(step, start)
             # Like dictionary keys, we will try to sort the items if there aren't too many
             items = obj
-            if not (p.max_seq_length and len(obj) >= p.max_seq_length):
+            if not p._will_truncate(len(obj)):
                 try:
                     items = sorted(obj)
                 except Exception:
@@ -603,12 +780,12 @@ def inner(obj, p, cycle):
             # If the subclass provides its own repr, use it instead.
             return p.text(typ.__repr__(obj))
 
-        if cycle:
+        if cycle or (len(obj) and p._too_deep()):
             return p.text('{...}')
         p.begin_group(1, start)
         keys = obj.keys()
         # if dict isn't large enough to be truncated, sort keys before displaying
-        if not (p.max_seq_length and len(obj) >= p.max_seq_length):
+        if not p._will_truncate(len(obj)):
             try:
                 keys = sorted(keys)
             except Exception:
@@ -218,6 +218,37 @@ def test_long_dict():
     last2 = p.rsplit('\n', 2)[-2:]
     nt.assert_equal(last2, [' 999: 999,', ' ...}'])
 
+def test_max_chars():
+    p = pretty.pretty(list(range(100)), max_chars=20)
+    nt.assert_equal(p, '[0, 1, 2, 3, 4, 5, 6...')
+    nt.assert_equal(pretty.pretty('abc', max_chars=5), "'abc'")
+
+    class Endless(object):
+        """Counts how many items were printed"""
+        printed = 0
+        def _repr_pretty_(self, p, cycle):
+            with p.group(1, '[', ']'):
+                for idx in range(10**6):
+                    Endless.printed += 1
+                    if idx:
+                        p.text(',')
+                        p.breakable()
+                    p.pretty(idx)
+    p = pretty.pretty([[Endless()]], max_chars=100)
+    nt.assert_equal(len(p), 103)
+    nt.assert_true(p.endswith('...'))
+    # Printing stopped as soon as the budget was spent
+    nt.assert_less(Endless.printed, 100)
+
+def test_max_lines():
+    p = pretty.pretty(list(range(100)), max_lines=3)
+    nt.assert_equal(p, '[0,\n 1,\n 2,...')
+
+def test_max_depth():
+    p = pretty.pretty([[1, [2, [3]]], {'a': {'b': 1}, 'c': {}}, set([(1,)])],
+                      max_depth=2)
+    nt.assert_equal(p, "[[1, [...]], {'a': {...}, 'c': {}}, {(...)}]")
+
 def test_unbound_method():
     output = pretty.pretty(MyObj.somemethod)
     nt.assert_in('MyObj.somemethod', output)
@@ -153,6 +153,8 @@ def __enter__(self):
         if self.stderr:
             stderr = sys.stderr = StringIO()
         if self.display:
+            # Outputs held back belong before the captured ones
+            self.shell.display_pub.flush()
             self.save_display_pub = self.shell.display_pub
             self.shell.display_pub = CapturingDisplayPublisher()
             outputs = self.shell.display_pub.outputs
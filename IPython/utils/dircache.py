@@ -0,0 +1,191 @@
+# encoding: utf-8
+"""A cache of directory listings, for filename completion.
+
+Listing a big directory, or any directory on a network filesystem, can make
+tab completion sluggish when it is done on every keypress. A
+:class:`DirectoryCache` keeps the listings of recently used directories, along
+with which entries are themselves directories. A listing is reused as long as
+the directory's modification time is unchanged; a background thread checks
+the recently used directories, so that completion rarely has to touch the
+filesystem itself.
+"""
+
+# Copyright (c) IPython Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import fnmatch
+import glob
+import os
+import re
+import threading
+import time
+
+from collections import OrderedDict
+
+try:
+    from os import scandir
+except ImportError:
+    scandir = None
+
+_magic_re = re.compile('[*?[]')
+
+
+def list_directory(path):
+    """List a directory.
+
+    Returns
+    -------
+    mtime : float
+      Modification time of the directory, taken before listing it.
+    entries : dict
+      Maps the names in the directory to whether they are directories
+      (following symlinks, like :func:`os.path.isdir`).
+    """
+    mtime = os.stat(path).st_mtime
+    entries = {}
+    if scandir is not None:
+        for entry in scandir(path):
+            try:
+                entries[entry.name] = entry.is_dir()
+            except OSError:
+                entries[entry.name] = False
+    else:
+        for name in os.listdir(path):
+            entries[name] = os.path.isdir(os.path.join(path, name))
+    return mtime, entries
+
+
+class _Listing(object):
+    __slots__ = ('mtime', 'entries', 'checked', 'used')
+
+    def __init__(self, mtime, entries, now):
+        self.mtime = mtime
+        self.entries = entries
+        self.checked = self.used = now
+
+
+class DirectoryCache(object):
+    """Cached directory listings, with glob and isdir functions using them.
+
+    Parameters
+    ----------
+    max_dirs : int
+      Maximum number of directory listings to keep.
+    refresh_interval : float
+      A listing checked less than this many seconds ago is used as is;
+      otherwise the directory is checked again first. The background thread
+      checks the recently used directories at this interval.
+    """
+
+    # Directories unused for longer than this (in seconds) are not checked
+    # in the background any more.
+    active_period = 300
+
+    def __init__(self, max_dirs=256, refresh_interval=2.):
+        self.max_dirs = max_dirs
+        self.refresh_interval = refresh_interval
+        self._listings = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = None
+
+    def _store(self, key, listing):
+        with self._lock:
+            self._listings.pop(key, None)
+            self._listings[key] = listing
+            while len(self._listings) > self.max_dirs:
+                self._listings.popitem(last=False)
+
+    def _check(self, key, listing, now):
+        """Check a listing against the filesystem, listing the directory again
+        if it changed. Returns the new listing, or None if it is gone."""
+        try:
+            if listing is not None and os.stat(key).st_mtime == listing.mtime:
+                listing.checked = now
+                return listing
+            new = _Listing(*list_directory(key), now=now)
+        except OSError:
+            with self._lock:
+                self._listings.pop(key, None)
+            return None
+        if listing is not None:
+            new.used = listing.used
+        self._store(key, new)
+        return new
+
+    def listing(self, path):
+        """Get the entries of a directory, as a dict mapping names to whether
+        they are directories, or None if it can't be listed."""
+        key = os.path.abspath(path or os.curdir)
+        now = time.time()
+        with self._lock:
+            listing = self._listings.get(key)
+        if listing is None or now - listing.checked >= self.refresh_interval:
+            listing = self._check(key, listing, now)
+            self._start_refresh()
+        if listing is None:
+            return None
+        listing.used = now
+        return listing.entries
+
+    def glob(self, pattern):
+        """Like :func:`glob.glob`, but using the cached listings when the
+        wildcards are all in the last path component."""
+        dirname, basename = os.path.split(pattern)
+        if not basename or _magic_re.search(dirname):
+            return glob.glob(pattern)
+        entries = self.listing(dirname)
+        if entries is None:
+            return []
+        if not _magic_re.search(basename):
+            return [pattern] if basename in entries else []
+        names = fnmatch.filter(entries, basename)
+        if not basename.startswith('.'):
+            # glob doesn't match hidden files unless explicitly asked to
+            names = [n for n in names if not n.startswith('.')]
+        return [os.path.join(dirname, n) for n in names]
+
+    def isdir(self, path):
+        """Like :func:`os.path.isdir`, but using the cached listings."""
+        dirname, name = os.path.split(path)
+        if name in ('', os.curdir, os.pardir):
+            return os.path.isdir(path)
+        entries = self.listing(dirname)
+        return bool(entries and entries.get(name, False))
+
+    def clear(self):
+        """Forget all the cached listings."""
+        with self._lock:
+            self._listings.clear()
+
+    def close(self):
+        """Stop the background thread.
+
+        The cache can still be used; the thread is started again when a
+        listing needs to be checked.
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread = self._stop = None
+
+    def _start_refresh(self):
+        if self._thread is None:
+            # Each thread has its own event, so that one being stopped can't
+            # be restarted by mistake
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._refresh_loop,
+                                            args=(self._stop,),
+                                            name='IPythonDirectoryCache')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _refresh_loop(self, stop):
+        """Check the recently used directories, every refresh_interval, until
+        stop is set."""
+        while not stop.wait(self.refresh_interval):
+            now = time.time()
+            with self._lock:
+                listings = list(self._listings.items())
+            for key, listing in listings:
+                if now - listing.used < self.active_period:
+                    self._check(key, listing, now)
@@ -0,0 +1,91 @@
+# encoding: utf-8
+"""Tests for IPython.utils.dircache"""
+
+# Copyright (c) IPython Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import glob
+import os
+import time
+
+import nose.tools as nt
+
+from IPython.utils.dircache import DirectoryCache
+from IPython.utils.tempdir import TemporaryDirectory
+
+
+def touch(path):
+    open(path, 'w').close()
+
+
+def test_glob_isdir():
+    """DirectoryCache.glob and isdir agree with the standard library"""
+    cache = DirectoryCache()
+    with TemporaryDirectory() as td:
+        for name in ['a.py', 'ab.txt', '.hidden', 'b.py']:
+            touch(os.path.join(td, name))
+        os.mkdir(os.path.join(td, 'adir'))
+        for pattern in ['*', 'a*', '*.py', '.*', 'a?.txt', '[ab]*', 'a.py',
+                        'nope*', '*/']:
+            pattern = os.path.join(td, pattern)
+            nt.assert_equal(sorted(cache.glob(pattern)),
+                            sorted(glob.glob(pattern)), pattern)
+        for name in ['adir', 'a.py', 'missing', '', '.']:
+            path = os.path.join(td, name)
+            nt.assert_equal(cache.isdir(path), os.path.isdir(path), path)
+        nt.assert_equal(cache.glob(os.path.join(td, 'missing', '*')), [])
+
+
+def test_invalidation():
+    """Listings are reused until the directory's mtime changes"""
+    with TemporaryDirectory() as td:
+        touch(os.path.join(td, 'a'))
+        pattern = os.path.join(td, '*')
+
+        cache = DirectoryCache(refresh_interval=3600)
+        nt.assert_equal(cache.glob(pattern), [os.path.join(td, 'a')])
+        touch(os.path.join(td, 'b'))
+        # Not checked again yet
+        nt.assert_equal(cache.glob(pattern), [os.path.join(td, 'a')])
+
+        cache.refresh_interval = 0
+        # Make sure the change is visible even with coarse mtimes
+        mtime = os.stat(td).st_mtime
+        os.utime(td, (mtime + 10, mtime + 10))
+        nt.assert_equal(sorted(cache.glob(pattern)),
+                        [os.path.join(td, 'a'), os.path.join(td, 'b')])
+
+
+def test_background_refresh():
+    """The background thread picks up changes to used directories"""
+    with TemporaryDirectory() as td:
+        cache = DirectoryCache(refresh_interval=0.05)
+        nt.assert_equal(cache.listing(td), {})
+        os.mkdir(os.path.join(td, 'sub'))
+        mtime = os.stat(td).st_mtime
+        os.utime(td, (mtime + 10, mtime + 10))
+        for _ in range(100):
+            time.sleep(0.05)
+            if cache._listings[os.path.abspath(td)].entries:
+                break
+        nt.assert_equal(cache._listings[os.path.abspath(td)].entries,
+                        {'sub': True})
+        thread = cache._thread
+        cache.close()
+        thread.join(5)
+        nt.assert_false(thread.is_alive())
+        # Restarted when needed
+        cache.refresh_interval = 0
+        cache.listing(td)
+        nt.assert_true(cache._thread.is_alive())
+        cache.close()
+
+
+def test_max_dirs():
+    cache = DirectoryCache(max_dirs=2)
+    with TemporaryDirectory() as td:
+        for name in 'abc':
+            os.mkdir(os.path.join(td, name))
+            cache.listing(os.path.join(td, name))
+        nt.assert_equal(list(cache._listings),
+                        [os.path.join(td, 'b'), os.path.join(td, 'c')])
@@ -14,7 +14,10 @@
 # Imports
 #-----------------------------------------------------------------------------
 
+import gc
+import sys
 import time
+from timeit import default_timer
 
 from .py3compat import xrange
 
@@ -58,6 +61,14 @@ def clock2():
 
         Similar to clock(), but return a tuple of user/system times."""
         return resource.getrusage(resource.RUSAGE_SELF)[:2]
+
+    def peak_rss():
+        """peak_rss() -> int
+
+        Return the peak resident set size of the process in bytes."""
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux gives it in kilobytes
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
 except ImportError:
     # There is no distinction of user/system time under windows, so we just use
     # time.clock() for everything...
@@ -68,6 +79,39 @@ def clock2():
         This just returns clock() and zero."""
         return time.clock(),0.0
 
+    def peak_rss():
+        """Under windows, the resource module isn't available.
+
+        This just returns None."""
+        return None
+
+
+class GCTimer(object):
+    """Accumulate the wall time spent collecting garbage in `total`.
+
+    Once installed, it is called by the garbage collector before and after
+    each collection.  This needs ``gc.callbacks``, from Python 3.3, and
+    `total` is None without it.
+    """
+    def __init__(self):
+        self.total = None
+        self._start = None
+
+    def install(self):
+        """Start measuring, if it is possible and not done yet."""
+        if self.total is None and hasattr(gc, 'callbacks'):
+            self.total = 0.
+            gc.callbacks.append(self)
+
+    def __call__(self, phase, info):
+        if phase == 'start':
+            self._start = default_timer()
+        elif self._start is not None:
+            self.total += default_timer() - self._start
+            self._start = None
+
+gc_timer = GCTimer()
+
     
 def timings_out(reps,func,*args,**kw):
     """timings_out(reps,func,*args,**kw) -> (t_total,t_per_call,output)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Benchmark the per-cell overhead of ``%autoreload 2``.
+
+Usage:
+
+./bench_autoreload.py [--modules N] [--cells C]
+
+N modules (default: 5000) are created in a temporary directory and imported.
+The time taken by the check run before each cell is measured when the
+modification time of every module is checked, and when the module files are
+watched in the background.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from IPython.extensions.autoreload import (ModuleReloader, InotifyWatcher,
+                                           PollingWatcher)
+
+
+def make_modules(dirname, count):
+    names = []
+    for i in range(count):
+        name = 'benchmod_%d' % i
+        with open(os.path.join(dirname, name + '.py'), 'w') as f:
+            f.write('x = %d\n' % i)
+        names.append(name)
+    return names
+
+
+def per_cell(reloader, cells):
+    # The first check records the modification times or starts watching
+    reloader.check()
+    t0 = time.time()
+    for _ in range(cells):
+        reloader.check()
+    return (time.time() - t0) / cells
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modules', type=int, default=5000)
+    parser.add_argument('--cells', type=int, default=20)
+    args = parser.parse_args()
+
+    dirname = tempfile.mkdtemp()
+    sys.path.insert(0, dirname)
+    try:
+        for name in make_modules(dirname, args.modules):
+            __import__(name)
+
+        watchers = [('stat scan', None),
+                    ('polling watcher', lambda: PollingWatcher())]
+        try:
+            InotifyWatcher().stop()
+        except OSError:
+            pass
+        else:
+            watchers.append(('inotify watcher', InotifyWatcher))
+
+        print("%d modules loaded" % len(sys.modules))
+        for label, make in watchers:
+            reloader = ModuleReloader()
+            reloader.enabled = True
+            if make is not None:
+                reloader.start_watching(make())
+            elapsed = per_cell(reloader, args.cells)
+            reloader.stop_watching()
+            print("%-16s %8.2f ms per cell" % (label, elapsed * 1000))
+    finally:
+        sys.path.remove(dirname)
+        shutil.rmtree(dirname)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""Benchmark running the same cell again, with and without the code cache.
+
+Usage:
+
+./bench_code_cache.py [--sizes N,N,...] [--repeat R]
+
+For cells of N lines (default: 10 to 10000), the time taken by ``run_cell``
+is measured with ``InteractiveShell.code_cache_size`` set to 0 and to 100.
+The cells build a list of N small dicts, so that running them costs little
+compared with parsing and compiling them.
+"""
+from __future__ import print_function
+
+import argparse
+import time
+
+from IPython.core.interactiveshell import InteractiveShell
+
+
+def make_cell(size):
+    return u'len([\n%s\n])' % u'\n'.join(u"    {'n': %d, 'sq': %d**2}," % (i, i)
+                                         for i in range(size))
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.time()
+        func()
+        elapsed = time.time() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000,10000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    shell = InteractiveShell.instance()
+    shell.displayhook.write_output_prompt = lambda: None
+    shell.displayhook.write_format_data = lambda *args: None
+    print("%-8s %14s %14s" % ('lines', 'no cache (s)', 'cache (s)'))
+    for size in [int(n) for n in args.sizes.split(',')]:
+        cell = make_cell(size)
+        times = []
+        for cache_size in (0, 100):
+            shell.code_cache_size = cache_size
+            shell.run_cell(cell)
+            times.append(best_time(lambda: shell.run_cell(cell), args.repeat))
+        print("%-8d %14.4f %14.4f" % ((size,) + tuple(times)))
+
+
+if __name__ == '__main__':
+    main()
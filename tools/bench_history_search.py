@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""Benchmark history searches with and without the full-text index.
+
+Usage:
+
+./bench_history_search.py [--rows N] [--keep-db PATH]
+
+A synthetic history database with N rows (default: one million) is created in
+a temporary directory, then the same searches are timed with a plain GLOB scan
+and with ``HistoryAccessor.fts_index`` enabled.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from IPython.core.history import HistoryAccessor, fts_supported
+
+PATTERNS = ['*import numpy*', '*plot(*', '*frobnicate*', 'def *', '*x*']
+
+WORDS = ['import', 'numpy', 'as', 'np', 'plt', 'plot', 'df', 'head', 'print',
+         'for', 'in', 'range', 'def', 'return', 'x', 'y', 'data', 'load']
+
+
+def make_db(hist_file, rows, lines_per_session=500):
+    """Fill a new history database with random-ish python source."""
+    hist = HistoryAccessor(hist_file=hist_file)
+    rnd = random.Random(0)
+    def gen():
+        for i in range(rows):
+            src = ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(2, 12)))
+            if rnd.random() < 0.3:
+                src = '%s = %s(%d)' % (rnd.choice(WORDS), rnd.choice(WORDS), i)
+            yield (i // lines_per_session + 1, i % lines_per_session + 1, src, src)
+    with hist.db:
+        hist.db.executemany("INSERT INTO history VALUES (?, ?, ?, ?)", gen())
+    hist.db.close()
+
+
+def time_searches(hist, repeat=3):
+    results = []
+    for pattern in PATTERNS:
+        best = None
+        for _ in range(repeat):
+            t0 = time.time()
+            found = sum(1 for _ in hist.search(pattern))
+            elapsed = time.time() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        results.append((pattern, found, best))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--keep-db', metavar='PATH',
+                        help="copy the generated database to PATH")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        print("Creating a history database with %d rows..." % args.rows)
+        make_db(hist_file, args.rows)
+
+        scan = time_searches(HistoryAccessor(hist_file=hist_file))
+        if fts_supported():
+            t0 = time.time()
+            hist = HistoryAccessor(hist_file=hist_file, fts_index=True)
+            print("Built full-text index in %.2f s" % (time.time() - t0))
+            indexed = time_searches(hist)
+        else:
+            print("SQLite has no FTS5 trigram tokenizer, only timing scans.")
+            indexed = [(p, n, float('nan')) for p, n, _ in scan]
+
+        print()
+        print("%-18s %9s %11s %11s" % ('pattern', 'matches', 'glob (ms)', 'fts (ms)'))
+        for (pattern, found, t_scan), (_, _, t_fts) in zip(scan, indexed):
+            print("%-18s %9d %11.1f %11.1f" % (pattern, found, t_scan * 1e3,
+                                               t_fts * 1e3))
+        if args.keep_db:
+            shutil.copy(hist_file, args.keep_db)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""Benchmark the pretty printer on a large list of mixed objects.
+
+Usage:
+
+./bench_pretty.py [--size N] [--repeat R]
+
+A list of N objects (default: 100000) of assorted builtin and user-defined
+types is formatted with ``IPython.lib.pretty.pretty`` and with the default
+``PlainTextFormatter``, with and without the cache of printers found for each
+type.
+"""
+from __future__ import print_function
+
+import argparse
+import collections
+import time
+
+from IPython.core.formatters import PlainTextFormatter
+from IPython.lib import pretty
+
+
+class Base(object):
+    pass
+
+class Deep1(Base):
+    pass
+
+class Deep2(Deep1):
+    pass
+
+class Deep3(Deep2):
+    def __repr__(self):
+        return 'Deep3()'
+
+class WithPretty(Deep2):
+    def _repr_pretty_(self, p, cycle):
+        p.text('WithPretty()')
+
+Point = collections.namedtuple('Point', 'x y')
+
+
+def make_data(size):
+    makers = [
+        lambda i: i,
+        lambda i: i * 0.5,
+        lambda i: 'str%d' % i,
+        lambda i: (i, i + 1),
+        lambda i: [i],
+        lambda i: {'k': i},
+        lambda i: None,
+        lambda i: Deep3(),
+        lambda i: WithPretty(),
+        lambda i: Point(i, i),
+        lambda i: collections.OrderedDict([('a', i)]),
+    ]
+    return [makers[i % len(makers)](i) for i in range(size)]
+
+
+class NoCache(pretty._DispatchCache):
+    """Resolve the printer for every object, as without a cache."""
+    def get(self, kind, typ, type_printers, deferred_printers, resolve):
+        return resolve(typ)
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.time()
+        func()
+        elapsed = time.time() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data = make_data(args.size)
+
+    def printer_run(cache):
+        stream = pretty.CUnicodeIO()
+        p = pretty.RepresentationPrinter(stream, max_seq_length=0,
+                                         dispatch_cache=cache)
+        p.pretty(data)
+        p.flush()
+
+    f = PlainTextFormatter(max_seq_length=0)
+    def formatter_run(cache):
+        f._dispatch_cache = cache
+        f(data)
+
+    print("%-22s %12s %12s" % ('', 'cached (s)', 'uncached (s)'))
+    for name, run in [('RepresentationPrinter', printer_run),
+                      ('PlainTextFormatter', formatter_run)]:
+        cached = best_time(lambda: run(pretty._DispatchCache()), args.repeat)
+        uncached = best_time(lambda: run(NoCache()), args.repeat)
+        print("%-22s %12.3f %12.3f" % (name, cached, uncached))
+
+
+if __name__ == '__main__':
+    main()
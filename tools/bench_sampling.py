@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""Benchmark the overhead of the sampling profiler against cProfile.
+
+Usage:
+
+./bench_sampling.py [--interval MS] [--repeat R]
+
+A pure Python loop calling small functions, and a recursive function, are
+run without profiler, with cProfile, and with the sampling profiler every
+MS milliseconds (default: 1), and the slowdowns are printed.
+"""
+from __future__ import print_function
+
+import argparse
+import cProfile
+import time
+
+from IPython.core.sampling import SamplingProfiler
+
+
+def square(x):
+    return x * x
+
+
+def loop(n=3000000):
+    total = 0
+    for i in range(n):
+        total += square(i)
+    return total
+
+
+def fib(n=27):
+    return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.time()
+        func()
+        elapsed = time.time() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--interval', type=float, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print("%-6s %12s %12s %12s" % ('code', 'plain (s)', 'cProfile', 'sampling'))
+    for name, func in [('loop', loop), ('fib', fib)]:
+        ns = {'func': func}
+        plain = best_time(func, args.repeat)
+        traced = best_time(lambda: cProfile.Profile().runctx('func()', ns, ns),
+                           args.repeat)
+        sampled = best_time(lambda: SamplingProfiler(args.interval / 1000.)
+                            .runctx('func()', ns, ns), args.repeat)
+        print("%-6s %12.3f %11.2fx %11.2fx" % (name, plain, traced / plain,
+                                               sampled / plain))
+
+
+if __name__ == '__main__':
+    main()
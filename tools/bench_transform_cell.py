@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""Benchmark the transformation of long cells by IPythonInputSplitter.
+
+Usage:
+
+./bench_transform_cell.py [--sizes N,N,...] [--repeat R]
+
+For cells of N lines (default: 100 to 50000), the time taken by
+``transform_cell`` and ``check_complete`` is measured on cells made of simple
+statements, and on cells holding one long data structure.
+"""
+from __future__ import print_function
+
+import argparse
+import time
+
+from IPython.core.inputsplitter import IPythonInputSplitter
+
+
+def statements(size):
+    return u'\n'.join(u'x%d = %d' % (i, i) for i in range(size))
+
+
+def literal(size):
+    return u'd = {\n%s\n}' % u'\n'.join(u'    %d: %d,' % (i, i)
+                                        for i in range(size - 2))
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.time()
+        func()
+        elapsed = time.time() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000,10000,50000')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    isp = IPythonInputSplitter(line_input_checker=False)
+    print("%-8s %-11s %14s %16s" % ('lines', 'cell', 'transform (s)',
+                                    'check (s)'))
+    for size in [int(n) for n in args.sizes.split(',')]:
+        for name, make_cell in [('statements', statements),
+                                ('literal', literal)]:
+            cell = make_cell(size)
+            transform = best_time(lambda: isp.transform_cell(cell), args.repeat)
+            check = best_time(lambda: isp.check_complete(cell), args.repeat)
+            print("%-8d %-11s %14.3f %16.3f" % (size, name, transform, check))
+
+
+if __name__ == '__main__':
+    main()